@@ -0,0 +1,471 @@
+# api_client.py
+# Cliente HTTP partilhado para a API: uma requests.Session com pool de ligações
+# (keep-alive), novas tentativas com backoff exponencial + jitter (respeitando
+# Retry-After), medição de tempos por pedido (DNS / ligação / TTFB / total) e
+# cancelamento a partir de outra thread (RequestHandle).
+#
+# A Session é criada uma vez e partilhada entre threads (o pool do urllib3 é
+# thread-safe); usa-se sempre através de get_client(). O requests/urllib3 só é
+# importado quando a Session é criada (primeiro pedido), para não atrasar o
+# arranque das aplicações Qt.
+#
+# chat_completion() faz um pedido /v1/chat/completions completo (normal ou em
+# streaming SSE) e devolve um dict de resultado; é usado pela GUI (ApiWorker)
+# e pelo modo batch (batch.py).
+import json as jsonlib
+import time
+import random
+import socket
+import threading
+
+DEFAULT_API_URL = "https://api.openai.com/v1/chat/completions"
+
+# estados HTTP em que vale a pena tentar de novo
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+# tempos e handle do pedido em curso, por thread (preenchidos pelas ligações)
+_timing = threading.local()
+
+
+class RequestCancelled(Exception):
+    """O pedido foi cancelado através do seu RequestHandle."""
+
+
+class RequestHandle:
+    """Permite cancelar um pedido em curso a partir de outra thread.
+
+    cancel() marca o pedido e faz shutdown do socket em uso, o que interrompe
+    de imediato quem está à espera da resposta ou a ler o stream.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._sock = None
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def attach(self, sock):
+        with self._lock:
+            self._sock = sock
+        if self.cancelled:
+            self._abort(sock)
+
+    def cancel(self):
+        self._event.set()
+        with self._lock:
+            sock = self._sock
+        if sock is not None:
+            self._abort(sock)
+
+    def wait(self, seconds):
+        """Espera (ex.: backoff) mas acorda logo se o pedido for cancelado."""
+        return self._event.wait(seconds)
+
+    @staticmethod
+    def _abort(sock):
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _record(name, seconds):
+    current = getattr(_timing, "data", None)
+    if current is not None:
+        current[name] = current.get(name, 0.0) + seconds
+
+
+class _TimedConnectionMixin:
+    """Mede DNS e ligação (TCP + TLS) quando o pool abre uma ligação nova
+    e regista a ligação no RequestHandle do pedido (para o poder abortar)."""
+
+    def request(self, *args, **kwargs):
+        result = super().request(*args, **kwargs)
+        # pedido enviado: a partir daqui o socket pode ser abortado
+        handle = getattr(_timing, "handle", None)
+        if handle is not None and self.sock is not None:
+            handle.attach(self.sock)
+        return result
+
+    def connect(self):
+        dns_host = getattr(self, "_dns_host", None)
+        if not dns_host or self.proxy:
+            self._timed_connect()
+            return
+        from urllib3.exceptions import ConnectTimeoutError
+        from urllib3.util.connection import allowed_gai_family
+        start = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(dns_host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except OSError:
+            infos = []
+        _record("dns", time.perf_counter() - start)
+        # todos os IPs por ordem, como o urllib3 (ex.: IPv6 sem rota -> IPv4);
+        # sem nenhum, é o urllib3 que resolve e reporta o erro de DNS.
+        # O SNI/certificado continuam a usar self.host.
+        addresses = list(dict.fromkeys(info[4][0] for info in infos)) or [dns_host]
+        try:
+            for i, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    self._timed_connect()
+                    return
+                except ConnectTimeoutError:
+                    # inclui NewConnectionError (ligação recusada, sem rota)
+                    if i == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = dns_host
+
+    def _timed_connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _record("connect", time.perf_counter() - start)
+
+
+_adapter_class = None
+
+
+def _timed_adapter_class():
+    """HTTPAdapter cujos pools usam as ligações instrumentadas (criado no 1.º uso)."""
+    global _adapter_class
+    if _adapter_class is not None:
+        return _adapter_class
+
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+        pass
+
+    class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+        pass
+
+    class _TimedHTTPPool(HTTPConnectionPool):
+        ConnectionCls = _TimedHTTPConnection
+
+    class _TimedHTTPSPool(HTTPSConnectionPool):
+        ConnectionCls = _TimedHTTPSConnection
+
+    class _TimedAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                "http": _TimedHTTPPool,
+                "https": _TimedHTTPSPool,
+            }
+
+    _adapter_class = _TimedAdapter
+    return _adapter_class
+
+
+def parse_retry_after(value):
+    """Retry-After em segundos (aceita número ou data HTTP). None se inválido."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    import email.utils
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class ApiClient:
+    """Cliente partilhado e thread-safe com keep-alive, retries e tempos."""
+
+    def __init__(self, pool_size=10, max_retries=3, backoff_base=0.5, backoff_max=20.0,
+                 retry_after_max=60.0):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    adapter = _timed_adapter_class()(pool_connections=self.pool_size,
+                                                     pool_maxsize=self.pool_size)
+                    session = requests.Session()
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def backoff(self, attempt):
+        """Backoff exponencial com "full jitter"."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, url, headers=None, data=None, json=None, timeout=30, stream=False,
+             handle=None, on_retry=None, throttle=None):
+        """POST com novas tentativas em 429/5xx e erros de ligação.
+
+        Devolve a resposta (a última, se todas falharem) com `resp.timing`:
+        dns, connect, ttfb e total em segundos (total até aos cabeçalhos; quem
+        lê o corpo em stream pode actualizá-lo), attempts e retry_wait.
+        chat_completion acrescenta parse (descodificação do JSON/SSE).
+        Com `handle` (RequestHandle) o pedido pode ser cancelado noutra thread;
+        nesse caso levanta RequestCancelled.
+        on_retry(status, espera) é chamado antes de cada nova tentativa (status
+        None em erros de ligação), ex.: para o scheduler parar a fila num 429.
+        throttle() é chamado depois dessa espera e bloqueia até a nova tentativa
+        poder sair (ex.: RequestScheduler.throttle, que a conta no limite rpm/tpm).
+        """
+        from requests import ConnectionError as RequestsConnectionError
+        session = self.session
+        start = time.perf_counter()
+        timing = {"dns": 0.0, "connect": 0.0, "ttfb": 0.0, "total": 0.0,
+                  "attempts": 0, "retry_wait": 0.0}
+        attempt = 0
+        while True:
+            if handle is not None and handle.cancelled:
+                raise RequestCancelled()
+            resp = None
+            timing["attempts"] = attempt + 1
+            _timing.data = timing
+            _timing.handle = handle
+            sent = time.perf_counter()
+            try:
+                resp = session.post(url, headers=headers, data=data, json=json,
+                                         timeout=timeout, stream=stream)
+            except RequestsConnectionError:
+                if handle is not None and handle.cancelled:
+                    raise RequestCancelled()
+                # inclui ConnectTimeout; o pedido não chegou ao servidor
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+            else:
+                timing["ttfb"] = time.perf_counter() - sent
+                if resp.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                    timing["total"] = time.perf_counter() - start
+                    resp.timing = timing
+                    return resp
+                delay = parse_retry_after(resp.headers.get("Retry-After"))
+                if delay is None:
+                    delay = self.backoff(attempt)
+                delay = min(delay, self.retry_after_max)
+                resp.close()
+            finally:
+                _timing.data = None
+                _timing.handle = None
+
+            if on_retry is not None:
+                on_retry(resp.status_code if resp is not None else None, delay)
+            timing["retry_wait"] += delay
+            if handle is not None:
+                handle.wait(delay)
+            else:
+                time.sleep(delay)
+            if throttle is not None:
+                waited = time.perf_counter()
+                throttle()
+                timing["retry_wait"] += time.perf_counter() - waited
+            attempt += 1
+
+    def prewarm(self, url, timeout=5):
+        """Abre já uma ligação keep-alive a `url` (DNS, TCP e TLS) com um HEAD.
+
+        O pedido seguinte ao mesmo host reutiliza-a. Devolve False se falhar
+        (o erro fica para o pedido a sério).
+        """
+        try:
+            self.session.head(url, timeout=timeout).close()
+        except Exception:
+            return False
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+def format_timing(timing):
+    """Texto curto com os tempos de um pedido, para a barra de estado."""
+    parts = []
+    if timing.get("dns"):
+        parts.append(f"DNS {timing['dns'] * 1000:.0f} ms")
+    if timing.get("connect"):
+        parts.append(f"ligação {timing['connect'] * 1000:.0f} ms")
+    parts.append(f"TTFB {timing.get('ttfb', 0) * 1000:.0f} ms")
+    parts.append(f"total {timing.get('total', 0):.2f} s")
+    if timing.get("attempts", 1) > 1:
+        parts.append(f"{timing['attempts']} tentativas")
+    return " · ".join(parts)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Cliente partilhado por toda a aplicação."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ApiClient()
+    return _client
+
+
+def iter_sse_data(lines):
+    """Lê linhas de um stream SSE e devolve o campo 'data' de cada evento."""
+    data = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        line = line.rstrip("\r")
+        if not line:
+            # linha vazia = fim do evento
+            if data:
+                yield "\n".join(data)
+                data = []
+            continue
+        if line.startswith(":"):
+            # comentário / keep-alive
+            continue
+        field, _, value = line.partition(":")
+        if field == "data":
+            data.append(value[1:] if value.startswith(" ") else value)
+    if data:
+        yield "\n".join(data)
+
+
+def extract_delta(event):
+    """Extrai o texto incremental de um chunk de chat.completion.chunk."""
+    choices = event.get("choices")
+    if isinstance(choices, list) and len(choices) > 0:
+        first = choices[0]
+        if isinstance(first, dict):
+            delta = first.get("delta")
+            if isinstance(delta, dict):
+                return delta.get("content") or ""
+            # fallback: completion text
+            return first.get("text") or ""
+    return ""
+
+
+def extract_content(j):
+    """Extrai o texto de uma resposta chat.completion (ou None)."""
+    choices = j.get("choices")
+    if isinstance(choices, list) and len(choices) > 0:
+        first = choices[0]
+        if isinstance(first, dict):
+            # chat models: first["message"]["content"]
+            msg = first.get("message")
+            if isinstance(msg, dict) and "content" in msg:
+                return msg["content"]
+            # fallback: completion text
+            if "text" in first:
+                return first.get("text")
+    return None
+
+
+def chat_completion(api_url, api_key, payload, timeout=30, handle=None, on_delta=None,
+                    on_retry=None, throttle=None):
+    """Executa um pedido chat/completions e devolve o resultado num dict.
+
+    {"ok": True, "content": ...} ou {"ok": False, "error": ...}, sempre com
+    payload_bytes e timing. Com payload["stream"] lê o SSE e chama on_delta(texto)
+    por cada delta. Cancelado pelo handle: {"ok": False, "cancelled": True, ...}.
+    on_retry e throttle seguem para ApiClient.post.
+    """
+    result = {"payload_bytes": 0, "timing": None}
+    try:
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        body = jsonlib.dumps(payload, ensure_ascii=False).encode("utf-8")
+        result["payload_bytes"] = len(body)
+        stream = bool(payload.get("stream"))
+        # cliente partilhado: keep-alive, retries com backoff e tempos por pedido
+        resp = get_client().post(api_url, headers=headers, data=body,
+                                 timeout=timeout, stream=stream, handle=handle,
+                                 on_retry=on_retry, throttle=throttle)
+        result["timing"] = resp.timing
+
+        if resp.ok and stream:
+            result.update(_read_stream(resp, handle, on_delta))
+        elif resp.ok:
+            parse_start = time.perf_counter()
+            try:
+                j = resp.json()
+            except Exception:
+                # resposta não JSON
+                result.update(ok=False, error=f"Resposta inválida do servidor: {resp.text}")
+                return result
+
+            # tenta extrair conteúdo de forma robusta
+            content = extract_content(j)
+            resp.timing["parse"] = time.perf_counter() - parse_start
+            if content is None:
+                # fallback para mostrar algo útil
+                content = jsonlib.dumps(j, ensure_ascii=False, indent=2)
+            result.update(ok=True, content=content)
+        else:
+            # tenta detalhar erro da API
+            try:
+                err = resp.json()
+            except Exception:
+                err = resp.text
+            result.update(ok=False, error=f"HTTP {resp.status_code}: {err}", status=resp.status_code)
+
+    except RequestCancelled:
+        result.update(ok=False, cancelled=True, error="Pedido cancelado")
+    except Exception as e:
+        if handle is not None and handle.cancelled:
+            result.update(ok=False, cancelled=True, error="Pedido cancelado")
+        else:
+            result.update(ok=False, error=str(e))
+    return result
+
+
+def _read_stream(resp, handle, on_delta):
+    """Consome o stream SSE, passando cada delta a on_delta assim que chega."""
+    parts = []
+    start = time.perf_counter()
+    parse = 0.0
+    try:
+        for data in iter_sse_data(resp.iter_lines()):
+            if data == "[DONE]" or (handle is not None and handle.cancelled):
+                break
+            parse_start = time.perf_counter()
+            try:
+                event = jsonlib.loads(data)
+            except ValueError:
+                continue
+            delta = extract_delta(event)
+            parse += time.perf_counter() - parse_start
+            if delta:
+                parts.append(delta)
+                if on_delta is not None:
+                    on_delta(delta)
+    finally:
+        resp.close()
+        # o total inclui a leitura do corpo; parse é só a descodificação dos eventos
+        resp.timing["total"] += time.perf_counter() - start
+        resp.timing["parse"] = parse
+    if handle is not None and handle.cancelled:
+        return {"ok": False, "cancelled": True, "error": "Pedido cancelado", "content": "".join(parts)}
+    return {"ok": True, "content": "".join(parts), "streamed": True}
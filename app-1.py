@@ -2,213 +2,994 @@
 # Requisitos: pip install PyQt5 requests
 import sys
 import os
+import startup  # primeiro: origem dos tempos de arranque
 import json
+import queue
 import datetime
-import requests
+import time
+import itertools
+import threading
+from urllib.parse import urlsplit
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout,
-    QTextEdit, QPushButton, QAction, QMenuBar, QMessageBox,
-    QProgressBar, QFileDialog
+    QHBoxLayout, QTextEdit, QPushButton, QAction, QActionGroup, QMenuBar, QMessageBox,
+    QProgressBar, QFileDialog, QLabel, QTabWidget, QListView, QStyledItemDelegate, QStyle,
+    QDockWidget, QLineEdit, QListWidget, QListWidgetItem, QTableWidget, QTableWidgetItem,
+    QHeaderView, QInputDialog
 )
-from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtCore import (
+    Qt, QObject, QRunnable, QThread, QThreadPool, QAbstractListModel, QModelIndex,
+    QPoint, QRect, QSize, QTimer, pyqtSignal
+)
+from PyQt5.QtGui import QKeySequence, QPalette
+
+from api_client import format_timing, RequestCancelled, RequestHandle
+from backends import OpenAIBackend, load_router
+from conversation_log import ConversationLog, iter_messages, tail_messages
+from message_store import Message, MessageStore
+from context_window import ContextManager, estimate_tokens, POLICY_PINNED, POLICY_SLIDING
+from scheduler import RequestScheduler, request_tokens, INTERACTIVE, BACKGROUND
+from session_journal import SessionJournal
+import metrics
 
-# >>> Substitui pela tua chave da OpenAI
-API_KEY = "AQUI_A_TUA_CHAVE"
-API_URL = "https://api.openai.com/v1/chat/completions"
+startup.mark("imports")
+
+# >>> Substitui pela tua chave da OpenAI (ou define OPENAI_API_KEY)
+# API_KEY, API_URL e MODEL definem o backend por omissão (sem backends.json)
+API_KEY = os.environ.get("OPENAI_API_KEY", "AQUI_A_TUA_CHAVE")
+# OPENAI_API_URL permite apontar para um servidor local (ex.: bench/mock_server.py)
+API_URL = os.environ.get("OPENAI_API_URL", "https://api.openai.com/v1/chat/completions")
+MODEL = "gpt-3.5-turbo"
+MAX_TOKENS = 400
+# nº de mensagens antigas por resumo (opção "Resumir mensagens antigas")
+SUMMARY_TURNS = 10
+# mensagens com o texto em memória por separador (o das mais antigas vai para disco)
+MEMORY_MESSAGES = 20000
+# pedidos em paralelo: total (pool de threads) e por fornecedor (host da API)
+MAX_WORKERS = 8
+PROVIDER_CONCURRENCY = 4
+# limites de ritmo da chave (0 = sem limite; também em Opções → Limites de pedidos)
+RATE_RPM = int(os.environ.get("CHATGPT_QT_RPM", "0") or 0)
+RATE_TPM = int(os.environ.get("CHATGPT_QT_TPM", "0") or 0)
+# modo "N alternativas" (Opções → Alternativas por pedido)
+MAX_CANDIDATES = 4
+# pré-carregamento: mensagem do botão "Continuar" (a continuação é pedida de
+# antemão) e de quanto em quanto tempo, no máximo, a ligação é pré-aquecida
+CONTINUE_PROMPT = "Continua."
+PREWARM_INTERVAL = 20.0
+# dados locais da aplicação (cache de respostas, índice de pesquisa, etc.)
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".chatgpt_qt")
+# pasta onde ficam os logs conversa_* (indexados para a pesquisa)
+LOG_DIR = os.getcwd()
+SEARCH_INDEX = os.path.join(DATA_DIR, "pesquisa.sqlite")
+# arquivo comprimido e deduplicado (Ficheiro → Arquivar conversa; ver archive.py)
+ARCHIVE_FILE = os.path.join(DATA_DIR, "arquivo.sqlite")
+# diário da sessão (separadores abertos, pedidos em curso, scroll; ver
+# session_journal.py), reposto ao arrancar; CHATGPT_QT_SESSION="" desliga
+SESSION_FILE = os.environ.get("CHATGPT_QT_SESSION", os.path.join(DATA_DIR, "sessao.json"))
+SESSION_SAVE_MS = 500
+# ao repor: tempo máximo a ler separadores além do activo (os outros são lidos
+# quando forem abertos) e mensagens lidas do fim de cada log
+RESTORE_BUDGET = 0.2
+RESTORE_MESSAGES = 200
+RESTORE_MAX_MESSAGES = 2000
+# lista de backends (OpenAI, servidor local...) com routing por latência e
+# failover; ver backends.py. Sem o ficheiro usa-se só API_URL/API_KEY.
+BACKENDS_FILE = os.environ.get("CHATGPT_QT_BACKENDS", os.path.join(DATA_DIR, "backends.json"))
+# CHATGPT_QT_METRICS_FILE: exporta as métricas periodicamente (.csv ou texto
+# Prometheus, ex.: para o textfile collector do node_exporter)
+METRICS_FILE = os.environ.get("CHATGPT_QT_METRICS_FILE")
+METRICS_INTERVAL_MS = 15000
 # -----------------------------------------------------
 
 
-class ApiWorker(QThread):
-    """Executa a chamada à API em thread separada e devolve o resultado via signal."""
+_provider_slots = {}
+_provider_lock = threading.Lock()
+
+
+def provider_slot(api_url):
+    """Semáforo que limita os pedidos simultâneos a um mesmo fornecedor (host)."""
+    host = urlsplit(api_url).netloc
+    with _provider_lock:
+        slot = _provider_slots.get(host)
+        if slot is None:
+            slot = _provider_slots[host] = threading.BoundedSemaphore(PROVIDER_CONCURRENCY)
+    return slot
+
+
+class WorkerSignals(QObject):
+    """Signals do ApiWorker (um QRunnable não pode ter signals próprios)."""
     result = pyqtSignal(object)
+    chunk = pyqtSignal(str)
+    # posição na fila do scheduler e segundos de espera (-1 = saiu da fila)
+    queued = pyqtSignal(int, float)
 
-    def __init__(self, api_key, api_url, payload, timeout=30):
+
+class ApiWorker(QRunnable):
+    """Executa a chamada à API no pool de threads e devolve o resultado via signals.
+
+    Com payload["stream"] = True lê a resposta em SSE e emite `chunk` por cada delta.
+    Com um scheduler, espera primeiro pela vez (emite `queued` enquanto espera).
+    O router (backends.Router) escolhe o backend e passa a outro se este falhar.
+    """
+
+    def __init__(self, router, payload, timeout=30, scheduler=None, priority=INTERACTIVE):
         super().__init__()
-        self.api_key = api_key
-        self.api_url = api_url
+        # autoDelete (omissão): o pool fica dono do objecto até o run() terminar
+        self.signals = WorkerSignals()
+        self.router = router
         self.payload = payload
         self.timeout = timeout
+        self.scheduler = scheduler
+        self.priority = priority
+        self.cancelled = False
+        self.handle = RequestHandle()
+        self._last_queued = None
+
+    def cancel(self):
+        """Cancela o pedido: aborta a ligação (ou a leitura do stream) e não emite resultado."""
+        self.cancelled = True
+        self.handle.cancel()
+
+    def _on_wait(self, position, waited):
+        # só quando o que se mostra muda (posição ou segundos inteiros)
+        state = (position, int(waited))
+        if state != self._last_queued:
+            self._last_queued = state
+            self.signals.queued.emit(position, waited)
 
     def run(self):
-        try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            resp = requests.post(self.api_url, headers=headers, json=self.payload, timeout=self.timeout)
+        on_retry = throttle = None
+        if self.scheduler is not None:
+            tokens = request_tokens(self.payload)
+            try:
+                waited = self.scheduler.acquire(tokens, self.priority,
+                                                handle=self.handle, on_wait=self._on_wait)
+            except RequestCancelled:
+                return
+            metrics.observe("rate_wait_seconds", waited)
+            if self._last_queued is not None:
+                self.signals.queued.emit(-1, waited)
+            on_retry = self.scheduler.on_retry
+            throttle = self.scheduler.throttle(tokens, self.priority, self.handle)
+        if self.cancelled:
+            return
+        result = self.router.complete(self.payload, timeout=self.timeout, handle=self.handle,
+                                      on_delta=self.signals.chunk.emit, on_retry=on_retry,
+                                      slot=provider_slot, throttle=throttle)
+        # cancelado: a GUI já tratou do pedido, não há resultado a emitir
+        if not self.cancelled:
+            self.signals.result.emit(result)
+
+
+class CandidateGroup:
+    """Os pedidos do modo "N alternativas", cancelados em conjunto (como um ApiWorker)."""
+
+    def __init__(self, workers):
+        self.workers = workers
+
+    def cancel(self):
+        for worker in self.workers:
+            worker.cancel()
+
+
+class PrewarmTask(QRunnable):
+    """Abre a ligação ao próximo backend no pool, enquanto o utilizador escreve."""
+
+    def __init__(self, router):
+        super().__init__()
+        self.router = router
+
+    def run(self):
+        self.router.prewarm()
+
+
+class LogWriter(QThread):
+    """Grava os logs (JSONL + TXT) numa thread própria, fora do event loop do Qt.
 
-            if resp.ok:
+    As operações entram numa fila; mensagens que chegam em rajada são agrupadas
+    numa única escrita/flush por ficheiro. Falhas são reportadas pelo signal `error`.
+    """
+    error = pyqtSignal(str)
+
+    _STOP = object()
+
+    def __init__(self, coalesce_ms=20):
+        super().__init__()
+        self.coalesce_ms = coalesce_ms
+        self._queue = queue.Queue()
+        # SearchIndexer a avisar depois de cada escrita (definido no fim do arranque)
+        self.indexer = None
+        self._archive = None    # archive.Archive, aberto no primeiro "arquivar"
+
+    # --- API usada pela thread da GUI (apenas enfileira) ---
+
+    def append(self, log, txt_path, entry):
+        self._queue.put(("append", log, txt_path, entry))
+
+    def rewrite(self, log, messages):
+        self._queue.put(("rewrite", log, list(messages)))
+
+    def compact(self, log, json_path):
+        self._queue.put(("compact", log, json_path))
+
+    def close_log(self, log):
+        self._queue.put(("close", log))
+
+    def archive(self, log, archive_path):
+        """Copia o log (com tudo o que está na fila antes) para o arquivo comprimido."""
+        self._queue.put(("archive", log, archive_path))
+
+    def save_session(self, journal, tabs, current, clean=False):
+        """Grava o diário da sessão depois das mensagens já na fila.
+
+        Assim o diário nunca aponta para um pedido cuja pergunta ainda não está no log.
+        """
+        self._queue.put(("session", journal, tabs, current, clean))
+
+    def stop(self, timeout_ms=10000):
+        """Escreve tudo o que falta e termina a thread."""
+        self._queue.put((self._STOP,))
+        self.wait(timeout_ms)
+
+    # --- thread de escrita ---
+
+    def run(self):
+        while True:
+            batch = [self._queue.get()]
+            # dá tempo a que a rajada chegue e junta tudo o que estiver na fila
+            self.msleep(self.coalesce_ms)
+            while True:
                 try:
-                    j = resp.json()
-                except Exception:
-                    # resposta não JSON
-                    self.result.emit({"ok": False, "error": f"Resposta inválida do servidor: {resp.text}"})
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not self._process(batch):
+                return
+
+    def _process(self, batch):
+        """Executa as operações por ordem. Devolve False quando é para parar."""
+        entries = {}  # log -> [entry]
+        lines = {}    # txt_path -> [linha]
+        for op in batch:
+            if op[0] == "append":
+                _, log, txt_path, entry = op
+                entries.setdefault(log, []).append(entry)
+                prefix = "Tu" if entry["role"] == "user" else "ChatGPT"
+                suffix = " [interrompida]" if entry.get("truncated") else ""
+                lines.setdefault(txt_path, []).append(f"{prefix}: {entry['content']}{suffix}\n\n")
+                continue
+
+            # operação que depende da ordem: grava primeiro o que está acumulado
+            self._flush(entries, lines)
+            entries, lines = {}, {}
+            if op[0] is self._STOP:
+                if self._archive is not None:
+                    self._archive.close()
+                return False
+            try:
+                if op[0] == "rewrite":
+                    op[1].rewrite(op[2])
+                    if self.indexer is not None:
+                        self.indexer.index_file(op[1].path, full=True)
+                elif op[0] == "compact":
+                    op[1].compact(op[2])
+                elif op[0] == "close":
+                    op[1].close()
+                elif op[0] == "archive":
+                    self._archive_log(op[1], op[2])
+                elif op[0] == "session":
+                    op[1].save(op[2], op[3], op[4])
+            except Exception as e:
+                self.error.emit(f"Falha no log ({op[0]}): {e}")
+        self._flush(entries, lines)
+        return True
+
+    def _archive_log(self, log, archive_path):
+        log.sync()
+        if not os.path.exists(log.path):
+            return
+        if self._archive is None:
+            from archive import Archive
+            self._archive = Archive(archive_path)
+        self._archive.import_file(log.path)
+
+    def _flush(self, entries, lines):
+        if entries or lines:
+            with metrics.timer("log_write_seconds"):
+                self._write(entries, lines)
+
+    def _write(self, entries, lines):
+        for log, items in entries.items():
+            try:
+                log.extend(items)
+            except Exception as e:
+                self.error.emit(f"Não foi possível gravar log JSON: {e}")
+                continue
+            if self.indexer is not None:
+                self.indexer.index_file(log.path)
+        for txt_path, items in lines.items():
+            try:
+                with open(txt_path, "a", encoding="utf-8") as f:
+                    f.write("".join(items))
+            except Exception as e:
+                self.error.emit(f"Não foi possível gravar log TXT: {e}")
+
+
+class SearchIndexer(QThread):
+    """Mantém o índice de pesquisa (search_index.py) em dia numa thread própria.
+
+    Ao arrancar indexa os logs da pasta que mudaram desde a última vez; depois
+    lê o que o LogWriter vai acrescentando a cada ficheiro.
+    """
+    error = pyqtSignal(str)
+
+    _STOP = object()
+
+    def __init__(self, index_path, folder):
+        super().__init__()
+        self.index_path = index_path
+        self.folder = folder
+        self._queue = queue.Queue()
+
+    def index_file(self, path, full=False):
+        self._queue.put((path, full))
+
+    def stop(self, timeout_ms=10000):
+        """Indexa o que falta na fila (a leitura inicial da pasta é interrompida) e termina."""
+        self.requestInterruption()
+        self._queue.put((self._STOP, False))
+        self.wait(timeout_ms)
+
+    def run(self):
+        from search_index import SearchIndex
+        try:
+            index = SearchIndex(self.index_path)
+            index.scan(self.folder, interrupted=self.isInterruptionRequested)
+        except Exception as e:
+            self.error.emit(f"Falha no índice de pesquisa: {e}")
+            return
+        try:
+            while True:
+                # junta os pedidos em fila: cada ficheiro é lido uma vez
+                pending = dict([self._queue.get()])
+                while True:
+                    try:
+                        path, full = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    pending[path] = pending.get(path, False) or full
+                stop = self._STOP in pending
+                pending.pop(self._STOP, None)
+                for path, full in pending.items():
+                    try:
+                        index.index_file(path, full=full)
+                    except Exception as e:
+                        self.error.emit(f"Falha ao indexar {os.path.basename(path)}: {e}")
+                if stop:
                     return
+        finally:
+            index.close()
+
+
+def format_message(msg):
+    """Texto de apresentação de uma mensagem no display."""
+    role = msg.get("role", "")
+    content = msg.get("content", "")
+    if role == "user":
+        return f"🧑 Tu: {content}\n"
+    if role == "assistant":
+        if msg.get("truncated"):
+            return f"🤖 ChatGPT: {content} […] ⏹ (interrompida)\n"
+        return f"🤖 ChatGPT: {content}\n"
+    # mostra roles desconhecidos de forma neutra
+    return f"{role}: {content}\n"
+
+
+class TranscriptModel(QAbstractListModel):
+    """Histórico de um separador como modelo de lista (uma linha por mensagem).
+
+    Guarda só referências às mensagens; o texto é formatado quando a linha é
+    pintada. Além das mensagens há avisos (erros, "conversa limpa") e uma linha
+    "pendente" no fim (placeholder / resposta em streaming) que pode ser
+    substituída sem mexer no resto.
+
+    A QListView refaz o layout de todas as linhas a cada inserção, por isso o
+    modelo só expõe as últimas WINDOW linhas; as anteriores entram aos blocos
+    quando o utilizador sobe até ao início (show_older).
+    """
+
+    WINDOW = 200
+    # a vista refaz o layout a cada dataChanged: os deltas do stream são agrupados
+    PENDING_UPDATE_MS = 40
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []             # mensagem (Message) ou aviso (str)
+        self.first = 0              # primeira linha de _rows exposta à vista
+        self.rendered = 0           # nº de mensagens já no modelo
+        self._pending = None        # texto da linha pendente
+        self._pending_timer = QTimer(self)
+        self._pending_timer.setSingleShot(True)
+        self._pending_timer.setInterval(self.PENDING_UPDATE_MS)
+        self._pending_timer.timeout.connect(self._pending_updated)
+        # altura de cada linha (SizeHintRole), fornecida pela vista; responder aqui
+        # em vez de no delegate evita o custo do PyQt por chamada a sizeHint()
+        self.size_at = None
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows) - self.first + (self._pending is not None)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.SizeHintRole:
+            return self.size_at(index.row()) if self.size_at is not None else None
+        if role == Qt.DisplayRole:
+            return self.text_at(index.row())
+        if role == Qt.UserRole:
+            # role da mensagem, para o delegate (None em avisos e na linha pendente)
+            row = self.first + index.row()
+            if row < len(self._rows) and not isinstance(self._rows[row], str):
+                return self._rows[row].get("role")
+        return None
+
+    def text_at(self, row):
+        row += self.first
+        if row >= len(self._rows):
+            return self._pending
+        item = self._rows[row]
+        text = item if isinstance(item, str) else format_message(item)
+        return text.rstrip("\n")
+
+    def pending_row(self):
+        return len(self._rows) - self.first if self._pending is not None else None
+
+    def _insert(self, items):
+        # antes da linha pendente, que fica sempre no fim
+        start = len(self._rows) - self.first
+        self.beginInsertRows(QModelIndex(), start, start + len(items) - 1)
+        self._rows.extend(items)
+        self.endInsertRows()
+
+    def append_new(self, messages):
+        """Acrescenta as mensagens a partir de self.rendered."""
+        if self.rendered >= len(messages):
+            return
+        self._insert(messages[self.rendered:])
+        self.rendered = len(messages)
 
-                # tenta extrair conteúdo de forma robusta
-                content = None
-                choices = j.get("choices")
-                if isinstance(choices, list) and len(choices) > 0:
-                    first = choices[0]
-                    if isinstance(first, dict):
-                        # chat models: first["message"]["content"]
-                        msg = first.get("message")
-                        if isinstance(msg, dict) and "content" in msg:
-                            content = msg["content"]
-                        # fallback: completion text
-                        elif "text" in first:
-                            content = first.get("text")
-
-                if content is None:
-                    # fallback para mostrar algo útil
-                    content = json.dumps(j, ensure_ascii=False, indent=2)
-
-                self.result.emit({"ok": True, "content": content})
+    def append_notice(self, text):
+        self._insert([text])
+
+    def rebuild(self, messages):
+        """Substitui o modelo inteiro (import / limpar); só o fim fica exposto."""
+        self.beginResetModel()
+        self._rows = list(messages)
+        self.first = max(0, len(self._rows) - self.WINDOW)
+        self.rendered = len(messages)
+        self._pending = None
+        self.endResetModel()
+
+    def has_older(self):
+        return self.first > 0
+
+    def show_older(self, count=WINDOW):
+        """Expõe mais `count` linhas antigas no topo; devolve quantas entraram."""
+        count = min(count, self.first)
+        if count:
+            self.beginInsertRows(QModelIndex(), 0, count - 1)
+            self.first -= count
+            self.endInsertRows()
+        return count
+
+    def hide_older(self, count):
+        """Retira `count` linhas do topo da vista (continuam no histórico)."""
+        count = min(count, self.rowCount() - 1)
+        if count > 0:
+            self.beginRemoveRows(QModelIndex(), 0, count - 1)
+            self.first += count
+            self.endRemoveRows()
+
+    def messages_from(self, row):
+        """Nº de mensagens (sem avisos) da linha `row` da vista até ao fim."""
+        return sum(1 for item in self._rows[self.first + row:] if not isinstance(item, str))
+
+    def row_of(self, message):
+        """Linha da vista com a mensagem (expõe as anteriores se preciso), ou None."""
+        for row in range(len(self._rows) - 1, -1, -1):
+            if self._rows[row] is message:
+                break
+        else:
+            return None
+        if row < self.first:
+            self.show_older(self.first - row)
+        return row - self.first
+
+    def show_pending(self, text):
+        """Mostra uma linha temporária no fim (ex.: "a escrever...")."""
+        self.discard_pending()
+        row = len(self._rows) - self.first
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._pending = text.rstrip("\n")
+        self.endInsertRows()
+
+    def append_to_pending(self, text):
+        """Acrescenta texto à linha pendente (deltas do stream)."""
+        if self._pending is None:
+            return
+        self._pending += text
+        if not self._pending_timer.isActive():
+            self._pending_timer.start()
+
+    def _pending_updated(self):
+        if self._pending is not None:
+            index = self.index(len(self._rows) - self.first)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def discard_pending(self):
+        """Remove a linha pendente, se existir."""
+        if self._pending is None:
+            return
+        self._pending_timer.stop()
+        row = len(self._rows) - self.first
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self._pending = None
+        self.endRemoveRows()
+
+    def plain_text(self, rows=None):
+        """Texto das linhas indicadas (ou de todas as expostas), como no display antigo."""
+        if rows is None:
+            rows = range(self.rowCount())
+        return "\n\n".join(self.text_at(r) for r in rows) + "\n"
+
+
+class TranscriptDelegate(QStyledItemDelegate):
+    """Desenha cada mensagem com quebra de linha.
+
+    A QListView precisa da altura de todas as linhas, mas medir texto com quebra
+    custa ~0.1 ms por mensagem. Por isso a altura é estimada pelo nº de
+    caracteres (com folga) e só as linhas pintadas são medidas a sério; se uma
+    não couber, a altura é corrigida e a lista refeita (com as alturas em cache).
+    """
+
+    MARGIN = 6
+    # folga da estimativa: é melhor sobrar espaço do que cortar texto
+    SLACK = 1.15
+
+    def __init__(self, view, model):
+        super().__init__(view)
+        self.model = model
+        self.width = 0
+        self.fm = view.fontMetrics()
+        # por posição no histórico (não na vista, que cresce pelo topo)
+        self._heights = {}          # posição -> altura (estimada ou medida)
+        self._measured = set()      # posições já medidas ao pintar
+        self._pending_height = None
+        self._relayout = QTimer(self)
+        self._relayout.setSingleShot(True)
+        self._relayout.timeout.connect(lambda: self.sizeHintChanged.emit(QModelIndex()))
+
+    def reset(self):
+        self._heights.clear()
+        self._measured.clear()
+
+    def set_width(self, width):
+        if width != self.width:
+            self.width = width
+            self.reset()
+
+    def _measure(self, fm, text):
+        bounds = QRect(0, 0, max(self.width - 2 * self.MARGIN, 50), 1 << 24)
+        return fm.boundingRect(bounds, Qt.TextWordWrap, text).height() + 2 * self.MARGIN
+
+    def _estimate(self, fm, text):
+        per_line = max(int((self.width - 2 * self.MARGIN) / (fm.averageCharWidth() * self.SLACK)), 1)
+        lines = sum(len(part) // per_line + 1 for part in text.split("\n"))
+        return lines * fm.lineSpacing() + 2 * self.MARGIN
+
+    def size_at(self, row):
+        """Tamanho da linha `row` da vista (o modelo devolve-o como SizeHintRole)."""
+        key = self.model.first + row
+        height = self._heights.get(key)
+        if height is None:
+            if row == self.model.pending_row():
+                # a linha em streaming muda a cada delta: mede sempre (não fica em cache)
+                height = self._pending_height = self._measure(self.fm, self.model.text_at(row))
             else:
-                # tenta detalhar erro da API
-                try:
-                    err = resp.json()
-                except Exception:
-                    err = resp.text
-                self.result.emit({"ok": False, "error": f"HTTP {resp.status_code}: {err}"})
+                height = self._heights[key] = self._estimate(self.fm, self.model.text_at(row))
+        return QSize(self.width, height)
 
-        except Exception as e:
-            self.result.emit({"ok": False, "error": str(e)})
+    def pending_changed(self):
+        """O texto pendente cresceu: só refaz o layout se a altura mudar."""
+        row = self.model.pending_row()
+        if row is not None and self._measure(self.fm, self.model.text_at(row)) != self._pending_height:
+            self._relayout.start(0)
 
+    def paint(self, painter, option, index):
+        text = index.data(Qt.DisplayRole) or ""
+        row = index.row()
+        key = self.model.first + row
+        if key not in self._measured and row != self.model.pending_row():
+            self._measured.add(key)
+            height = self._measure(option.fontMetrics, text)
+            if height > option.rect.height():
+                # estimativa curta: corrige e refaz o layout (uma vez por ciclo)
+                self._heights[key] = height
+                self._relayout.start(0)
 
-class ChatGPTApp(QMainWindow):
-    def __init__(self):
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+            painter.setPen(option.palette.color(QPalette.HighlightedText))
+        elif index.data(Qt.UserRole) == "user":
+            # as mensagens do utilizador destacam-se ligeiramente
+            painter.fillRect(option.rect, option.palette.alternateBase())
+        painter.drawText(option.rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN),
+                         Qt.TextWordWrap, text)
+        painter.restore()
+
+
+class TranscriptView(QListView):
+    """Lista virtualizada do histórico: só as mensagens visíveis são desenhadas.
+
+    Enquanto o utilizador estiver no fim da lista, a vista acompanha as
+    mensagens novas; ao chegar ao topo, carrega mensagens mais antigas.
+    """
+    # o utilizador chegou ao topo e o modelo não tem mais linhas
+    reached_top = pyqtSignal()
+    # o utilizador mexeu no scroll (não emitido quando a vista acompanha o fim)
+    scrolled = pyqtSignal()
+
+    def __init__(self, model):
         super().__init__()
-        self.setWindowTitle("ChatGPT API - Qt App (corrigido)")
-        self.setGeometry(200, 200, 800, 700)
+        self.setModel(model)
+        self.delegate = TranscriptDelegate(self, model)
+        self.setItemDelegate(self.delegate)
+        self.setVerticalScrollMode(QListView.ScrollPerPixel)
+        self.setResizeMode(QListView.Adjust)
+        self.setUniformItemSizes(False)
+        self.setSelectionMode(QListView.ExtendedSelection)
+        # as linhas ocupam a largura toda: barras fixas evitam re-layouts em ciclo
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+        self.delegate.set_width(self.viewport().width())
+        model.size_at = self.delegate.size_at
+        model.modelReset.connect(self.delegate.reset)
+        model.dataChanged.connect(lambda *_: self.delegate.pending_changed())
 
-        # Mensagens (lista no formato: {"role": "...", "content": "..."})
-        self.messages = []
+        self._stick = True
+        self._auto_scroll = False
+        bar = self.verticalScrollBar()
+        bar.rangeChanged.connect(self._on_range_changed)
+        bar.valueChanged.connect(self._on_value_changed)
+        model.rowsInserted.connect(self._on_rows_inserted)
 
-        # Logs automáticos com timestamp
-        agora = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.log_json = os.path.abspath(f"conversa_{agora}.json")
-        self.log_txt = os.path.abspath(f"conversa_{agora}.txt")
+        copy_action = QAction("Copiar", self)
+        copy_action.setShortcut(QKeySequence.Copy)
+        copy_action.setShortcutContext(Qt.WidgetShortcut)
+        copy_action.triggered.connect(self.copy_selection)
+        self.addAction(copy_action)
 
-        # UI
-        self._build_menu()
-        self._build_central()
+    def resizeEvent(self, event):
+        self.delegate.set_width(self.viewport().width())
+        super().resizeEvent(event)
 
-        # Worker (inicialmente nenhum)
-        self.worker = None
+    def _set_value(self, value):
+        self._auto_scroll = True
+        self.verticalScrollBar().setValue(value)
+        self._auto_scroll = False
 
-    def _build_menu(self):
-        self.menu_bar = QMenuBar(self)
-        self.setMenuBar(self.menu_bar)
+    def _on_value_changed(self, value):
+        if self._auto_scroll:
+            return
+        self._stick = value >= self.verticalScrollBar().maximum() - 4
+        self.scrolled.emit()
+        if value == 0:
+            if self.model().has_older():
+                # chegou ao topo: expõe o bloco anterior sem mudar o que está à vista
+                QTimer.singleShot(0, self.show_older)
+            else:
+                self.reached_top.emit()
 
-        file_menu = self.menu_bar.addMenu("Ficheiro")
-        help_menu = self.menu_bar.addMenu("Ajuda")
+    def show_older(self):
+        bar = self.verticalScrollBar()
+        if bar.value() != 0:
+            return
+        before = bar.maximum()
+        if self.model().show_older():
+            self.executeDelayedItemsLayout()
+            self._set_value(bar.maximum() - before)
 
-        self.action_clear = QAction("Limpar conversa", self)
-        self.action_clear.triggered.connect(self.clear_conversation)
-        file_menu.addAction(self.action_clear)
+    def _on_rows_inserted(self, parent, first, last):
+        if self._stick and self.model().rowCount() > 2 * self.model().WINDOW:
+            QTimer.singleShot(0, self._trim)
 
-        self.action_import = QAction("Importar conversa JSON", self)
-        self.action_import.triggered.connect(self.import_conversation)
-        file_menu.addAction(self.action_import)
+    def _trim(self):
+        # no fim da conversa, a vista não cresce para sempre: o topo sai da janela
+        model = self.model()
+        if self._stick and model.rowCount() > 2 * model.WINDOW:
+            model.hide_older(model.rowCount() - model.WINDOW)
 
-        self.action_export_json = QAction("Exportar conversa JSON", self)
-        self.action_export_json.triggered.connect(self.export_conversation)
-        file_menu.addAction(self.action_export_json)
+    def _on_range_changed(self, minimum, maximum):
+        if self._stick:
+            self._set_value(maximum)
 
-        self.action_export_txt = QAction("Exportar conversa TXT", self)
-        self.action_export_txt.triggered.connect(self.export_conversation_txt)
-        file_menu.addAction(self.action_export_txt)
+    def scroll_to_top(self):
+        """Vai para o início e deixa de acompanhar o fim."""
+        self._stick = False
+        self._set_value(0)
 
-        file_menu.addSeparator()
+    def scroll_to_end(self):
+        """Vai para o fim e passa a acompanhar as mensagens novas."""
+        self._stick = True
+        self._set_value(self.verticalScrollBar().maximum())
 
-        self.action_exit = QAction("Sair", self)
-        self.action_exit.triggered.connect(self.close)
-        file_menu.addAction(self.action_exit)
+    def at_end(self):
+        """Está no fim da lista (a acompanhar as mensagens novas)."""
+        return self._stick
 
-        about_action = QAction("Sobre", self)
-        about_action.triggered.connect(self.show_about)
-        help_menu.addAction(about_action)
+    def first_visible_row(self):
+        index = self.indexAt(QPoint(0, 0))
+        return index.row() if index.isValid() else None
 
-    def _build_central(self):
-        central_widget = QWidget()
-        self.setCentralWidget(central_widget)
-        self.layout = QVBoxLayout(central_widget)
+    def show_message(self, message, select=True):
+        """Põe a mensagem no topo da vista e selecciona-a (ex.: resultado de uma pesquisa)."""
+        # antes de expor linhas antigas: parado no fim, a vista voltava a cortá-las
+        self._stick = False
+        row = self.model().row_of(message)
+        if row is None:
+            return False
+        self.executeDelayedItemsLayout()
+        index = self.model().index(row)
+        self.scrollTo(index, QListView.PositionAtTop)
+        if select:
+            self.setCurrentIndex(index)
+        return True
+
+    def copy_selection(self):
+        rows = sorted(index.row() for index in self.selectedIndexes())
+        if rows:
+            QApplication.clipboard().setText(self.model().plain_text(rows))
+
+
+class TranscriptLoader(QThread):
+    """Lê um ficheiro de conversa em background e entrega as mensagens aos lotes.
+
+    O primeiro lote é pequeno, para o início da conversa aparecer logo.
+    """
+    batch = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    FIRST_BATCH = 200
+    BATCH = 5000
+
+    def __init__(self, file_name, skip=0):
+        super().__init__()
+        self.file_name = file_name
+        self.skip = skip            # mensagens do início ignoradas (limpas antes)
+        self.count = 0
+
+    def run(self):
+        items = []
+        size = self.FIRST_BATCH
+        try:
+            for item in itertools.islice(iter_messages(self.file_name), self.skip, None):
+                if self.isInterruptionRequested():
+                    return
+                items.append(item)
+                if len(items) >= size:
+                    self.count += len(items)
+                    self.batch.emit(items)
+                    items = []
+                    size = self.BATCH
+            if items:
+                self.count += len(items)
+                self.batch.emit(items)
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
+class ConversationTab(QWidget):
+    """Uma conversa: histórico, logs próprios, display e caixa de escrita.
+
+    Cada separador envia os seus pedidos pelo pool partilhado da janela, por isso
+    uma resposta lenta num separador não bloqueia os outros.
+    """
+
+    def __init__(self, main_window, title):
+        super().__init__()
+        self.main_window = main_window
+        self.title = title
+
+        # Mensagens (Message: role/content, ver message_store.py)
+        self.messages = MessageStore(spill_after=MEMORY_MESSAGES)
 
-        self.chat_display = QTextEdit()
-        self.chat_display.setReadOnly(True)
-        self.layout.addWidget(self.chat_display)
+        # Logs automáticos com timestamp: JSONL append-only + TXT;
+        # o JSON (lista completa) é gerado por compactação ao fechar
+        agora = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        base = os.path.abspath(f"conversa_{agora}_{main_window.tab_counter}")
+        self.log_json = base + ".json"
+        self.log_txt = base + ".txt"
+        self.log = ConversationLog(base + ".jsonl")
+        # posição no log da primeira mensagem em memória (avança ao limpar) e
+        # onde começa a conversa (idem); entre as duas, mensagens ainda por ler
+        # de uma sessão reposta (ver load_older)
+        self.log_start = 0
+        self.log_origin = 0
+        # sessão reposta: entrada do diário ainda por ler (separador nunca
+        # aberto), pergunta que ficou sem resposta e mensagem a mostrar no topo
+        self.restore_entry = None
+        self.interrupted = None
+        self._scroll_to = None
+        # mensagens de sistema que ainda só estão no log (fixas no contexto)
+        self.pinned = []
+        # salto (pesquisa) para o fim do pedido em curso: ver jump_to_position
+        self._jump_after = None
+
+        # Worker (inicialmente nenhum) e leitura de um import em curso
+        self.worker = None
+        self.loader = None
+        self._load_error = None
+        self._context_info = None
+        # resposta em curso: payload enviado (para a cache), deltas já recebidos
+        # e se o stream já começou; resumo recusado pela API nesta conversa
+        self._pending_payload = None
+        self._partial = []
+        self._stream_started = False
+        self._skip_summary = False
+        # modo "N alternativas": pedidas, recebidas, último erro e início
+        self._candidates_total = 0
+        self._candidates_done = 0
+        self._candidates_error = None
+        self._candidates_start = 0.0
+        # continuação pedida de antemão (ver _start_prefetch)
+        self._prefetch = None
+        self._last_prewarm = 0.0
+
+        self._build_ui()
+
+    def _build_ui(self):
+        self.layout = QVBoxLayout(self)
+
+        # histórico numa lista virtualizada (aguenta conversas muito grandes)
+        self.transcript = TranscriptModel(self)
+        self.chat_view = TranscriptView(self.transcript)
+        self.chat_view.reached_top.connect(self.load_older)
+        self.chat_view.scrolled.connect(self.main_window.schedule_session_save)
+        self.layout.addWidget(self.chat_view)
+
+        # modo "N alternativas": as respostas aparecem aqui à medida que chegam
+        self.candidates_box = QWidget()
+        box = QVBoxLayout(self.candidates_box)
+        box.setContentsMargins(0, 0, 0, 0)
+        self.candidates_label = QLabel()
+        box.addWidget(self.candidates_label)
+        self.candidate_list = QListWidget()
+        self.candidate_list.setWordWrap(True)
+        self.candidate_list.setMaximumHeight(220)
+        self.candidate_list.itemActivated.connect(self.pick_candidate)
+        box.addWidget(self.candidate_list)
+        row = QHBoxLayout()
+        use_button = QPushButton("Usar esta")
+        use_button.clicked.connect(lambda: self.pick_candidate(self.candidate_list.currentItem()))
+        row.addWidget(use_button, 1)
+        discard_button = QPushButton("Descartar")
+        discard_button.clicked.connect(self.discard_candidates)
+        row.addWidget(discard_button)
+        box.addLayout(row)
+        self.candidates_box.hide()
+        self.layout.addWidget(self.candidates_box)
 
         self.input_text = QTextEdit()
         self.input_text.setPlaceholderText("Escreve a tua mensagem...")
         self.input_text.setFixedHeight(110)
+        self.input_text.textChanged.connect(self.on_input_changed)
         self.layout.addWidget(self.input_text)
 
+        buttons = QHBoxLayout()
         self.send_button = QPushButton("Enviar")
         self.send_button.clicked.connect(self.get_response)
-        self.layout.addWidget(self.send_button)
+        buttons.addWidget(self.send_button, 1)
+
+        # pede a continuação da última resposta (já pré-carregada, se a opção estiver activa)
+        self.continue_button = QPushButton("Continuar")
+        self.continue_button.clicked.connect(self.send_continue)
+        buttons.addWidget(self.continue_button)
+
+        # Parar: cancela o pedido em curso (mantém o texto já recebido)
+        self.stop_button = QPushButton("Parar")
+        self.stop_button.setShortcut("Esc")
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_request)
+        buttons.addWidget(self.stop_button)
+        self.layout.addLayout(buttons)
 
         self.progress_bar = QProgressBar()
         self.progress_bar.setRange(0, 0)  # indeterminado
         self.progress_bar.setVisible(False)
         self.layout.addWidget(self.progress_bar)
 
-    def add_message(self, role, content, write_log=True):
-        """Adiciona à lista de mensagens e escreve nos logs (JSON sobrescreve, TXT acrescenta)."""
-        entry = {"role": role, "content": content}
-        self.messages.append(entry)
+    @property
+    def busy(self):
+        return self.worker is not None or self.loader is not None
 
-        if write_log:
-            # JSON (sobrescreve com todo o histórico)
-            try:
-                with open(self.log_json, "w", encoding="utf-8") as f:
-                    json.dump(self.messages, f, ensure_ascii=False, indent=4)
-            except Exception as e:
-                # não bloqueia a execução; mostra aviso no chat
-                self.chat_display.append(f"⚠️ Não foi possível gravar log JSON: {e}")
+    @property
+    def partial(self):
+        """Há mensagens antigas da conversa ainda só no log (sessão reposta)."""
+        return self.log_start > self.log_origin
 
-            # TXT (apende)
-            try:
-                with open(self.log_txt, "a", encoding="utf-8") as f:
-                    prefix = "Tu" if role == "user" else "ChatGPT"
-                    f.write(f"{prefix}: {content}\n\n")
-            except Exception as e:
-                self.chat_display.append(f"⚠️ Não foi possível gravar log TXT: {e}")
-
-    def render_messages(self):
-        """Renderiza o histórico completo no display (limpa e reescreve)."""
-        self.chat_display.clear()
-        for msg in self.messages:
-            role = msg.get("role", "")
-            content = msg.get("content", "")
-            if role == "user":
-                self.chat_display.append(f"🧑 Tu: {content}\n")
-            elif role == "assistant":
-                self.chat_display.append(f"🤖 ChatGPT: {content}\n")
+    def history(self):
+        """O que o contexto vê: as mensagens em memória e, numa sessão reposta, as de sistema antigas."""
+        return self.pinned + list(self.messages) if self.pinned else self.messages
+
+    def export_messages(self):
+        """A conversa inteira (dicts), incluindo o que ainda só está no log."""
+        older = []
+        if self.partial:
+            older = list(itertools.islice(iter_messages(self.log.path), self.log_origin, self.log_start))
+        return older + self.messages.to_dicts()
+
+    def add_message(self, role, content, write_log=True, truncated=False):
+        """Adiciona à lista de mensagens e envia para os logs (JSONL e TXT acrescentam).
+
+        truncated=True marca uma resposta interrompida pelo utilizador.
+        """
+        with metrics.timer("add_message_seconds"):
+            message = self.messages.append(role, content, truncated)
+
+            if write_log:
+                # a escrita em disco é feita pelo LogWriter (não bloqueia a GUI)
+                self.main_window.log_writer.append(self.log, self.log_txt, message.to_dict())
+
+    def render_messages(self, full=False):
+        """Renderiza o histórico: só as mensagens novas, ou tudo com full=True."""
+        with metrics.timer("render_seconds"):
+            if full:
+                self.transcript.rebuild(self.messages)
             else:
-                # mostra roles desconhecidos de forma neutra
-                self.chat_display.append(f"{role}: {content}\n")
+                self.transcript.append_new(self.messages)
+            self.chat_view.scroll_to_end()
 
-    def set_ui_busy(self, busy: bool):
-        """Activa/desactiva controlos enquanto uma request está em curso."""
+    def show_notice(self, text):
+        """Linha informativa no display (não entra no histórico)."""
+        self.transcript.append_notice(text)
+        self.chat_view.scroll_to_end()
+
+    def set_busy(self, busy: bool):
+        """Activa/desactiva os controlos deste separador enquanto um pedido está em curso."""
         self.send_button.setEnabled(not busy)
-        self.action_import.setEnabled(not busy)
-        self.action_export_json.setEnabled(not busy)
-        self.action_export_txt.setEnabled(not busy)
-        self.action_clear.setEnabled(not busy)
+        self.continue_button.setEnabled(not busy)
+        self.stop_button.setEnabled(busy and self.worker is not None)
         self.progress_bar.setVisible(busy)
+        self.main_window.on_tab_busy_changed(self)
+        if not busy and self._jump_after is not None:
+            # depois de a resposta entrar no histórico
+            QTimer.singleShot(0, self._jump_deferred)
 
     def get_response(self):
-        """Inicia o pedido ao ChatGPT (executado em thread)."""
+        """Inicia o pedido ao ChatGPT (executado no pool de threads)."""
         pergunta = self.input_text.toPlainText().strip()
         if not pergunta:
             QMessageBox.warning(self, "Aviso", "Escreve uma mensagem primeiro!")
             return
+        # as opções (menus) têm de existir antes do primeiro pedido
+        self.main_window.finish_setup()
 
-        if not API_KEY or API_KEY == "AQUI_A_TUA_CHAVE":
-            QMessageBox.critical(self, "Erro", "Por favor configura a variável API_KEY no script antes de enviar.")
+        if not self.main_window.router.ready():
+            QMessageBox.critical(self, "Erro", "Por favor configura a variável API_KEY no script "
+                                 "(ou um backend em backends.json) antes de enviar.")
             return
 
+        # alternativas por escolher ficam para trás; a continuação pré-carregada
+        # só serve se for mesmo isso que se pede
+        self.discard_candidates()
+        prefetch = self._take_prefetch(pergunta)
+        # uma pergunta nova deixa para trás a que ficou sem resposta
+        self.interrupted = None
+
         # 1) adiciona mensagem do utilizador ao histórico e grava
         self.add_message("user", pergunta)
 
@@ -216,79 +997,1246 @@ class ChatGPTApp(QMainWindow):
         self.render_messages()
         self.input_text.clear()
 
-        # 3) mostra indicador temporário de escrita (UI busy)
-        self.chat_display.append("🤖 ChatGPT está a escrever...\n")
-        self.set_ui_busy(True)
+        # 3) mostra indicador temporário de escrita (separador ocupado)
+        self.transcript.show_pending("🤖 ChatGPT está a escrever...")
+        self.chat_view.scroll_to_end()
 
-        # 4) prepara payload e worker
-        payload = {
-            "model": "gpt-3.5-turbo",
-            "messages": self.messages,
-            "max_tokens": 400,
-            "temperature": 0.7
-        }
+        # 4) prepara payload e worker (resumindo primeiro o histórico antigo, se pedido)
+        if prefetch is not None:
+            self._use_prefetch(prefetch)
+            return
+        self._skip_summary = False
+        self._send_request()
 
-        self.worker = ApiWorker(API_KEY, API_URL, payload, timeout=30)
-        self.worker.result.connect(self.on_worker_result)
-        self.worker.start()
+    def send_continue(self):
+        """Botão "Continuar"."""
+        self.input_text.setPlainText(CONTINUE_PROMPT)
+        self.get_response()
+
+    def _start_worker(self, payload, on_result, on_chunk=None, priority=INTERACTIVE):
+        self.worker = ApiWorker(self.main_window.router, payload, timeout=30,
+                                scheduler=self.main_window.scheduler, priority=priority)
+        self.worker.signals.result.connect(on_result)
+        self.worker.signals.queued.connect(self.on_worker_queued)
+        if on_chunk is not None:
+            self.worker.signals.chunk.connect(on_chunk)
+        self.set_busy(True)
+        self.main_window.pool.start(self.worker)
+
+    def _send_request(self):
+        """Envia o pedido principal, ou antes disso o resumo de um bloco antigo."""
+        main = self.main_window
+        context = main.context
+        block = None if self._skip_summary else context.pending_summary(self.history())
+        if block is not None:
+            main.statusBar().showMessage(f"A resumir {len(block)} mensagens antigas...")
+            payload = {
+                "model": MODEL,
+                "messages": context.summary_request(block),
+                "max_tokens": MAX_TOKENS,
+                "temperature": 0
+            }
+            # o resumo é trabalho de fundo: envios interactivos de outros separadores passam à frente
+            self._start_worker(payload, lambda result, b=block: self.on_summary_result(b, result),
+                               priority=BACKGROUND)
+            return
+
+        with metrics.timer("request_build_seconds"):
+            messages, self._context_info = context.build(self.history())
+            payload = {
+                "model": MODEL,
+                "messages": messages,
+                "max_tokens": MAX_TOKENS,
+                "temperature": 0.7
+            }
+        if main.action_stream.isChecked():
+            payload["stream"] = True
+        self._stream_started = False
+        self._partial = []
+        self._pending_payload = payload
+
+        if main.candidates > 1:
+            self._start_candidates(payload, main.candidates)
+            return
+
+        # cache: um pedido igual já respondido dispensa a chamada à API
+        if main.action_cache.isChecked():
+            cached = main.cache.get(payload, force=main.action_cache_force.isChecked())
+            main.update_cache_label()
+            if cached is not None:
+                self.worker = None
+                self.on_worker_result({"ok": True, "content": cached, "cached": True,
+                                       "payload_bytes": 0})
+                return
+
+        self._start_worker(payload, self.on_worker_result, self.on_worker_chunk)
+
+    def on_summary_result(self, block, result):
+        """Guarda o resumo em cache e segue para o pedido principal."""
+        metrics.record_result(result)
+        if result.get("ok"):
+            self.main_window.context.store_summary(block, result.get("content", ""))
+        else:
+            # sem resumo, a janela deslizante corta o excesso
+            self._skip_summary = True
+        self._send_request()
+
+    def show_context_info(self, result):
+        """Mostra na barra de estado o payload efectivamente enviado e os tempos do pedido."""
+        info = self._context_info
+        status = self.main_window.statusBar()
+        if result.get("cached"):
+            status.showMessage(
+                f"Resposta da cache ({info['messages']} mensagens, ~{info['tokens']} tokens não enviados)")
+            return
+        payload_bytes = result.get("payload_bytes", 0)
+        timing = result.get("timing")
+        text = (f"{self.title}: {info['messages']}/{info['total']} mensagens enviadas, "
+                f"~{info['tokens']} tokens, {payload_bytes / 1024:.1f} KB")
+        if info["summarized"]:
+            text += f" · {info['summarized']} resumidas"
+        if info["dropped"]:
+            text += f" · {info['dropped']} omitidas"
+        if len(self.main_window.router.backends) > 1 and result.get("backend"):
+            text += f" · via {result['backend']}"
+        if timing:
+            text += " | " + format_timing(timing)
+        status.showMessage(text)
+
+    def on_worker_queued(self, position, waited):
+        """Mostra a posição na fila do scheduler e há quanto tempo o pedido espera."""
+        if self.worker is None:
+            return
+        if position < 0:
+            self.transcript.show_pending("🤖 ChatGPT está a escrever...")
+            return
+        if position == 0:
+            text = f"⏳ Próximo na fila (limite de pedidos), à espera há {waited:.0f} s..."
+        else:
+            text = f"⏳ Na fila: {position} pedido(s) à frente, à espera há {waited:.0f} s..."
+        self.transcript.show_pending(text)
+        self.chat_view.scroll_to_end()
+
+    def on_worker_chunk(self, delta):
+        """Acrescenta um delta do stream ao último bloco do assistente."""
+        if not self._stream_started:
+            # primeiro chunk: troca o placeholder pelo início da resposta
+            self._stream_started = True
+            self.transcript.show_pending("🤖 ChatGPT: ")
+            self.chat_view.scroll_to_end()
+
+        self._partial.append(delta)
+        self.transcript.append_to_pending(delta)
+        metrics.count("stream_deltas_total")
 
     def on_worker_result(self, result):
         """Recebe resultado do worker (sucesso ou erro)."""
-        self.set_ui_busy(False)
+        # limpa referência ao worker
+        self.worker = None
+        self.set_busy(False)
+        metrics.record_result(result, tokens=estimate_tokens(result.get("content") or ""))
+        self.show_context_info(result)
 
         if result.get("ok"):
             content = result.get("content", "")
+            self._partial = []
+            main = self.main_window
+            if main.action_cache.isChecked() and not result.get("cached"):
+                main.cache.put(self._pending_payload, content, force=main.action_cache_force.isChecked())
             # adiciona resposta ao histórico (e grava)
             self.add_message("assistant", content)
-            # re-renderiza o histórico (remove o placeholder)
+            # troca a linha pendente (placeholder/stream) pela mensagem final
+            self.transcript.discard_pending()
             self.render_messages()
+            if main.action_prefetch.isChecked():
+                self._start_prefetch()
         else:
             error = result.get("error", "Erro desconhecido")
-            # remove placeholder re-renderizando (não adiciona ao histórico)
-            # mostra erro no ecrã
-            self.chat_display.append(f"⚠️ Erro: {error}\n")
+            # remove o placeholder (não adiciona ao histórico) e mostra erro no ecrã
+            self.transcript.discard_pending()
+            self.show_notice(f"⚠️ Erro: {error}")
             # também mostra uma caixa para chamar a atenção
             QMessageBox.critical(self, "Erro na API", str(error))
 
-        # limpa referência ao worker
+    def cancel_request(self):
+        """Cancela o pedido em curso (ou em fila) deste separador.
+
+        O que já chegou por streaming fica no histórico como resposta truncada.
+        """
+        if self.worker is None:
+            return
+        worker, self.worker = self.worker, None
+        worker.cancel()
+        # o worker cancelado não emite resultado: conta aqui
+        metrics.count("requests_total")
+        metrics.count("cancelled_total")
+        # ainda na fila do pool: sai sem chegar a correr
+        self._take_from_pool(worker)
+        self.transcript.discard_pending()
+        partial = "".join(self._partial)
+        if partial:
+            self.add_message("assistant", partial, truncated=True)
+            self.render_messages()
+        self.set_busy(False)
+
+    def _take_from_pool(self, worker):
+        for w in getattr(worker, "workers", (worker,)):
+            try:
+                self.main_window.pool.tryTake(w)
+            except RuntimeError:
+                # já terminou e foi apagado pelo pool
+                pass
+
+    # --- modo "N alternativas" ---
+
+    def _start_candidates(self, payload, count):
+        """O mesmo pedido `count` vezes em paralelo; cada resposta aparece ao chegar."""
+        payload = dict(payload)
+        # sem streaming: cada alternativa entra inteira na lista
+        payload.pop("stream", None)
+        self.candidate_list.clear()
+        self._candidates_total = count
+        self._candidates_done = 0
+        self._candidates_error = None
+        self._candidates_start = time.perf_counter()
+        workers = []
+        for i in range(count):
+            worker = ApiWorker(self.main_window.router, payload, timeout=30,
+                               scheduler=self.main_window.scheduler)
+            worker.signals.result.connect(lambda result, i=i: self.on_candidate_result(i, result))
+            worker.signals.queued.connect(self.on_worker_queued)
+            workers.append(worker)
+        self.worker = CandidateGroup(workers)
+        self._update_candidates_label()
+        self.candidates_box.show()
+        self.set_busy(True)
+        for worker in workers:
+            self.main_window.pool.start(worker)
+
+    def _update_candidates_label(self):
+        elapsed = time.perf_counter() - self._candidates_start
+        text = (f"Alternativas: {self.candidate_list.count()}/{self._candidates_total} "
+                f"({elapsed:.1f} s) — duplo clique ou «Usar esta» para escolher")
+        if self._candidates_error:
+            text += f" · ⚠️ {self._candidates_error}"
+        self.candidates_label.setText(text)
+
+    def on_candidate_result(self, index, result):
+        if not isinstance(self.worker, CandidateGroup):
+            return
+        metrics.record_result(result, tokens=estimate_tokens(result.get("content") or ""))
+        self._candidates_done += 1
+        if result.get("ok"):
+            content = result.get("content", "")
+            item = QListWidgetItem(f"{index + 1}. {content}")
+            item.setData(Qt.UserRole, content)
+            self.candidate_list.addItem(item)
+            if self.candidate_list.count() == 1:
+                self.candidate_list.setCurrentRow(0)
+        else:
+            self._candidates_error = result.get("error", "Erro desconhecido")
+        self._update_candidates_label()
+        if self._candidates_done < self._candidates_total:
+            return
+        # todas chegaram: o tempo total deve ficar perto do de um só pedido
+        metrics.observe("candidates_seconds", time.perf_counter() - self._candidates_start)
         self.worker = None
+        self.set_busy(False)
+        self.transcript.discard_pending()
+        self.show_context_info(result)
+        if not self.candidate_list.count():
+            self.candidates_box.hide()
+            self.show_notice(f"⚠️ Erro: {self._candidates_error}")
 
-    def clear_conversation(self):
+    def pick_candidate(self, item):
+        """Passa a alternativa escolhida para o histórico (e para os logs)."""
+        if item is None:
+            return
+        if isinstance(self.worker, CandidateGroup):
+            # as que ainda não chegaram já não interessam
+            group, self.worker = self.worker, None
+            group.cancel()
+            self._take_from_pool(group)
+            self.set_busy(False)
+        self.transcript.discard_pending()
+        self.add_message("assistant", item.data(Qt.UserRole))
+        self.render_messages()
+        self.discard_candidates()
+        if self.main_window.action_prefetch.isChecked():
+            self._start_prefetch()
+
+    def discard_candidates(self):
+        """Esconde a lista de alternativas (as não escolhidas não entram no histórico)."""
+        if isinstance(self.worker, CandidateGroup):
+            self.cancel_request()
+        self.candidate_list.clear()
+        self.candidates_box.hide()
+
+    # --- pré-aquecimento e pré-carregamento ---
+
+    def on_input_changed(self):
+        """Enquanto se escreve, abre já a ligação ao backend (no máximo a cada PREWARM_INTERVAL)."""
+        main = self.main_window
+        if not main._ready or not main.action_prefetch.isChecked():
+            return
+        now = time.monotonic()
+        if now - self._last_prewarm < PREWARM_INTERVAL:
+            return
+        self._last_prewarm = now
+        main.pool.start(PrewarmTask(main.router))
+
+    def _start_prefetch(self):
+        """Pede já a continuação da última resposta, enquanto o utilizador a lê.
+
+        Vai com prioridade de fundo e sem streaming; se o próximo envio for o
+        CONTINUE_PROMPT (botão "Continuar"), a resposta já está pronta ou a caminho.
+        """
+        self.cancel_prefetch()
+        main = self.main_window
+        history = list(self.history()) + [Message("user", CONTINUE_PROMPT)]
+        messages, info = main.context.build(history)
+        payload = {
+            "model": MODEL,
+            "messages": messages,
+            "max_tokens": MAX_TOKENS,
+            "temperature": 0.7
+        }
+        worker = ApiWorker(main.router, payload, timeout=30, scheduler=main.scheduler,
+                           priority=BACKGROUND)
+        prefetch = {"worker": worker, "length": len(self.messages), "payload": payload,
+                    "info": info, "result": None, "adopted": False}
+        worker.signals.result.connect(lambda result, p=prefetch: self._on_prefetch_result(p, result))
+        self._prefetch = prefetch
+        metrics.count("prefetch_total")
+        main.pool.start(worker)
+
+    def _on_prefetch_result(self, prefetch, result):
+        if prefetch is not self._prefetch:
+            return
+        if prefetch["adopted"]:
+            # o utilizador já pediu a continuação: segue como um pedido normal
+            self._prefetch = None
+            self.on_worker_result(result)
+        elif result.get("ok"):
+            prefetch["result"] = result
+            prefetch["worker"] = None
+        else:
+            self._prefetch = None
+
+    def _take_prefetch(self, text):
+        """A continuação pré-carregada, se `text` é o CONTINUE_PROMPT e o histórico não mudou.
+
+        Só o texto exacto: é esse que foi enviado no pedido e vai para o log.
+        """
+        prefetch = self._prefetch
+        if prefetch is not None and text == CONTINUE_PROMPT and prefetch["length"] == len(self.messages):
+            return prefetch
+        self.cancel_prefetch()
+        return None
+
+    def _use_prefetch(self, prefetch):
+        metrics.count("prefetch_hits_total")
+        self._context_info = prefetch["info"]
+        self._pending_payload = prefetch["payload"]
+        self._stream_started = False
+        self._partial = []
+        if prefetch["result"] is not None:
+            self._prefetch = None
+            self.on_worker_result(prefetch["result"])
+        else:
+            # ainda a caminho: o worker passa a ser o pedido deste separador
+            prefetch["adopted"] = True
+            self.worker = prefetch["worker"]
+            self.worker.signals.queued.connect(self.on_worker_queued)
+            self.set_busy(True)
+
+    def cancel_prefetch(self):
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is None or prefetch["adopted"] or prefetch["worker"] is None:
+            return
+        prefetch["worker"].cancel()
+        self._take_from_pool(prefetch["worker"])
+
+    def stop_request(self):
+        """Botão "Parar"."""
+        if self.worker is None:
+            return
+        self.cancel_request()
+        self.main_window.statusBar().showMessage(f"{self.title}: pedido interrompido.")
+
+    def clear(self):
         """Limpa apenas o histórico em memória e display; não remove ficheiros já escritos."""
-        self.messages = []
-        self.chat_display.clear()
-        self.chat_display.append("🔄 Conversa limpa.\n")
+        self.cancel_prefetch()
+        self.discard_candidates()
+        self.log_start += len(self.messages)
+        self.log_origin = self.log_start
+        self.pinned = []
+        self.reset_messages()
+        self.render_messages(full=True)
+        self.show_notice("🔄 Conversa limpa.")
 
-    def import_conversation(self):
-        """Importa um ficheiro JSON com o histórico e passa a gravar nesse ficheiro."""
-        file_name, _ = QFileDialog.getOpenFileName(self, "Importar Conversa", "", "JSON Files (*.json);;All Files (*)")
-        if not file_name:
+    def reset_messages(self):
+        """Começa um histórico vazio; o anterior fecha o seu ficheiro de spill."""
+        self.messages.close()
+        self.messages = MessageStore(spill_after=MEMORY_MESSAGES)
+
+    def load(self, file_name, position=None, skip=0):
+        """Importa um ficheiro JSON/JSONL em background; as mensagens aparecem aos lotes.
+
+        No fim passa a gravar junto do ficheiro importado e, se `position` for
+        dada, mostra essa mensagem. Devolve logo; um erro é avisado com um QMessageBox.
+        skip: mensagens do início do ficheiro que não entram (ex.: já limpas).
+        """
+        self.jump_to = position
+        self.pinned = []
+        self.cancel_prefetch()
+        self.discard_candidates()
+        self.reset_messages()
+        self.render_messages(full=True)
+        self.loader = TranscriptLoader(file_name, skip)
+        self.loader.batch.connect(self.on_load_batch)
+        self.loader.failed.connect(self.on_load_failed)
+        self.loader.finished.connect(self.on_load_finished)
+        self._load_error = None
+        self.set_busy(True)
+        self.main_window.statusBar().showMessage(f"A importar {os.path.basename(file_name)}...")
+        self.loader.start()
+
+    def on_load_batch(self, items):
+        first = not self.messages
+        self.messages.extend(items)
+        if first:
+            # o primeiro ecrã aparece logo; o resto entra na vista no fim da leitura
+            self.transcript.append_new(self.messages)
+            self.chat_view.scroll_to_top()
+        self.main_window.statusBar().showMessage(f"{self.title}: {len(self.messages)} mensagens lidas...")
+
+    def on_load_failed(self, error):
+        self._load_error = error
+
+    def on_load_finished(self):
+        loader, self.loader = self.loader, None
+        if loader is None:
+            # separador fechado a meio da leitura
+            return
+        main = self.main_window
+        if self._load_error is not None:
+            # import falhado: o separador volta a ficar vazio
+            self.reset_messages()
+            self.render_messages(full=True)
+            self.set_busy(False)
+            main.statusBar().clearMessage()
+            QMessageBox.critical(self, "Erro", f"Falha ao importar: {self._load_error}")
+            return
+
+        self.log_start = self.log_origin = loader.skip
+        if os.path.abspath(loader.file_name) != self.log.path:
+            # passa a gravar junto do ficheiro importado: JSONL (append), TXT
+            # paralelo e o JSON antigo gerado por compactação
+            writer = main.log_writer
+            base, ext = os.path.splitext(os.path.abspath(loader.file_name))
+            writer.close_log(self.log)
+            self.log = ConversationLog(base + ".jsonl")
+            if ext.lower() != ".jsonl":
+                writer.rewrite(self.log, self.messages.to_dicts())
+            self.log_json = base + ".json"
+            self.log_txt = base + ".txt"
+            self.title = os.path.basename(base)
+
+        # mostra o fim da conversa, para a continuar (ou a mensagem procurada)
+        self.render_messages(full=True)
+        if self.jump_to is not None:
+            self.show_message(self.jump_to)
+        self.set_busy(False)
+        main.statusBar().showMessage(f"{self.title}: {len(self.messages)} mensagens importadas.")
+
+    def jump_to_position(self, position):
+        """Como show_message, mas lê primeiro o resto do log numa sessão reposta.
+
+        Com um pedido em curso a leitura (que troca o histórico) fica para
+        quando ele acabar. Devolve False se a mensagem já não estiver na conversa.
+        """
+        if self.loader is not None:
+            # ainda a ler o ficheiro: salta no fim da leitura
+            self.jump_to = position
+            return True
+        if self.partial and self.log_origin <= position < self.log_start:
+            if self.worker is not None:
+                self._jump_after = position
+            else:
+                self.load(self.log.path, position, skip=self.log_origin)
+            return True
+        return self.show_message(position)
+
+    def _jump_deferred(self):
+        position, self._jump_after = self._jump_after, None
+        if position is None:
+            return
+        if self.busy:
+            self._jump_after = position
             return
+        self.jump_to_position(position)
+
+    def show_message(self, position):
+        """Mostra a mensagem nº `position` do log (contada desde o início do ficheiro)."""
+        index = position - self.log_start
+        if not 0 <= index < len(self.messages):
+            return False
+        return self.chat_view.show_message(self.messages[index])
+
+    # --- sessão (ver session_journal.py) ---
+
+    def session_state(self):
+        """Entrada deste separador no diário da sessão (None se não houver nada a repor)."""
+        if self.restore_entry is not None:
+            # ainda não foi aberto: fica como estava
+            return self.restore_entry
+        if not self.messages and not self.partial and self.worker is None:
+            return None
+        entry = {"log": self.log.path, "title": self.title, "start": self.log_origin,
+                 "scroll": None, "pending": None}
+        if not self.chat_view.at_end():
+            row = self.chat_view.first_visible_row()
+            if row is not None:
+                entry["scroll"] = self.transcript.messages_from(row) or None
+        if self.worker is not None and self.messages and self.messages[-1].role == "user":
+            entry["pending"] = {"prompt": self.messages[-1].content}
+        elif self.interrupted is not None:
+            entry["pending"] = {"prompt": self.interrupted}
+        return entry
 
+    def attach(self, entry):
+        """Passa a usar a conversa de uma entrada do diário (lida por ensure_restored)."""
+        base = os.path.splitext(entry["log"])[0]
+        self.log = ConversationLog(base + ".jsonl")
+        self.log_json = base + ".json"
+        self.log_txt = base + ".txt"
+        self.title = entry.get("title") or os.path.basename(base)
+        self.restore_entry = entry
+
+    def ensure_restored(self):
+        """Lê o fim do log da conversa reposta (só o que vai estar à vista)."""
+        entry, self.restore_entry = self.restore_entry, None
+        if entry is None:
+            return
+        origin = entry.get("start") or 0
+        scroll = entry.get("scroll")
+        count = RESTORE_MESSAGES
+        if scroll:
+            # a mensagem que estava no topo e um ecrã acima dela
+            count = min(max(count, scroll + RESTORE_MESSAGES // 2), RESTORE_MAX_MESSAGES)
         try:
-            with open(file_name, "r", encoding="utf-8") as f:
-                loaded = json.load(f)
+            first, items, kept = tail_messages(self.log.path, count, keep_roles=("system",))
+        except (OSError, ValueError) as e:
+            self.show_notice(f"⚠️ Não foi possível repor a conversa: {e}")
+            return
+        if first < origin:
+            items = items[origin - first:]
+            first = origin
+        self.pinned = [Message.from_dict(item) for position, item in kept if origin <= position < first]
+        self.messages.extend(items)
+        self.log_start, self.log_origin = first, origin
+        self.render_messages(full=True)
+        if scroll and scroll <= len(self.messages):
+            # posicionado quando o separador estiver à vista (com o tamanho final)
+            self._scroll_to = self.messages[-scroll]
+            if self.isVisible():
+                QTimer.singleShot(0, self.apply_scroll)
+        pending = entry.get("pending") or {}
+        if (pending.get("prompt") and self.messages and self.messages[-1].role == "user"
+                and self.messages[-1].content == pending["prompt"]):
+            self.interrupted = pending["prompt"]
 
-            if not isinstance(loaded, list):
-                raise ValueError("O ficheiro JSON não contém uma lista de mensagens.")
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self._scroll_to is not None:
+            QTimer.singleShot(0, self.apply_scroll)
 
-            # valida os elementos básicos (role + content)
-            for item in loaded:
-                if not isinstance(item, dict) or "role" not in item or "content" not in item:
-                    raise ValueError("Formato inválido: cada item deve ter 'role' e 'content'.")
+    def apply_scroll(self):
+        message, self._scroll_to = self._scroll_to, None
+        if message is not None:
+            self.chat_view.show_message(message, select=False)
 
-            # substitui o histórico atual pelo importado
-            self.messages = loaded
+    def load_older(self):
+        """Chegou ao topo de uma conversa reposta: lê o resto do log em background."""
+        if not self.partial or self.busy:
+            return
+        self.load(self.log.path, position=self.log_start, skip=self.log_origin)
 
-            # passa a gravar no mesmo ficheiro importado (com suporte TXT paralelo)
-            self.log_json = os.path.abspath(file_name)
-            base, _ = os.path.splitext(self.log_json)
-            self.log_txt = base + ".txt"
+    def resend(self):
+        """Volta a enviar a pergunta que ficou sem resposta (já está no histórico)."""
+        prompt, self.interrupted = self.interrupted, None
+        if prompt is None or self.busy:
+            return
+        self.transcript.show_pending("🤖 ChatGPT está a escrever...")
+        self.chat_view.scroll_to_end()
+        self._skip_summary = False
+        self._send_request()
 
-            self.render_messages()
-            QMessageBox.information(self, "Importar", "Conversa importada com sucesso.")
+    def cancel_load(self):
+        """Interrompe um import em curso (ao fechar o separador)."""
+        if self.loader is None:
+            return
+        loader, self.loader = self.loader, None
+        loader.requestInterruption()
+        loader.wait()
+
+    def compact_log(self):
+        """Gera o JSON completo (formato antigo) a partir do log JSONL (em background)."""
+        self.main_window.log_writer.compact(self.log, self.log_json)
+
+    def archive_log(self):
+        """Guarda a conversa (o log inteiro) no arquivo comprimido, em background."""
+        self.main_window.log_writer.archive(self.log, ARCHIVE_FILE)
+
+    def close_conversation(self):
+        """Cancela o pedido em curso e fecha os logs deste separador."""
+        self._jump_after = None
+        self.cancel_load()
+        self.cancel_request()
+        self.cancel_prefetch()
+        self.compact_log()
+        self.main_window.log_writer.close_log(self.log)
+
+
+class SearchPanel(QDockWidget):
+    """Pesquisa nas conversas guardadas (índice FTS5, ver search_index.py).
+
+    Pesquisa enquanto se escreve (com um pequeno atraso); os resultados vêm
+    por relevância e um duplo clique (ou Enter) emite open_requested(ficheiro,
+    posição da mensagem).
+    """
+    open_requested = pyqtSignal(str, int)
+
+    DELAY_MS = 250
+    LIMIT = 50
+
+    def __init__(self, index_path, parent=None):
+        super().__init__("Pesquisa", parent)
+        self.setObjectName("search_panel")
+        self.index_path = index_path
+        self.index = None  # ligação só de leitura, aberta na primeira pesquisa
+
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(4, 4, 4, 4)
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText("Pesquisar nas conversas guardadas...")
+        self.query_edit.setClearButtonEnabled(True)
+        layout.addWidget(self.query_edit)
+        self.results = QListWidget()
+        self.results.setWordWrap(True)
+        self.results.setAlternatingRowColors(True)
+        layout.addWidget(self.results)
+        self.status = QLabel()
+        layout.addWidget(self.status)
+        self.setWidget(widget)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.DELAY_MS)
+        self._timer.timeout.connect(self.run_search)
+        self.query_edit.textChanged.connect(lambda _: self._timer.start())
+        self.query_edit.returnPressed.connect(self.run_search)
+        self.results.itemActivated.connect(self._on_activated)
+
+    def focus(self):
+        self.show()
+        self.raise_()
+        self.query_edit.setFocus()
+        self.query_edit.selectAll()
+
+    def run_search(self):
+        self._timer.stop()
+        self.results.clear()
+        text = self.query_edit.text().strip()
+        if not text:
+            self.status.clear()
+            return
+        if self.index is None:
+            from search_index import SearchIndex
+            self.index = SearchIndex(self.index_path)
+        start = time.perf_counter()
+        try:
+            found = self.index.search(text, self.LIMIT)
         except Exception as e:
-            QMessageBox.critical(self, "Erro", f"Falha ao importar: {e}")
+            self.status.setText(f"Erro na pesquisa: {e}")
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        metrics.observe("search_seconds", elapsed / 1000)
+        for r in found:
+            who = "Tu" if r["role"] == "user" else "ChatGPT"
+            name = os.path.splitext(os.path.basename(r["source"]))[0]
+            item = QListWidgetItem(f"{name} · #{r['position'] + 1} {who}\n{r['snippet']}")
+            item.setData(Qt.UserRole, (r["source"], r["position"]))
+            item.setToolTip(r["source"])
+            self.results.addItem(item)
+        if found:
+            self.status.setText(f"{len(found)} resultados ({elapsed:.0f} ms)")
+        else:
+            self.status.setText("Sem resultados.")
+
+    def _on_activated(self, item):
+        source, position = item.data(Qt.UserRole)
+        self.open_requested.emit(source, position)
+
+    def close_index(self):
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+
+class PerformancePanel(QDockWidget):
+    """Painel "Desempenho": p50/p95 das métricas (metrics.py), actualizado a cada segundo.
+
+    Tempos em ms; o débito em tokens/s e os tamanhos em KB. Os contadores
+    aparecem no fim, só com o total.
+    """
+
+    REFRESH_MS = 1000
+    COLUMNS = ("Métrica", "n", "p50", "p95", "máx")
+
+    def __init__(self, parent=None):
+        super().__init__("Desempenho", parent)
+        self.setObjectName("performance_panel")
+
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(4, 4, 4, 4)
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        export_button = QPushButton("Exportar...")
+        export_button.clicked.connect(self.export)
+        reset_button = QPushButton("Limpar")
+        reset_button.clicked.connect(self.reset)
+        buttons.addWidget(export_button)
+        buttons.addWidget(reset_button)
+        layout.addLayout(buttons)
+        self.setWidget(widget)
+
+        # só actualiza enquanto está visível
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.REFRESH_MS)
+        self._timer.timeout.connect(self.refresh)
+        self.visibilityChanged.connect(self._on_visibility_changed)
+
+    def _on_visibility_changed(self, visible):
+        if visible:
+            self.refresh()
+            self._timer.start()
+        else:
+            self._timer.stop()
+
+    @staticmethod
+    def _format(name, value):
+        if name.endswith("_seconds"):
+            return f"{value * 1000:.1f} ms"
+        if name.endswith("_bytes"):
+            return f"{value / 1024:.1f} KB"
+        if name.endswith("_per_second"):
+            return f"{value:.0f}/s"
+        return f"{value:.3g}"
+
+    def refresh(self):
+        snap = metrics.snapshot()
+        rows = []
+        for name, s in snap["summaries"].items():
+            rows.append((name, str(s["count"]), self._format(name, s["p50"]),
+                         self._format(name, s["p95"]), self._format(name, s["max"])))
+        for name, value in snap["counters"].items():
+            rows.append((name, str(value), "", "", ""))
+        self.table.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            for c, text in enumerate(row):
+                item = QTableWidgetItem(text)
+                if c:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(r, c, item)
+
+    def export(self):
+        file_name, _ = QFileDialog.getSaveFileName(
+            self, "Exportar métricas", "metricas.prom",
+            "Prometheus (*.prom *.txt);;CSV (*.csv)")
+        if not file_name:
+            return
+        try:
+            metrics.write(file_name)
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Falha ao exportar métricas: {e}")
+
+    def reset(self):
+        metrics.REGISTRY.reset()
+        self.refresh()
+
+
+class ChatGPTApp(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("ChatGPT API - Qt App (corrigido)")
+        self.setGeometry(200, 200, 800, 700)
+
+        # Janela de contexto: o que do histórico segue em cada pedido (partilhada)
+        self.context = ContextManager(MODEL, max_tokens=MAX_TOKENS)
+
+        # Cache de respostas (opt-in; criada quando é activada)
+        self.cache = None
+
+        # Pool partilhado pelos separadores (limite global de pedidos em paralelo)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(MAX_WORKERS)
+        # nº de respostas por envio (modo "N alternativas")
+        self.candidates = 1
+
+        # fila com prioridades e limites rpm/tpm à frente de todos os pedidos
+        self.scheduler = RequestScheduler(RATE_RPM, RATE_TPM)
+        # backends (routing por latência e failover)
+        default_backend = OpenAIBackend("openai", API_URL, API_KEY)
+        try:
+            self.router = load_router(BACKENDS_FILE, default_backend)
+        except (OSError, ValueError) as e:
+            self.router = load_router(None, default_backend)
+            self.statusBar().showMessage(f"backends.json ignorado: {e}")
+
+        # Escrita dos logs em thread própria
+        self.log_writer = LogWriter()
+        self.log_writer.error.connect(self.on_log_error)
+        self.log_writer.start()
+        # pesquisa nas conversas guardadas (criados no fim do arranque)
+        self.indexer = None
+        self.search_panel = None
+
+        # diário da sessão: gravado (em background) pouco depois de cada alteração
+        self.journal = SessionJournal(SESSION_FILE) if SESSION_FILE else None
+        if self.journal is not None and not self.journal.lock():
+            # outra instância já repôs estas conversas e grava nos mesmos logs
+            self.journal = None
+            self.statusBar().showMessage("A sessão já está aberta noutra janela: esta começa vazia.")
+        self._session_timer = QTimer(self)
+        self._session_timer.setSingleShot(True)
+        self._session_timer.setInterval(SESSION_SAVE_MS)
+        self._session_timer.timeout.connect(self.save_session)
+        self._session_saved = None      # último estado enviado (só grava se mudar)
+        self._restored = None
+        self._restore_rest = None       # separadores repostos depois da primeira pintura
+
+        # UI: só o essencial para a primeira pintura; o resto vem em finish_setup()
+        self.tab_counter = 0
+        self._ready = False
+        self.menu_bar = QMenuBar(self)
+        self.setMenuBar(self.menu_bar)
+        # os menus de topo existem já (a barra não muda de altura depois)
+        self.file_menu = self.menu_bar.addMenu("Ficheiro")
+        self.options_menu = self.menu_bar.addMenu("Opções")
+        self.help_menu = self.menu_bar.addMenu("Ajuda")
+        self._build_central()
+        if not self.restore_session():
+            self.new_tab()
+        startup.after_first_paint(self.finish_setup)
+
+    def finish_setup(self):
+        """Parte adiada do arranque: acções dos menus e barra de estado."""
+        if self._ready:
+            return
+        self._ready = True
+        self._build_menu()
+        self._build_search()
+        self._build_metrics()
+        self.cache_label = QLabel()
+        self.statusBar().addPermanentWidget(self.cache_label)
+        self.update_actions()
+        self.restore_remaining()
+        if self._restored is not None:
+            count, crashed = self._restored
+            self.statusBar().showMessage(
+                f"Sessão reposta: {count} conversa(s)" + (" (a app não tinha fechado bem)." if crashed else "."))
+            QTimer.singleShot(0, self.offer_resend)
+        startup.ready()
+
+    def _build_menu(self):
+        file_menu = self.file_menu
+        options_menu = self.options_menu
+        help_menu = self.help_menu
+
+        self.action_new_tab = QAction("Nova conversa", self)
+        self.action_new_tab.setShortcut("Ctrl+T")
+        self.action_new_tab.triggered.connect(self.new_tab)
+        file_menu.addAction(self.action_new_tab)
+
+        self.action_clear = QAction("Limpar conversa", self)
+        self.action_clear.triggered.connect(self.clear_conversation)
+        file_menu.addAction(self.action_clear)
+
+        self.action_import = QAction("Importar conversa JSON", self)
+        self.action_import.triggered.connect(self.import_conversation)
+        file_menu.addAction(self.action_import)
+
+        self.action_export_json = QAction("Exportar conversa JSON", self)
+        self.action_export_json.triggered.connect(self.export_conversation)
+        file_menu.addAction(self.action_export_json)
+
+        self.action_export_txt = QAction("Exportar conversa TXT", self)
+        self.action_export_txt.triggered.connect(self.export_conversation_txt)
+        file_menu.addAction(self.action_export_txt)
+
+        self.action_search = QAction("Pesquisar conversas", self)
+        self.action_search.setShortcut("Ctrl+Shift+F")
+        self.action_search.triggered.connect(self.show_search)
+        file_menu.addAction(self.action_search)
+
+        self.action_compact = QAction("Gerar JSON do log automático", self)
+        self.action_compact.triggered.connect(self.compact_log)
+        file_menu.addAction(self.action_compact)
+
+        self.action_archive = QAction("Arquivar conversa", self)
+        self.action_archive.triggered.connect(self.archive_log)
+        file_menu.addAction(self.action_archive)
+
+        file_menu.addSeparator()
+
+        self.action_exit = QAction("Sair", self)
+        self.action_exit.triggered.connect(self.close)
+        file_menu.addAction(self.action_exit)
+
+        # streaming: mostra a resposta à medida que chega
+        self.action_stream = QAction("Resposta em streaming", self)
+        self.action_stream.setCheckable(True)
+        self.action_stream.setChecked(True)
+        options_menu.addAction(self.action_stream)
+
+        # política da janela de contexto
+        context_menu = options_menu.addMenu("Contexto")
+        policy_group = QActionGroup(self)
+        for label, policy in (("Fixar mensagens de sistema", POLICY_PINNED),
+                              ("Janela deslizante", POLICY_SLIDING)):
+            action = QAction(label, self, checkable=True)
+            action.setChecked(policy == self.context.policy)
+            action.triggered.connect(lambda _, p=policy: setattr(self.context, "policy", p))
+            policy_group.addAction(action)
+            context_menu.addAction(action)
+        context_menu.addSeparator()
+        self.action_summarize = QAction("Resumir mensagens antigas", self, checkable=True)
+        self.action_summarize.toggled.connect(self.on_summarize_toggled)
+        context_menu.addAction(self.action_summarize)
+
+        # cache de respostas (opt-in)
+        cache_menu = options_menu.addMenu("Cache de respostas")
+        self.action_cache = QAction("Usar cache de respostas", self, checkable=True)
+        self.action_cache.toggled.connect(self.on_cache_toggled)
+        cache_menu.addAction(self.action_cache)
+        self.action_cache_force = QAction("Usar cache mesmo com temperatura > 0", self, checkable=True)
+        cache_menu.addAction(self.action_cache_force)
+
+        # várias respostas em paralelo para escolher uma
+        candidates_menu = options_menu.addMenu("Alternativas por pedido")
+        candidates_group = QActionGroup(self)
+        for count in range(1, MAX_CANDIDATES + 1):
+            action = QAction("1 (normal)" if count == 1 else f"{count} alternativas", self, checkable=True)
+            action.setChecked(count == self.candidates)
+            action.triggered.connect(lambda _, c=count: setattr(self, "candidates", c))
+            candidates_group.addAction(action)
+            candidates_menu.addAction(action)
+
+        # gasta pedidos especulativos: desligado por omissão
+        self.action_prefetch = QAction("Pré-aquecer ligação e pré-carregar continuação", self, checkable=True)
+        options_menu.addAction(self.action_prefetch)
+
+        self.action_rate_limits = QAction("Limites de pedidos...", self)
+        self.action_rate_limits.triggered.connect(self.edit_rate_limits)
+        options_menu.addAction(self.action_rate_limits)
+
+        self.action_performance = QAction("Painel de desempenho", self)
+        self.action_performance.triggered.connect(self.show_performance)
+        options_menu.addSeparator()
+        options_menu.addAction(self.action_performance)
+
+        about_action = QAction("Sobre", self)
+        about_action.triggered.connect(self.show_about)
+        help_menu.addAction(about_action)
+
+    def _build_search(self):
+        # o índice é actualizado em background: logs antigos no arranque, os
+        # novos à medida que o LogWriter os escreve
+        self.indexer = SearchIndexer(SEARCH_INDEX, LOG_DIR)
+        self.indexer.error.connect(self.on_log_error)
+        self.indexer.start()
+        self.log_writer.indexer = self.indexer
+
+        self.search_panel = SearchPanel(SEARCH_INDEX, self)
+        self.search_panel.open_requested.connect(self.open_search_result)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.search_panel)
+        self.search_panel.hide()
+
+    def _build_metrics(self):
+        self.performance_panel = PerformancePanel(self)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.performance_panel)
+        self.performance_panel.hide()
+        if METRICS_FILE:
+            self.metrics_timer = QTimer(self)
+            self.metrics_timer.timeout.connect(self.write_metrics)
+            self.metrics_timer.start(METRICS_INTERVAL_MS)
+
+    def write_metrics(self):
+        try:
+            metrics.write(METRICS_FILE)
+        except OSError as e:
+            self.statusBar().showMessage(f"Não foi possível exportar as métricas: {e}")
+
+    def _build_central(self):
+        self.tabs = QTabWidget()
+        self.tabs.setTabsClosable(True)
+        self.tabs.setMovable(True)
+        self.tabs.tabCloseRequested.connect(self.close_tab)
+        self.tabs.currentChanged.connect(self.on_current_tab_changed)
+        self.setCentralWidget(self.tabs)
+
+    # --- separadores ---
+
+    def current_tab(self):
+        return self.tabs.currentWidget()
+
+    def new_tab(self):
+        """Abre uma conversa nova num separador (com logs próprios)."""
+        self.tab_counter += 1
+        tab = ConversationTab(self, f"Conversa {self.tab_counter}")
+        index = self.tabs.addTab(tab, tab.title)
+        self.tabs.setCurrentIndex(index)
+        tab.input_text.setFocus()
+        return tab
+
+    def close_tab(self, index):
+        """Fecha um separador, cancelando o pedido em curso."""
+        tab = self.tabs.widget(index)
+        tab.close_conversation()
+        self.tabs.removeTab(index)
+        tab.messages.close()
+        tab.deleteLater()
+        if self.tabs.count() == 0:
+            self.new_tab()
+        self.schedule_session_save()
+
+    def on_current_tab_changed(self, index):
+        tab = self.tabs.widget(index)
+        if tab is not None:
+            # separador reposto que ainda não tinha sido aberto
+            tab.ensure_restored()
+        self.update_actions()
+        self.schedule_session_save()
+
+    def on_tab_busy_changed(self, tab):
+        """Actualiza o título do separador e as acções quando um pedido começa/acaba."""
+        index = self.tabs.indexOf(tab)
+        if index >= 0:
+            self.tabs.setTabText(index, ("⏳ " if tab.busy else "") + tab.title)
+        self.update_actions()
+        self.schedule_session_save()
+
+    # --- sessão ---
+
+    def _open_restored(self, entry, index=None):
+        self.tab_counter += 1
+        tab = ConversationTab(self, f"Conversa {self.tab_counter}")
+        tab.attach(entry)
+        if index is None:
+            self.tabs.addTab(tab, tab.title)
+        else:
+            self.tabs.insertTab(index, tab, tab.title)
+        return tab
+
+    def restore_session(self):
+        """Repõe o separador activo do diário da sessão; devolve False se não houver nada.
+
+        Antes da primeira pintura só esse é lido; os outros abrem em
+        restore_remaining() (no fim do arranque).
+        """
+        if self.journal is None:
+            return False
+        state = self.journal.load()
+        if not state:
+            return False
+        start = time.perf_counter()
+        entries = []
+        current = 0
+        for i, entry in enumerate(state["tabs"]):
+            if not os.path.exists(entry["log"]):
+                continue
+            if i == state.get("current"):
+                current = len(entries)
+            entries.append(entry)
+        if not entries:
+            return False
+        tab = self._open_restored(entries[current])
+        self.tabs.setCurrentWidget(tab)
+        tab.ensure_restored()
+        self._restore_rest = (entries[:current], entries[current + 1:])
+        metrics.observe("session_restore_seconds", time.perf_counter() - start)
+        self._restored = (len(entries), not state.get("clean"))
+        return True
+
+    def restore_remaining(self):
+        """Abre os outros separadores da sessão e lê-os enquanto houver tempo (RESTORE_BUDGET).
+
+        Os que ficarem por ler são lidos quando forem abertos.
+        """
+        if self._restore_rest is None:
+            return
+        before, after = self._restore_rest
+        self._restore_rest = None
+        start = time.perf_counter()
+        tabs = [self._open_restored(entry, i) for i, entry in enumerate(before)]
+        tabs += [self._open_restored(entry) for entry in after]
+        for tab in tabs:
+            if time.perf_counter() - start >= RESTORE_BUDGET:
+                break
+            tab.ensure_restored()
+        metrics.observe("session_restore_seconds", time.perf_counter() - start)
+
+    def offer_resend(self):
+        """Pergunta se os pedidos que ficaram sem resposta devem ser reenviados."""
+        for tab in self.tabs_list():
+            if tab.restore_entry is not None and tab.restore_entry.get("pending"):
+                tab.ensure_restored()
+        tabs = [tab for tab in self.tabs_list() if tab.interrupted is not None]
+        if not tabs:
+            return
+        answer = QMessageBox.No
+        if self.router.ready():
+            names = ", ".join(tab.title for tab in tabs)
+            answer = QMessageBox.question(
+                self, "Pedidos interrompidos",
+                f"{len(tabs)} pedido(s) ficaram sem resposta quando a app fechou ({names}).\n\n"
+                "Reenviar agora?")
+        for tab in tabs:
+            if answer == QMessageBox.Yes:
+                tab.resend()
+            else:
+                tab.interrupted = None
+                tab.show_notice("⚠️ Pedido interrompido (ficou sem resposta).")
+        self.schedule_session_save()
+
+    def schedule_session_save(self):
+        # não reinicia o timer: durante um stream o diário é gravado na mesma
+        if self.journal is not None and not self._session_timer.isActive():
+            self._session_timer.start()
+
+    def save_session(self, clean=False):
+        """Envia o estado dos separadores para o diário (gravado pelo LogWriter), se mudou."""
+        if self.journal is None or self._restore_rest is not None:
+            # separadores da sessão ainda por abrir: o diário como está não perde nada
+            return
+        entries = []
+        current = 0
+        for tab in self.tabs_list():
+            entry = tab.session_state()
+            if entry is None:
+                continue
+            if tab is self.current_tab():
+                current = len(entries)
+            entries.append(entry)
+        state = (entries, current, clean)
+        if state == self._session_saved:
+            return
+        self._session_saved = state
+        self.log_writer.save_session(self.journal, entries, current, clean)
+
+    def update_actions(self):
+        """Acções que alteram a conversa actual ficam inactivas enquanto ela espera resposta."""
+        if not self._ready:
+            return
+        tab = self.current_tab()
+        busy = tab is not None and tab.busy
+        self.action_import.setEnabled(not busy)
+        self.action_export_json.setEnabled(not busy)
+        self.action_export_txt.setEnabled(not busy)
+        self.action_clear.setEnabled(not busy)
+
+    def on_log_error(self, message):
+        """Falha reportada pelo LogWriter; não bloqueia a execução, só avisa no chat."""
+        tab = self.current_tab()
+        if tab is not None:
+            tab.show_notice(f"⚠️ {message}")
+
+    # --- opções ---
+
+    def on_cache_toggled(self, checked):
+        if checked and self.cache is None:
+            from response_cache import ResponseCache
+            self.cache = ResponseCache(os.path.join(DATA_DIR, "respostas.sqlite"))
+        self.update_cache_label()
+
+    def update_cache_label(self):
+        """Contadores de hits/misses da cache na barra de estado."""
+        if self.cache is None or not self.action_cache.isChecked():
+            self.cache_label.clear()
+            return
+        self.cache_label.setText(f"Cache: {self.cache.hits} hits / {self.cache.misses} misses")
+
+    def on_summarize_toggled(self, checked):
+        self.context.summarize_turns = SUMMARY_TURNS if checked else 0
+
+    # --- acções do menu sobre a conversa actual ---
+
+    def clear_conversation(self):
+        self.current_tab().clear()
+
+    def edit_rate_limits(self):
+        """Limites de pedidos/min e tokens/min da chave (0 = sem limite)."""
+        rpm, ok = QInputDialog.getInt(self, "Limites de pedidos", "Pedidos por minuto (0 = sem limite):",
+                                      self.scheduler.rpm, 0, 100000)
+        if not ok:
+            return
+        tpm, ok = QInputDialog.getInt(self, "Limites de pedidos", "Tokens por minuto (0 = sem limite):",
+                                      self.scheduler.tpm, 0, 100000000, 1000)
+        if not ok:
+            return
+        self.scheduler.configure(rpm, tpm)
+        limits = [f"{rpm} pedidos/min" if rpm else "", f"{tpm} tokens/min" if tpm else ""]
+        self.statusBar().showMessage("Limites: " + (", ".join(x for x in limits if x) or "sem limite"))
+
+    def show_performance(self):
+        self.performance_panel.show()
+        self.performance_panel.raise_()
+
+    def show_search(self):
+        self.finish_setup()
+        self.search_panel.focus()
+
+    def open_search_result(self, source, position):
+        """Mostra a mensagem encontrada: no separador que já tem a conversa ou num novo."""
+        base = os.path.splitext(os.path.abspath(source))[0]
+        for tab in self.tabs_list():
+            if os.path.splitext(tab.log.path)[0] != base:
+                continue
+            self.tabs.setCurrentWidget(tab)
+            if not tab.jump_to_position(position):
+                self.statusBar().showMessage(f"{tab.title}: a mensagem já não está no histórico (conversa limpa).")
+            return
+
+        if not os.path.exists(source):
+            QMessageBox.warning(self, "Pesquisa", f"O ficheiro já não existe:\n{source}")
+            return
+        tab = self.current_tab()
+        if tab.messages or tab.busy:
+            tab = self.new_tab()
+        tab.load(source, position)
+
+    def import_conversation(self):
+        """Importa um ficheiro JSON/JSONL num separador (novo, se o actual já tiver conversa)."""
+        file_name, _ = QFileDialog.getOpenFileName(self, "Importar Conversa", "",
+                                                   "Conversas (*.json *.jsonl);;All Files (*)")
+        if not file_name:
+            return
+
+        tab = self.current_tab()
+        if tab.messages or tab.busy:
+            tab = self.new_tab()
+        # a leitura corre em background; o fim (ou o erro) aparece na barra de estado
+        tab.load(file_name)
 
     def export_conversation(self):
         """Exporta o histórico para um ficheiro JSON escolhido."""
@@ -299,7 +2247,7 @@ class ChatGPTApp(QMainWindow):
             file_name += ".json"
         try:
             with open(file_name, "w", encoding="utf-8") as f:
-                json.dump(self.messages, f, ensure_ascii=False, indent=4)
+                json.dump(self.current_tab().export_messages(), f, ensure_ascii=False, indent=4)
             QMessageBox.information(self, "Exportar", "Conversa exportada com sucesso.")
         except Exception as e:
             QMessageBox.critical(self, "Erro", f"Falha ao exportar: {e}")
@@ -313,32 +2261,60 @@ class ChatGPTApp(QMainWindow):
             file_name += ".txt"
         try:
             with open(file_name, "w", encoding="utf-8") as f:
-                for msg in self.messages:
+                for msg in self.current_tab().export_messages():
                     prefix = "Tu" if msg.get("role") == "user" else ("ChatGPT" if msg.get("role") == "assistant" else msg.get("role"))
                     f.write(f"{prefix}: {msg.get('content','')}\n\n")
             QMessageBox.information(self, "Exportar", "Conversa exportada para TXT com sucesso.")
         except Exception as e:
             QMessageBox.critical(self, "Erro", f"Falha ao exportar TXT: {e}")
 
+    def compact_log(self):
+        self.current_tab().compact_log()
+
+    def archive_log(self):
+        self.current_tab().archive_log()
+        self.statusBar().showMessage(f"A arquivar a conversa em {ARCHIVE_FILE}...")
+
     def show_about(self):
         QMessageBox.information(self, "Sobre",
                                 "Aplicação ChatGPT com PyQt5 (corrigido)\n"
                                 "Inclui histórico, logs JSON/TXT, import/export, e execução em thread.\n"
                                 "Funciona em Windows, Ubuntu e macOS.")
 
-    # Override closeEvent para garantir que thread termina
+    def tabs_list(self):
+        return [self.tabs.widget(i) for i in range(self.tabs.count())]
+
+    # Override closeEvent: cancela os pedidos em curso e fecha de imediato
     def closeEvent(self, event):
-        if self.worker is not None and self.worker.isRunning():
-            # tenta parar worker educadamente (não ideal, mas avisa o utilizador)
-            QMessageBox.warning(self, "Atenção", "Uma requisição está em curso. Fecha a aplicação novamente para forçar.")
-            # primeiramente não fecha para evitar corromper ficheiros; se o utilizador insistir, deixa fechar
-            event.ignore()
-        else:
-            event.accept()
+        # cancelar aborta as ligações; respostas parciais ficam como truncadas
+        for tab in self.tabs_list():
+            tab.close_conversation()
+        # o diário fica com a sessão tal como está (sem pedidos em curso)
+        self._session_timer.stop()
+        self.save_session(clean=True)
+        for tab in self.tabs_list():
+            # o diário já está feito: os ficheiros de spill podem fechar
+            tab.messages.close()
+        # escoa a fila de escrita antes de sair (nada se perde)
+        self.log_writer.stop()
+        if self.journal is not None:
+            self.journal.unlock()
+        if METRICS_FILE:
+            self.write_metrics()
+        if self.indexer is not None:
+            self.indexer.stop()
+            self.search_panel.close_index()
+        if self.cache is not None:
+            self.cache.close()
+        # as threads do pool saem logo que a ligação é abortada
+        self.pool.waitForDone(1000)
+        event.accept()
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    startup.mark("QApplication")
     win = ChatGPTApp()
+    startup.mark("janela construída")
     win.show()
     sys.exit(app.exec_())
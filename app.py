@@ -1,5 +1,6 @@
 import sys
-import requests
+import os
+import startup  # primeiro: origem dos tempos de arranque
 import json
 import datetime
 from PyQt5.QtWidgets import (
@@ -8,10 +9,19 @@ from PyQt5.QtWidgets import (
     QProgressBar, QFileDialog
 )
 
+from backends import OpenAIBackend, load_router
+from conversation_log import ConversationLog, load_messages
+from message_store import MessageStore
+
+startup.mark("imports")
+
 
 # ⚠️ Coloca aqui a tua chave da API
 API_KEY = "AQUI_A_TUA_CHAVE"
 API_URL = "https://api.openai.com/v1/chat/completions"
+MODEL = "gpt-3.5-turbo"
+# CHATGPT_QT_BACKENDS: lista de backends com failover (ver backends.py)
+BACKENDS_FILE = os.environ.get("CHATGPT_QT_BACKENDS")
 
 
 class ChatGPTApp(QMainWindow):
@@ -22,40 +32,29 @@ class ChatGPTApp(QMainWindow):
         self.setWindowTitle("ChatGPT API - Qt App (com histórico, logs e import/export)")
         self.setGeometry(200, 200, 750, 650)
 
-        # Histórico de mensagens (para enviar à API)
-        self.messages = []
+        # Backend(s) da API: só API_URL/API_KEY, salvo se houver BACKENDS_FILE
+        default_backend = OpenAIBackend("openai", API_URL, API_KEY)
+        try:
+            self.router = load_router(BACKENDS_FILE, default_backend)
+        except (OSError, ValueError) as e:
+            self.router = load_router(None, default_backend)
+            self.statusBar().showMessage(f"backends.json ignorado: {e}")
+
+        # Histórico de mensagens (para enviar à API; ver message_store.py)
+        self.messages = MessageStore()
 
-        # Nome do ficheiro log automático
+        # Nome do ficheiro log automático (JSONL append-only; o JSON é gerado ao fechar)
         agora = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         self.log_json = f"conversa_{agora}.json"
         self.log_txt = f"conversa_{agora}.txt"
+        self.log = ConversationLog(f"conversa_{agora}.jsonl")
 
-        # Menu
+        # Menu (as acções só são criadas depois da primeira pintura)
         self.menu_bar = QMenuBar(self)
         self.setMenuBar(self.menu_bar)
-
-        file_menu = self.menu_bar.addMenu("Ficheiro")
-        help_menu = self.menu_bar.addMenu("Ajuda")
-
-        clear_action = QAction("Limpar conversa", self)
-        clear_action.triggered.connect(self.clear_conversation)
-        file_menu.addAction(clear_action)
-
-        import_action = QAction("Importar conversa JSON", self)
-        import_action.triggered.connect(self.import_conversation)
-        file_menu.addAction(import_action)
-
-        export_action = QAction("Exportar conversa JSON", self)
-        export_action.triggered.connect(self.export_conversation)
-        file_menu.addAction(export_action)
-
-        exit_action = QAction("Sair", self)
-        exit_action.triggered.connect(self.close)
-        file_menu.addAction(exit_action)
-
-        about_action = QAction("Sobre", self)
-        about_action.triggered.connect(self.show_about)
-        help_menu.addAction(about_action)
+        self.file_menu = self.menu_bar.addMenu("Ficheiro")
+        self.help_menu = self.menu_bar.addMenu("Ajuda")
+        startup.after_first_paint(self.finish_setup)
 
         # Área central
         central_widget = QWidget()
@@ -84,14 +83,38 @@ class ChatGPTApp(QMainWindow):
         self.progress_bar.setVisible(False)
         self.layout.addWidget(self.progress_bar)
 
+    def finish_setup(self):
+        """ Parte adiada do arranque: acções dos menus """
+        file_menu = self.file_menu
+        help_menu = self.help_menu
+
+        clear_action = QAction("Limpar conversa", self)
+        clear_action.triggered.connect(self.clear_conversation)
+        file_menu.addAction(clear_action)
+
+        import_action = QAction("Importar conversa JSON", self)
+        import_action.triggered.connect(self.import_conversation)
+        file_menu.addAction(import_action)
+
+        export_action = QAction("Exportar conversa JSON", self)
+        export_action.triggered.connect(self.export_conversation)
+        file_menu.addAction(export_action)
+
+        exit_action = QAction("Sair", self)
+        exit_action.triggered.connect(self.close)
+        file_menu.addAction(exit_action)
+
+        about_action = QAction("Sobre", self)
+        about_action.triggered.connect(self.show_about)
+        help_menu.addAction(about_action)
+        startup.ready()
+
     def log_message(self, role, content):
         """ Guarda a conversa em ficheiros JSON e TXT """
-        entry = {"role": role, "content": content}
+        message = self.messages.append(role, content)
 
-        # Atualiza JSON automático
-        self.messages.append(entry)
-        with open(self.log_json, "w", encoding="utf-8") as f_json:
-            json.dump(self.messages, f_json, ensure_ascii=False, indent=4)
+        # Acrescenta ao log JSONL automático (uma linha por mensagem)
+        self.log.append(message.to_dict())
 
         # Atualiza TXT automático
         with open(self.log_txt, "a", encoding="utf-8") as f_txt:
@@ -119,49 +142,46 @@ class ChatGPTApp(QMainWindow):
         self.repaint()
 
         try:
-            headers = {
-                "Authorization": f"Bearer {API_KEY}",
-                "Content-Type": "application/json"
-            }
-
             data = {
-                "model": "gpt-3.5-turbo",
-                "messages": self.messages,
+                "model": MODEL,
+                "messages": self.messages.payload(),
                 "max_tokens": 300
             }
 
-            response = requests.post(API_URL, headers=headers, json=data)
+            # cliente partilhado (keep-alive + novas tentativas em 429/5xx), com
+            # failover entre backends se houver mais do que um
+            result = self.router.complete(data, timeout=60)
 
-            if response.status_code == 200:
-                resposta = response.json()["choices"][0]["message"]["content"]
+            if result.get("ok"):
+                resposta = result.get("content", "")
 
                 # Adiciona resposta ao histórico
                 self.chat_display.append(f"🤖 ChatGPT: {resposta}\n")
                 self.log_message("assistant", resposta)
 
             else:
-                erro = f"Erro {response.status_code}: {response.text}"
-                self.chat_display.append(f"⚠️ {erro}\n")
-
-        except Exception as e:
-            self.chat_display.append(f"⚠️ Erro de conexão: {str(e)}\n")
+                self.chat_display.append(f"⚠️ Erro: {result.get('error', 'desconhecido')}\n")
 
         finally:
             self.progress_bar.setVisible(False)
 
     def clear_conversation(self):
         """ Limpa o histórico da conversa (apenas no display, não apaga ficheiros) """
-        self.messages = []
+        self.messages.close()
+        self.messages = MessageStore()
         self.chat_display.clear()
         self.chat_display.append("🔄 Conversa limpa.\n")
 
     def import_conversation(self):
-        """ Importa conversa de um ficheiro JSON """
-        file_name, _ = QFileDialog.getOpenFileName(self, "Importar Conversa", "", "JSON Files (*.json)")
+        """ Importa conversa de um ficheiro JSON ou JSONL """
+        file_name, _ = QFileDialog.getOpenFileName(self, "Importar Conversa", "", "Conversas (*.json *.jsonl)")
         if file_name:
             try:
-                with open(file_name, "r", encoding="utf-8") as f:
-                    self.messages = json.load(f)
+                messages = MessageStore(load_messages(file_name))
+                self.messages.close()
+                self.messages = messages
+                # o log da sessão passa a conter o histórico importado
+                self.log.rewrite(self.messages.to_dicts())
 
                 self.chat_display.clear()
                 for msg in self.messages:
@@ -178,7 +198,7 @@ class ChatGPTApp(QMainWindow):
         if file_name:
             try:
                 with open(file_name, "w", encoding="utf-8") as f:
-                    json.dump(self.messages, f, ensure_ascii=False, indent=4)
+                    json.dump(self.messages.to_dicts(), f, ensure_ascii=False, indent=4)
                 QMessageBox.information(self, "Exportar", "Conversa exportada com sucesso!")
             except Exception as e:
                 QMessageBox.critical(self, "Erro", f"Falha ao exportar: {e}")
@@ -189,9 +209,21 @@ class ChatGPTApp(QMainWindow):
                                 "Inclui histórico, barra de progresso, logs e import/export JSON.\n"
                                 "Compatível com Windows, Ubuntu e macOS.")
 
+    def closeEvent(self, event):
+        """ Gera o JSON completo a partir do log JSONL antes de sair """
+        try:
+            self.log.compact(self.log_json)
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Falha ao gravar {self.log_json}: {e}")
+        self.log.close()
+        self.messages.close()
+        event.accept()
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    startup.mark("QApplication")
     window = ChatGPTApp()
+    startup.mark("janela construída")
     window.show()
     sys.exit(app.exec_())
@@ -0,0 +1,355 @@
+# archive.py
+# Arquivo de conversas: cada texto guardado uma só vez, comprimido em blocos.
+#
+# Um ficheiro SQLite com todas as conversas arquivadas:
+# - contents: um registo por texto distinto (chave = sha256 do texto), por isso
+#   mensagens repetidas e prompts de sistema iguais em várias conversas só
+#   ocupam espaço uma vez;
+# - blocks: os textos novos são juntados em blocos de ~BLOCK_SIZE bytes e
+#   comprimidos com zstd (se o pacote zstandard estiver instalado) ou gzip;
+# - messages: a sequência de cada conversa (role + hash do texto), o que dá
+#   acesso directo a uma conversa (ou a um intervalo dela) sem ler as outras.
+#
+# Acrescentar mensagens a uma conversa arquivada não reescreve o que já lá está.
+#
+# Uso em linha de comandos:
+#   python archive.py import [pasta | conversa_X.json ...]   converte os conversa_*.json(l)
+#   python archive.py list                                  conversas arquivadas
+#   python archive.py export NOME saida.json|saida.txt       volta ao formato JSON/TXT
+#   python archive.py stats
+import os
+import sys
+import glob
+import gzip
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from conversation_log import iter_messages, write_json_atomic
+
+try:
+    import zstandard
+except ImportError:  # opcional: sem ele os blocos novos vão em gzip
+    zstandard = None
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".chatgpt_qt", "arquivo.sqlite")
+
+# tamanho (descomprimido) a partir do qual um bloco é fechado e comprimido
+BLOCK_SIZE = 256 * 1024
+# blocos descomprimidos guardados em memória (leituras seguidas da mesma conversa)
+BLOCK_CACHE = 8
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS blocks ("
+    " id INTEGER PRIMARY KEY, codec TEXT NOT NULL, size INTEGER NOT NULL, data BLOB NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS contents ("
+    " hash BLOB PRIMARY KEY, block INTEGER NOT NULL, offset INTEGER NOT NULL,"
+    " length INTEGER NOT NULL) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS conversations ("
+    " id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, source TEXT, total INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS messages ("
+    " conversation INTEGER NOT NULL, position INTEGER NOT NULL, role TEXT NOT NULL,"
+    " content BLOB NOT NULL, truncated INTEGER NOT NULL DEFAULT 0,"
+    " PRIMARY KEY (conversation, position)) WITHOUT ROWID",
+)
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def compress(data):
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "gzip", gzip.compress(data, compresslevel=6)
+
+
+def decompress(codec, data):
+    if codec == "gzip":
+        return gzip.decompress(data)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("este arquivo tem blocos zstd: instala o pacote zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"compressão desconhecida: {codec}")
+
+
+def txt_lines(messages):
+    """Linhas no formato dos logs TXT."""
+    for msg in messages:
+        role = msg.get("role")
+        prefix = "Tu" if role == "user" else ("ChatGPT" if role == "assistant" else role)
+        suffix = " [interrompida]" if msg.get("truncated") else ""
+        yield f"{prefix}: {msg.get('content', '')}{suffix}\n\n"
+
+
+def conversation_name(path):
+    """Nome de uma conversa no arquivo: o ficheiro sem pasta nem extensão (conversa_X)."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+class Archive:
+    """Arquivo de conversas deduplicado e comprimido. Thread-safe."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+        self._blocks = OrderedDict()    # id -> bytes descomprimidos
+
+    # --- escrita ---
+
+    def _store_contents(self, texts):
+        """Guarda os textos ainda não arquivados (em blocos novos). Devolve os hashes."""
+        hashes = [content_hash(t) for t in texts]
+        known = set()
+        unique = list(dict.fromkeys(hashes))
+        for i in range(0, len(unique), 500):
+            chunk = unique[i:i + 500]
+            known.update(row[0] for row in self._db.execute(
+                f"SELECT hash FROM contents WHERE hash IN ({','.join('?' * len(chunk))})", chunk))
+        pending, size, seen = [], 0, set(known)
+        for h, text in zip(hashes, texts):
+            if h in seen:
+                continue
+            seen.add(h)
+            data = text.encode("utf-8")
+            pending.append((h, data))
+            size += len(data)
+            if size >= BLOCK_SIZE:
+                self._write_block(pending)
+                pending, size = [], 0
+        if pending:
+            self._write_block(pending)
+        return hashes
+
+    def _write_block(self, items):
+        raw = b"".join(data for _, data in items)
+        codec, data = compress(raw)
+        block = self._db.execute("INSERT INTO blocks (codec, size, data) VALUES (?, ?, ?)",
+                                 (codec, len(raw), data)).lastrowid
+        rows, offset = [], 0
+        for h, data in items:
+            rows.append((h, block, offset, len(data)))
+            offset += len(data)
+        self._db.executemany(
+            "INSERT INTO contents (hash, block, offset, length) VALUES (?, ?, ?, ?)", rows)
+
+    def _conversation_id(self, name, source=None, create=False):
+        row = self._db.execute("SELECT id, total FROM conversations WHERE name = ?", (name,)).fetchone()
+        if row is None and create:
+            cur = self._db.execute("INSERT INTO conversations (name, source) VALUES (?, ?)", (name, source))
+            return cur.lastrowid, 0
+        return row
+
+    def _insert(self, name, entries, source):
+        conv_id, total = self._conversation_id(name, source, create=True)
+        hashes = self._store_contents([str(e.get("content", "")) for e in entries])
+        self._db.executemany(
+            "INSERT INTO messages (conversation, position, role, content, truncated)"
+            " VALUES (?, ?, ?, ?, ?)",
+            ((conv_id, total + i, e.get("role", ""), h, 1 if e.get("truncated") else 0)
+             for i, (e, h) in enumerate(zip(entries, hashes))))
+        total += len(entries)
+        self._db.execute("UPDATE conversations SET total = ? WHERE id = ?", (total, conv_id))
+        return total
+
+    def _delete(self, name):
+        row = self._conversation_id(name)
+        if row is not None:
+            self._db.execute("DELETE FROM messages WHERE conversation = ?", (row[0],))
+            self._db.execute("DELETE FROM conversations WHERE id = ?", (row[0],))
+
+    def _transaction(self, work):
+        """Corre work() com o lock, numa só transacção (desfeita se falhar)."""
+        with self._lock:
+            try:
+                result = work()
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        return result
+
+    def append(self, name, entries, source=None):
+        """Acrescenta mensagens ao fim de uma conversa (criada se não existir).
+
+        Devolve o nº de mensagens da conversa.
+        """
+        # lidas (e validadas) antes de mexer no arquivo
+        entries = [e for e in entries if isinstance(e, dict)]
+        return self._transaction(lambda: self._insert(name, entries, source))
+
+    def add(self, name, entries, source=None):
+        """Guarda uma conversa inteira (substitui a que tiver o mesmo nome).
+
+        Se a leitura das mensagens falhar, a cópia já arquivada fica intacta.
+        """
+        entries = [e for e in entries if isinstance(e, dict)]
+
+        def replace():
+            self._delete(name)
+            return self._insert(name, entries, source)
+
+        return self._transaction(replace)
+
+    def import_file(self, path):
+        """Converte um conversa_*.json (ou .jsonl). Devolve o nº de mensagens."""
+        return self.add(conversation_name(path), iter_messages(path), source=os.path.abspath(path))
+
+    def remove(self, name):
+        """Tira a conversa do arquivo (os textos partilhados ficam; ver vacuum)."""
+        self._transaction(lambda: self._delete(name))
+
+    def vacuum(self):
+        """Apaga os blocos que já não têm textos usados por nenhuma conversa."""
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM contents WHERE hash NOT IN (SELECT DISTINCT content FROM messages)")
+            self._db.execute("DELETE FROM blocks WHERE id NOT IN (SELECT DISTINCT block FROM contents)")
+            self._db.commit()
+            self._blocks.clear()
+            self._db.execute("VACUUM")
+
+    # --- leitura ---
+
+    def _block(self, block_id):
+        data = self._blocks.get(block_id)
+        if data is not None:
+            self._blocks.move_to_end(block_id)
+            return data
+        codec, compressed = self._db.execute(
+            "SELECT codec, data FROM blocks WHERE id = ?", (block_id,)).fetchone()
+        data = decompress(codec, compressed)
+        self._blocks[block_id] = data
+        if len(self._blocks) > BLOCK_CACHE:
+            self._blocks.popitem(last=False)
+        return data
+
+    def _texts(self, hashes):
+        """hash -> texto, lendo cada bloco uma só vez."""
+        unique = list(set(hashes))
+        located = []
+        for i in range(0, len(unique), 500):
+            chunk = unique[i:i + 500]
+            located.extend(self._db.execute(
+                "SELECT hash, block, offset, length FROM contents"
+                f" WHERE hash IN ({','.join('?' * len(chunk))})", chunk))
+        texts = {}
+        for h, block, offset, length in sorted(located, key=lambda r: (r[1], r[2])):
+            texts[h] = self._block(block)[offset:offset + length].decode("utf-8")
+        return texts
+
+    def messages(self, name, start=0, stop=None):
+        """Mensagens [start:stop] de uma conversa (dicts como nos logs). KeyError se não existir."""
+        with self._lock:
+            row = self._conversation_id(name)
+            if row is None:
+                raise KeyError(name)
+            conv_id, total = row
+            stop = total if stop is None else min(stop, total)
+            rows = self._db.execute(
+                "SELECT role, content, truncated FROM messages"
+                " WHERE conversation = ? AND position >= ? AND position < ? ORDER BY position",
+                (conv_id, start, stop)).fetchall()
+            texts = self._texts([r[1] for r in rows])
+        result = []
+        for role, h, truncated in rows:
+            entry = {"role": role, "content": texts[h]}
+            if truncated:
+                entry["truncated"] = True
+            result.append(entry)
+        return result
+
+    def conversations(self):
+        """[(nome, nº de mensagens, origem)] por ordem de nome."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT name, total, source FROM conversations ORDER BY name").fetchall()
+
+    def export_json(self, name, path):
+        """Exporta no formato JSON antigo (lista de mensagens, indent=4)."""
+        write_json_atomic(path, self.messages(name))
+
+    def export_txt(self, name, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(txt_lines(self.messages(name)))
+
+    def stats(self):
+        with self._lock:
+            conversations, messages = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(total), 0) FROM conversations").fetchone()
+            texts, raw = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM contents").fetchone()
+            compressed = self._db.execute(
+                "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM blocks").fetchone()[0]
+        return {"conversations": conversations, "messages": messages, "texts": texts,
+                "bytes": raw, "compressed": compressed}
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = ("import", "list", "export", "stats")
+    if not argv or argv[0] not in commands or (argv[0] == "export" and len(argv) != 3):
+        print("Uso: python archive.py import [pasta | ficheiros...] | list | "
+              "export NOME saida.json|saida.txt | stats")
+        return 2
+    archive = Archive(os.environ.get("CHATGPT_QT_ARCHIVE", DEFAULT_PATH))
+    try:
+        if argv[0] == "import":
+            paths = []
+            for arg in argv[1:] or [os.getcwd()]:
+                if os.path.isdir(arg):
+                    found = {}
+                    # JSONL preferido ao JSON compactado da mesma conversa
+                    for path in sorted(glob.glob(os.path.join(arg, "conversa_*.json*"))):
+                        base, ext = os.path.splitext(path)
+                        if ext.lower() == ".jsonl" or base not in found:
+                            found[base] = path
+                    paths.extend(found.values())
+                else:
+                    paths.append(arg)
+            for path in paths:
+                try:
+                    print(f"{path}: {archive.import_file(path)} mensagens")
+                except (OSError, ValueError) as e:
+                    print(f"{path}: ignorado ({e})", file=sys.stderr)
+        elif argv[0] == "list":
+            for name, total, source in archive.conversations():
+                print(f"{name}\t{total}\t{source or ''}")
+        elif argv[0] == "export":
+            name, out = argv[1], argv[2]
+            if out.lower().endswith(".txt"):
+                archive.export_txt(name, out)
+            else:
+                archive.export_json(name, out)
+            print(f"Exportado: {out}")
+        else:
+            s = archive.stats()
+            ratio = s["compressed"] / s["bytes"] if s["bytes"] else 0
+            print(f"{s['conversations']} conversas, {s['messages']} mensagens, "
+                  f"{s['texts']} textos distintos ({s['bytes'] / 1024:.0f} KB), "
+                  f"{s['compressed'] / 1024:.0f} KB comprimidos ({ratio:.0%})")
+    except KeyError as e:
+        print(f"Conversa não encontrada: {e}", file=sys.stderr)
+        return 1
+    finally:
+        archive.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+# backends.py
+# Fornecedores de chat (backends) e o router que escolhe entre eles.
+#
+# Um backend sabe para onde enviar um pedido /v1/chat/completions e com que
+# chave e modelo: OpenAIBackend (API da OpenAI) e LocalBackend (servidor
+# on-prem compatível com a API da OpenAI, ex.: vLLM, llama.cpp, Ollama).
+# Outros tipos registam-se em BACKEND_TYPES.
+#
+# O Router guarda em memória a latência (média móvel exponencial do tempo até
+# ao primeiro byte) e a saúde de cada backend. Cada pedido vai para o mais
+# rápido dos saudáveis; se falhar (timeout, erro de ligação, 5xx, 429 depois
+# dos retries, chave inválida) passa ao seguinte, e o que falhou fica fora da
+# rotação durante um tempo que duplica a cada falha seguida.
+#
+# Configuração (opcional), um JSON com a lista de backends pela ordem de
+# preferência, ex.:
+#   [{"name": "openai", "type": "openai", "model": "gpt-3.5-turbo"},
+#    {"name": "local", "type": "local", "url": "http://127.0.0.1:8000/v1/chat/completions",
+#     "model": "llama3", "timeout": 120}]
+# A chave vem de "api_key" ou da variável indicada em "api_key_env"
+# (omissão no tipo openai: OPENAI_API_KEY).
+import os
+import json
+import time
+import threading
+from contextlib import nullcontext
+
+from api_client import DEFAULT_API_URL, RETRY_STATUS, chat_completion, get_client
+import metrics
+
+# o valor de exemplo nas apps (não é uma chave)
+PLACEHOLDER_KEY = "AQUI_A_TUA_CHAVE"
+LOCAL_API_URL = "http://127.0.0.1:8000/v1/chat/completions"
+
+# peso da medição mais recente na latência média
+EWMA_ALPHA = 0.3
+# tempo fora da rotação depois de uma falha (duplica a cada falha seguida)
+COOLDOWN = 15.0
+COOLDOWN_MAX = 300.0
+
+# respostas HTTP em que outro backend pode resultar (o resto, ex.: 400, é do pedido)
+FAILOVER_STATUS = RETRY_STATUS | {401, 403, 404, 408}
+
+
+class Backend:
+    """Servidor compatível com /v1/chat/completions."""
+
+    kind = None
+
+    def __init__(self, name, url, api_key="", model=None, timeout=None):
+        self.name = name
+        self.url = url
+        self.api_key = api_key or ""
+        self.model = model          # None: usa o modelo do payload
+        self.timeout = timeout      # None: usa o timeout de quem pede
+
+    def ready(self):
+        """Tem o necessário para enviar pedidos (ex.: chave)."""
+        return bool(self.url)
+
+    def prepare(self, payload):
+        if self.model and payload.get("model") != self.model:
+            payload = dict(payload, model=self.model)
+        return payload
+
+    def complete(self, payload, timeout=30, handle=None, on_delta=None, on_retry=None,
+                 throttle=None):
+        return chat_completion(self.url, self.api_key, self.prepare(payload),
+                               timeout=self.timeout or timeout, handle=handle,
+                               on_delta=on_delta, on_retry=on_retry, throttle=throttle)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r}, {self.url!r})"
+
+
+class OpenAIBackend(Backend):
+    """API da OpenAI (ou outro fornecedor compatível que peça chave)."""
+
+    kind = "openai"
+
+    def __init__(self, name="openai", url=DEFAULT_API_URL, api_key=None, model=None, timeout=None):
+        if api_key is None:
+            api_key = os.environ.get("OPENAI_API_KEY", "")
+        super().__init__(name, url, api_key, model, timeout)
+
+    def ready(self):
+        return bool(self.url) and bool(self.api_key) and self.api_key != PLACEHOLDER_KEY
+
+
+class LocalBackend(Backend):
+    """Servidor on-prem compatível com a API da OpenAI (normalmente sem chave)."""
+
+    kind = "local"
+
+    def __init__(self, name="local", url=LOCAL_API_URL, api_key="", model=None, timeout=None):
+        super().__init__(name, url, api_key, model, timeout)
+
+
+BACKEND_TYPES = {cls.kind: cls for cls in (OpenAIBackend, LocalBackend)}
+
+
+def backend_from_dict(entry):
+    """Cria um backend a partir de uma entrada da configuração."""
+    kind = entry.get("type", "openai")
+    cls = BACKEND_TYPES.get(kind)
+    if cls is None:
+        raise ValueError(f"tipo de backend desconhecido: {kind}")
+    options = {"name": entry.get("name", kind)}
+    if entry.get("url"):
+        options["url"] = entry["url"]
+    if entry.get("api_key_env"):
+        options["api_key"] = os.environ.get(entry["api_key_env"], "")
+    elif "api_key" in entry:
+        options["api_key"] = entry["api_key"]
+    if entry.get("model"):
+        options["model"] = entry["model"]
+    if entry.get("timeout"):
+        options["timeout"] = float(entry["timeout"])
+    return cls(**options)
+
+
+def load_backends(path):
+    """Lê a lista de backends de um ficheiro JSON."""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not entries or not all(isinstance(e, dict) for e in entries):
+        raise ValueError(f"{path}: esperada uma lista de backends")
+    return [backend_from_dict(e) for e in entries]
+
+
+def load_router(path, default):
+    """Router com os backends de `path`, se o ficheiro existir; senão só com `default`."""
+    if path and os.path.exists(path):
+        return Router(load_backends(path))
+    return Router([default])
+
+
+class BackendStats:
+    """Latência e saúde de um backend (só em memória)."""
+
+    __slots__ = ("latency", "requests", "failures", "consecutive", "down_until", "last_error")
+
+    def __init__(self):
+        self.latency = None         # EWMA do ttfb (s); None até ao primeiro sucesso
+        self.requests = 0
+        self.failures = 0
+        self.consecutive = 0        # falhas seguidas
+        self.down_until = 0.0       # time.monotonic() até ao qual fica fora da rotação
+        self.last_error = None
+
+    def healthy(self, now):
+        return now >= self.down_until
+
+    def to_dict(self, now):
+        return {"latency": self.latency, "requests": self.requests, "failures": self.failures,
+                "healthy": self.healthy(now), "down_for": max(0.0, self.down_until - now),
+                "last_error": self.last_error}
+
+
+class Router:
+    """Envia cada pedido ao backend saudável mais rápido, com failover. Thread-safe."""
+
+    def __init__(self, backends, alpha=EWMA_ALPHA, cooldown=COOLDOWN):
+        self.backends = list(backends)
+        self.alpha = alpha
+        self.cooldown = cooldown
+        self._stats = {b.name: BackendStats() for b in self.backends}
+        self._lock = threading.Lock()
+
+    def ready(self):
+        return any(b.ready() for b in self.backends)
+
+    def order(self):
+        """Backends pela ordem em que vão ser tentados.
+
+        Saudáveis primeiro, do mais rápido para o mais lento (os ainda sem
+        medição vêm à frente, pela ordem da configuração, para serem medidos);
+        depois os que estão fora da rotação, do que volta mais cedo.
+        """
+        now = time.monotonic()
+        with self._lock:
+            ranked = []
+            for index, backend in enumerate(self.backends):
+                if not backend.ready():
+                    continue
+                s = self._stats[backend.name]
+                if s.healthy(now):
+                    key = (0, s.latency if s.latency is not None else 0.0, index)
+                else:
+                    key = (1, s.down_until, index)
+                ranked.append((key, backend))
+        ranked.sort(key=lambda item: item[0])
+        return [backend for _, backend in ranked]
+
+    def _success(self, backend, timing):
+        with self._lock:
+            s = self._stats[backend.name]
+            s.requests += 1
+            s.consecutive = 0
+            s.down_until = 0.0
+            ttfb = (timing or {}).get("ttfb")
+            if ttfb:
+                s.latency = ttfb if s.latency is None else (
+                    self.alpha * ttfb + (1 - self.alpha) * s.latency)
+
+    def _failure(self, backend, error):
+        with self._lock:
+            s = self._stats[backend.name]
+            s.requests += 1
+            s.failures += 1
+            s.consecutive += 1
+            s.last_error = error
+            s.down_until = time.monotonic() + min(COOLDOWN_MAX, self.cooldown * 2 ** (s.consecutive - 1))
+
+    def complete(self, payload, timeout=30, handle=None, on_delta=None, on_retry=None, slot=None,
+                 throttle=None):
+        """Como api_client.chat_completion, mas escolhendo o backend (result["backend"]).
+
+        slot(url): context manager opcional à volta de cada tentativa (ex.:
+        limite de pedidos simultâneos por fornecedor).
+        """
+        result = {"ok": False, "error": "Nenhum backend disponível (falta a chave da API?)", "payload_bytes": 0, "timing": None}
+        backends = self.order()
+        for i, backend in enumerate(backends):
+            streamed = []
+
+            def delta(text):
+                streamed.append(True)
+                on_delta(text)
+
+            with slot(backend.url) if slot is not None else nullcontext():
+                if handle is not None and handle.cancelled:
+                    return {"ok": False, "cancelled": True, "error": "Pedido cancelado",
+                            "payload_bytes": 0, "timing": None}
+                result = backend.complete(payload, timeout=timeout, handle=handle,
+                                          on_delta=delta if on_delta is not None else None,
+                                          on_retry=on_retry, throttle=throttle)
+            result["backend"] = backend.name
+            if result.get("cancelled"):
+                return result
+            if result.get("ok"):
+                self._success(backend, result.get("timing"))
+                return result
+            status = result.get("status")
+            if status is not None and status not in FAILOVER_STATUS:
+                # o problema é o pedido, não o backend
+                return result
+            self._failure(backend, result.get("error"))
+            if streamed:
+                # parte da resposta já foi mostrada: não recomeça noutro backend
+                return result
+            if i + 1 < len(backends):
+                metrics.count("failovers_total")
+        return result
+
+    def prewarm(self):
+        """Abre a ligação ao backend que vai receber o próximo pedido."""
+        backends = self.order()
+        return bool(backends) and get_client().prewarm(backends[0].url)
+
+    def stats(self):
+        """{nome: latência, pedidos, falhas, saudável, ...} de cada backend."""
+        now = time.monotonic()
+        with self._lock:
+            return {name: s.to_dict(now) for name, s in self._stats.items()}
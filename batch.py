@@ -0,0 +1,183 @@
+# batch.py
+# Modo batch (sem GUI): corre um ficheiro JSONL de prompts contra a API.
+#
+# Cada linha de entrada é um objeto JSON com "prompt" (texto) ou "messages"
+# (lista role/content), e opcionalmente "id", "model", "max_tokens" e
+# "temperature". Sem "id" usa-se o número da linha.
+#
+# Os resultados são escritos no JSONL de saída à medida que chegam (fora de
+# ordem, cada um com o seu id). Os ids concluídos com sucesso ficam num
+# checkpoint (<saida>.ckpt): se o processo for interrompido, voltar a correr o
+# mesmo comando salta esses ids e repete apenas os que faltam ou falharam.
+#
+# Com --backends, os pedidos são distribuídos pelos backends desse ficheiro
+# (o mais rápido saudável, com failover; ver backends.py) em vez de --api-url.
+#
+# Com --metrics, os tempos e contadores (metrics.py) são exportados no fim
+# (CSV se o ficheiro terminar em .csv, senão no formato de texto do Prometheus).
+#
+# Uso: python batch.py prompts.jsonl resultados.jsonl --concurrency 8 --rpm 500 --tpm 90000
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from api_client import DEFAULT_API_URL, get_client
+from backends import LocalBackend, OpenAIBackend, Router, load_backends
+import metrics
+from context_window import estimate_tokens
+from scheduler import RequestScheduler, request_tokens, BATCH
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+DEFAULT_MAX_TOKENS = 400
+
+
+def read_jobs(path):
+    """Lê o JSONL de entrada e devolve (id, registo) por cada linha válida."""
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"linha {lineno}: JSON inválido, ignorada", file=sys.stderr)
+                continue
+            if not isinstance(record, dict) or not (record.get("prompt") or record.get("messages")):
+                print(f"linha {lineno}: falta 'prompt' ou 'messages', ignorada", file=sys.stderr)
+                continue
+            yield str(record.get("id", lineno)), record
+
+
+def read_checkpoint(path):
+    """Ids já concluídos com sucesso numa execução anterior."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def build_payload(record, args):
+    messages = record.get("messages")
+    if not messages:
+        messages = [{"role": "user", "content": record["prompt"]}]
+    return {
+        "model": record.get("model", args.model),
+        "messages": [{"role": m.get("role", ""), "content": m.get("content", "")} for m in messages],
+        "max_tokens": record.get("max_tokens", args.max_tokens),
+        "temperature": record.get("temperature", args.temperature),
+    }
+
+
+def run_job(job_id, payload, router, scheduler, args):
+    # o orçamento de tokens conta o pedido e o máximo da resposta
+    tokens = request_tokens(payload)
+    waited = scheduler.acquire(tokens, BATCH)
+    # um 429 pára a fila toda (não só este pedido); as novas tentativas contam no limite
+    result = router.complete(payload, timeout=args.timeout, on_retry=scheduler.on_retry,
+                             throttle=scheduler.throttle(tokens, BATCH))
+    metrics.observe("rate_wait_seconds", waited)
+    metrics.record_result(result, tokens=estimate_tokens(result.get("content") or ""))
+    out = {"id": job_id, "ok": result.get("ok", False), "model": payload["model"]}
+    if len(router.backends) > 1:
+        out["backend"] = result.get("backend")
+    if out["ok"]:
+        out["content"] = result.get("content", "")
+    else:
+        out["error"] = result.get("error", "")
+    out["tokens_estimated"] = tokens
+    out["rate_wait"] = round(waited, 3)
+    if result.get("timing"):
+        out["timing"] = {k: round(v, 4) if isinstance(v, float) else v
+                         for k, v in result["timing"].items()}
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Corre um JSONL de prompts contra a API (sem GUI)")
+    parser.add_argument("input", help="JSONL de entrada")
+    parser.add_argument("output", help="JSONL de resultados (acrescentado)")
+    parser.add_argument("--checkpoint", help="ficheiro de progresso (omissão: <output>.ckpt)")
+    parser.add_argument("--api-url", default=os.environ.get("OPENAI_API_URL", DEFAULT_API_URL))
+    parser.add_argument("--backends", help="JSON com a lista de backends (routing e failover)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS)
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--concurrency", type=int, default=4, help="pedidos em simultâneo")
+    parser.add_argument("--rpm", type=int, default=0, help="limite de pedidos por minuto (0 = sem limite)")
+    parser.add_argument("--tpm", type=int, default=0, help="limite de tokens por minuto (0 = sem limite)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--metrics", help="exporta as métricas no fim (.csv ou texto Prometheus)")
+    args = parser.parse_args(argv)
+    args.api_key = os.environ.get("OPENAI_API_KEY", "")
+    checkpoint = args.checkpoint or args.output + ".ckpt"
+
+    done = read_checkpoint(checkpoint)
+    scheduler = RequestScheduler(args.rpm, args.tpm)
+    # sem chave: servidor compatível que não a pede (ex.: local ou o mock)
+    backend_cls = OpenAIBackend if args.api_key else LocalBackend
+    if args.backends:
+        router = Router(load_backends(args.backends))
+    else:
+        router = Router([backend_cls(url=args.api_url, api_key=args.api_key)])
+    ok = failed = skipped = 0
+    start = time.perf_counter()
+
+    with open(args.output, "a", encoding="utf-8") as out, \
+            open(checkpoint, "a", encoding="utf-8") as ckpt, \
+            ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        pending = set()
+
+        def drain(block):
+            nonlocal ok, failed
+            # escreve os resultados que já terminaram (pela ordem de chegada)
+            if block:
+                finished = wait(pending, return_when=FIRST_COMPLETED).done
+            else:
+                finished = [f for f in pending if f.done()]
+            for future in finished:
+                pending.discard(future)
+                result = future.result()
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                if result["ok"]:
+                    # só depois de o resultado estar no output
+                    ckpt.write(result["id"] + "\n")
+                    ckpt.flush()
+                    ok += 1
+                else:
+                    failed += 1
+
+        try:
+            for job_id, record in read_jobs(args.input):
+                if job_id in done:
+                    skipped += 1
+                    continue
+                # limita os pedidos em voo: não se lê o ficheiro todo para memória
+                while len(pending) >= args.concurrency * 2:
+                    drain(True)
+                pending.add(pool.submit(run_job, job_id, build_payload(record, args), router, scheduler, args))
+                drain(False)
+            while pending:
+                drain(True)
+        except KeyboardInterrupt:
+            # o que já terminou fica no checkpoint; o resto repete-se na próxima execução
+            print("\nInterrompido; a retomar mais tarde continua do checkpoint.", file=sys.stderr)
+            pool.shutdown(wait=False, cancel_futures=True)
+            return 130
+        finally:
+            get_client().close()
+            if args.metrics:
+                metrics.write(args.metrics)
+
+    elapsed = time.perf_counter() - start
+    print(f"{ok} ok, {failed} com erro, {skipped} já feitos (checkpoint) em {elapsed:.1f}s",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# bench_memory.py
+# Compara a memória do histórico: lista de dicts (antes) vs MessageStore.
+# Uso: python bench/bench_memory.py --messages 100000 [--spill-after 20000]
+#
+# As mensagens são lidas de linhas JSONL (como ao importar um log), por isso
+# cada dict traz as suas próprias strings de chave e de role.
+import os
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from message_store import MessageStore  # noqa: E402
+from context_window import ContextManager  # noqa: E402
+
+
+def make_lines(n, seed=1):
+    rng = random.Random(seed)
+    words = "o a de que para com uma resposta pergunta modelo código janela erro lista".split()
+    roles = ("user", "assistant")
+    lines = []
+    for i in range(n):
+        content = " ".join(rng.choice(words) for _ in range(rng.randint(5, 80)))
+        lines.append(json.dumps({"role": roles[i % 2], "content": content}, ensure_ascii=False))
+    return lines
+
+
+def measure(build, lines):
+    """Memória ocupada pelo histórico construído (tracemalloc) e tempo de construção."""
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    history = build(lines)
+    elapsed = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return history, current, peak, elapsed
+
+
+def bench_context(history, repeat=3):
+    """Tempo de ContextManager.build (o que corre antes de cada pedido)."""
+    context = ContextManager("gpt-3.5-turbo")
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        context.build(history)
+        times.append(time.perf_counter() - t0)
+    return times[0], min(times[1:])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memória do histórico: dicts vs MessageStore")
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--spill-after", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    lines = make_lines(args.messages)
+    text = sum(len(line) for line in lines) / 1e6
+    print(f"{args.messages} mensagens (~{text:.0f} MB de JSONL)")
+    variants = [
+        ("lista de dicts", lambda ls: [json.loads(line) for line in ls]),
+        ("MessageStore", lambda ls: MessageStore(json.loads(line) for line in ls)),
+        (f"MessageStore (spill {args.spill_after})",
+         lambda ls: MessageStore((json.loads(line) for line in ls), spill_after=args.spill_after)),
+    ]
+    print(f"{'':34} {'memória MB':>10} {'pico MB':>8} {'criar s':>8} {'contexto 1º/2º ms':>18}")
+    for name, build in variants:
+        history, current, peak, elapsed = measure(build, lines)
+        first, again = bench_context(history)
+        print(f"{name:34} {current / 1e6:10.1f} {peak / 1e6:8.1f} {elapsed:8.2f} "
+              f"{first * 1000:9.0f}/{again * 1000:.0f}")
+        if isinstance(history, MessageStore):
+            history.close()
+        del history
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
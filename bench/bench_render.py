@@ -0,0 +1,128 @@
+# bench_render.py
+# Mede o custo de renderizar o histórico na lista virtualizada (Qt offscreen).
+# Uso: python bench/bench_render.py --messages 2000 --import 100000
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import importlib.util
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication, QTextEdit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app_module():
+    """Carrega app-1.py como módulo (o hífen impede um import normal)."""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    spec = importlib.util.spec_from_file_location("app1", os.path.join(ROOT, "app-1.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_messages(n):
+    roles = ("user", "assistant")
+    return [{"role": roles[i % 2], "content": f"Mensagem número {i} " + "texto " * 20} for i in range(n)]
+
+
+def make_view(app_module):
+    model = app_module.TranscriptModel()
+    view = app_module.TranscriptView(model)
+    view.resize(800, 600)
+    view.show()
+    return model, view
+
+
+def bench_incremental(app, app_module, messages):
+    """Uma mensagem de cada vez, como numa sessão real (append_new + layout + pintura)."""
+    model, view = make_view(app_module)
+    history = []
+    start = time.perf_counter()
+    for msg in messages:
+        history.append(msg)
+        model.append_new(history)
+        view.scroll_to_end()
+        app.processEvents()
+    return time.perf_counter() - start
+
+
+def bench_rebuild(app, app_module, messages):
+    """Histórico inteiro de uma vez (fim de um import), até à primeira pintura."""
+    model, view = make_view(app_module)
+    start = time.perf_counter()
+    model.rebuild(messages)
+    view.scroll_to_end()
+    app.processEvents()
+    return time.perf_counter() - start
+
+
+def bench_import(messages, first_batch=200):
+    """Leitura de um JSON exportado: primeiro ecrã (iter_messages) vs json.load inteiro."""
+    from conversation_log import iter_messages
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "conversa.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(messages, f, ensure_ascii=False, indent=4)
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        first = None
+        for i, _ in enumerate(iter_messages(path), 1):
+            if i == first_batch:
+                first = time.perf_counter() - start
+        total = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(path, "r", encoding="utf-8") as f:
+            json.load(f)
+        whole = time.perf_counter() - start
+    return size, first, total, whole
+
+
+def bench_legacy(messages):
+    """Comportamento antigo: limpa e reescreve tudo a cada mensagem (O(n²))."""
+    edit = QTextEdit()
+    start = time.perf_counter()
+    for i in range(1, len(messages) + 1):
+        edit.clear()
+        for msg in messages[:i]:
+            edit.append(f"{msg['role']}: {msg['content']}\n")
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da renderização do chat")
+    parser.add_argument("--messages", type=int, default=2000,
+                        help="nº de mensagens acrescentadas uma a uma")
+    parser.add_argument("--import", dest="imported", type=int, default=100000,
+                        help="nº de mensagens do ficheiro importado")
+    parser.add_argument("--legacy", type=int, default=300,
+                        help="nº de mensagens para o modo antigo (quadrático; 0 desliga)")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    app_module = load_app_module()
+    messages = make_messages(max(args.messages, args.imported))
+
+    t = bench_incremental(app, app_module, messages[:args.messages])
+    print(f"incremental: {args.messages} mensagens em {t:.3f}s ({t / args.messages * 1e6:.1f} µs/msg)")
+    t = bench_rebuild(app, app_module, messages[:args.imported])
+    print(f"rebuild:     {args.imported} mensagens em {t:.3f}s (até à primeira pintura)")
+    size, first, total, whole = bench_import(messages[:args.imported])
+    print(f"import:      {size / 1e6:.1f} MB, primeiro ecrã em {(first or total) * 1000:.1f} ms, "
+          f"leitura completa {total:.2f}s (json.load: {whole:.2f}s)")
+    if args.legacy:
+        small = messages[:args.legacy]
+        t = bench_legacy(small)
+        print(f"antigo:      {args.legacy} mensagens em {t:.3f}s (re-render total por mensagem)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
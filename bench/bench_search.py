@@ -0,0 +1,99 @@
+# bench_search.py
+# Mede a latência das pesquisas no índice FTS5 (search_index.py).
+# Uso: python bench/bench_search.py --messages 1000000 [--db /tmp/pesquisa.sqlite]
+#
+# Gera conversas sintéticas (vocabulário com distribuição de Zipf, como texto
+# real) e mede p50/p95/máx de cada query; o objectivo é ficar abaixo de 100 ms.
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from search_index import SearchIndex, fts_query  # noqa: E402
+
+QUERIES = [
+    "python",             # termo frequente
+    "qthread sinal",      # dois termos
+    "exceção",            # com acento (remove_diacritics)
+    "configura*",         # prefixo
+    "palavra0042 palavra0777",
+    "xyzzyinexistente",   # sem resultados
+]
+
+
+def make_vocabulary(size):
+    base = ["python", "qthread", "sinal", "exceção", "configuração", "ficheiro", "janela",
+            "pedido", "resposta", "modelo", "tokens", "erro", "lista", "função", "classe"]
+    return base + [f"palavra{i:04d}" for i in range(size - len(base))]
+
+
+def build(index, messages, per_conversation, seed=1):
+    rng = random.Random(seed)
+    vocab = make_vocabulary(5000)
+    weights = [1.0 / (i + 1) for i in range(len(vocab))]
+    roles = ("user", "assistant")
+    t0 = time.perf_counter()
+    done = 0
+    conversation = 0
+    while done < messages:
+        n = min(per_conversation, messages - done)
+        words = rng.choices(vocab, weights, k=n * 30)
+        entries = [{"role": roles[i % 2], "content": " ".join(words[i * 30:(i + 1) * 30])}
+                   for i in range(n)]
+        index.add_messages(os.path.join(tempfile.gettempdir(), f"conversa_bench_{conversation}.jsonl"),
+                           entries)
+        done += n
+        conversation += 1
+    index.optimize()
+    return time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latência das pesquisas no índice FTS5")
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--per-conversation", type=int, default=500)
+    parser.add_argument("--db", help="índice a usar/criar (por omissão, um ficheiro temporário)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    tmp = None
+    path = args.db
+    if path is None:
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, "pesquisa.sqlite")
+    index = SearchIndex(path)
+    try:
+        if index.stats()["messages"] < args.messages:
+            elapsed = build(index, args.messages, args.per_conversation)
+            print(f"índice: {args.messages} mensagens em {elapsed:.1f} s "
+                  f"({os.path.getsize(path) / 1e6:.0f} MB)")
+
+        total = index.stats()["messages"]
+        print(f"{'query':28} {'contêm':>8} {'p50 ms':>8} {'p95 ms':>8} {'máx ms':>8}")
+        for query in QUERIES:
+            # fração das mensagens com todos os termos (fora da medição)
+            matches = index._db.execute("SELECT COUNT(*) FROM messages WHERE messages MATCH ?",
+                                        (fts_query(query),)).fetchone()[0]
+            times = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                index.search(query)
+                times.append((time.perf_counter() - t0) * 1000)
+            times.sort()
+            p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+            print(f"{query:28} {matches / total:8.1%} {statistics.median(times):8.1f} {p95:8.1f} {times[-1]:8.1f}")
+    finally:
+        index.close()
+        if tmp is not None:
+            tmp.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
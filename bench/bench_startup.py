@@ -0,0 +1,64 @@
+# bench_startup.py
+# Mede o tempo até à primeira pintura da janela (Qt offscreen, processo novo).
+# Uso: python bench/bench_startup.py --runs 10 [app-1.py app.py]
+#
+# Cada execução lança a app com o log de arranque activo (startup.py) e com
+# CHATGPT_QT_STARTUP_EXIT=1, para fechar assim que fica pronta. Os tempos
+# contam desde o lançamento do processo (inclui o arranque do Python).
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_once(script, workdir):
+    """Lança a app uma vez e devolve {fase: segundos} e o tempo total do processo."""
+    env = dict(os.environ,
+               QT_QPA_PLATFORM="offscreen",
+               CHATGPT_QT_STARTUP_LOG="1",
+               CHATGPT_QT_STARTUP_EXIT="1",
+               HOME=workdir)
+    env["CHATGPT_QT_STARTUP_T0"] = repr(time.time())
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, os.path.join(ROOT, script)], cwd=workdir, env=env,
+                          capture_output=True, text=True, timeout=60)
+    wall = time.perf_counter() - start
+    phases = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("startup:") or "phase" in line:
+            continue
+        _, cumulative, phase = (part.strip() for part in line[len("startup:"):].split("|", 2))
+        phases[phase] = int(cumulative) / 1e6
+    if "primeira pintura" not in phases:
+        raise RuntimeError(f"{script}: sem registo de arranque\n{proc.stderr}")
+    return phases, wall
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do arranque das apps Qt")
+    parser.add_argument("scripts", nargs="*", default=["app-1.py", "app.py"])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    for script in args.scripts:
+        results = []
+        with tempfile.TemporaryDirectory() as workdir:
+            # a primeira execução aquece a cache de disco e os .pyc (não conta)
+            run_once(script, workdir)
+            for _ in range(args.runs):
+                results.append(run_once(script, workdir))
+        print(f"{script} ({args.runs} execuções, mediana):")
+        for phase in results[0][0]:
+            values = [phases[phase] for phases, _ in results if phase in phases]
+            print(f"  {phase:<18} {statistics.median(values) * 1000:7.1f} ms")
+        print(f"  {'processo completo':<18} {statistics.median(w for _, w in results) * 1000:7.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+# mock_server.py
+# Servidor local que imita /v1/chat/completions (normal e streaming SSE).
+# Uso: python bench/mock_server.py --port 8765
+#      OPENAI_API_URL=http://127.0.0.1:8765/v1/chat/completions python app-1.py
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_answer(payload):
+    """Gera uma resposta determinística a partir da última mensagem do utilizador."""
+    pergunta = ""
+    for msg in reversed(payload.get("messages") or []):
+        if msg.get("role") == "user":
+            pergunta = msg.get("content", "")
+            break
+    return f"Resposta simulada para: {pergunta}"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Handler HTTP; as opções vêm do servidor (self.server.options)."""
+    protocol_version = "HTTP/1.1"
+    # evita o atraso Nagle/delayed-ACK entre cabeçalhos e corpo
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        # silencioso por omissão
+        if self.server.options.get("verbose"):
+            super().log_message(fmt, *args)
+
+    def do_POST(self):
+        opts = self.server.options
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "JSON inválido"}})
+            return
+
+        if opts.get("latency"):
+            time.sleep(opts["latency"])
+
+        # injecção de erros: os primeiros N pedidos e/ou uma fração aleatória
+        with self.server.lock:
+            self.server.requests_seen += 1
+            seen = self.server.requests_seen
+        if seen <= opts.get("fail_first", 0) or random.random() < opts.get("error_rate", 0.0):
+            self._send_error(opts.get("error_status", 429), opts.get("retry_after"))
+            return
+
+        answer = make_answer(payload)
+        if payload.get("stream"):
+            self._send_stream(answer, opts.get("chunk_delay", 0.0))
+        else:
+            self._send_json(200, {
+                "object": "chat.completion",
+                "model": payload.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer},
+                             "finish_reason": "stop"}],
+            })
+
+    def do_HEAD(self):
+        # como a API real: 405 sem corpo, ligação mantida (usado no pré-aquecimento)
+        self.send_response(405)
+        self.send_header("Allow", "POST")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, retry_after=None):
+        body = json.dumps({"error": {"message": f"Erro simulado {status}"}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, answer, chunk_delay):
+        # como a API real: text/event-stream com Transfer-Encoding chunked
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        try:
+            # um chunk por palavra (aprox. um token)
+            words = answer.split(" ")
+            for i, word in enumerate(words):
+                delta = word if i == 0 else " " + word
+                event = {"object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+                self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                if chunk_delay:
+                    time.sleep(chunk_delay)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # o cliente cancelou a meio do stream
+            self.close_connection = True
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+class MockServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # ligações keep-alive fechadas pelo cliente (ex.: no fim de um benchmark)
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+def make_server(host="127.0.0.1", port=0, **options):
+    """Cria o servidor (port=0 escolhe uma porta livre). Não inicia o loop."""
+    server = MockServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.options = options
+    server.lock = threading.Lock()
+    server.requests_seen = 0
+    return server
+
+
+def start_in_thread(**options):
+    """Arranca o servidor numa thread daemon e devolve (server, url)."""
+    server = make_server(**options)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1/chat/completions"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor mock de /v1/chat/completions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="atraso antes da resposta (s)")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="atraso entre chunks SSE (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de pedidos com erro")
+    parser.add_argument("--error-status", type=int, default=429, help="estado HTTP dos erros")
+    parser.add_argument("--fail-first", type=int, default=0, help="os primeiros N pedidos falham")
+    parser.add_argument("--retry-after", help="valor do cabeçalho Retry-After nos erros")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, latency=args.latency,
+                         chunk_delay=args.chunk_delay, error_rate=args.error_rate,
+                         error_status=args.error_status, fail_first=args.fail_first,
+                         retry_after=args.retry_after, verbose=args.verbose)
+    print(f"Mock a ouvir em http://{args.host}:{args.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+# run_all.py
+# Suite de benchmarks: cliente da API e GUI (Qt offscreen) contra o mock local,
+# render em função do tamanho do histórico e custo da escrita dos logs.
+#
+# Uso: python bench/run_all.py [--quick] [--save] [--compare bench/results/X.json]
+#
+# Com --save os resultados ficam em bench/results/<data>_<commit>.json; com
+# --compare cada valor é comparado com um resultado anterior (diferença em %).
+# Nada fala com a API real: o mock (bench/mock_server.py) corre numa thread.
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH)
+
+from mock_server import start_in_thread  # noqa: E402
+from bench_render import load_app_module, make_messages, make_view  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+RESULTS_DIR = os.path.join(BENCH, "results")
+
+# unidade de cada resultado: decide o sentido de "melhor" na comparação
+HIGHER_IS_BETTER = ("req_s", "msgs_s")
+# contagens (erros, retries) não entram na comparação em %
+NOT_COMPARED = ("errors", "retries")
+
+
+def stats_ms(samples):
+    values = sorted(samples)
+    return percentile(values, 0.5) * 1000, percentile(values, 0.95) * 1000
+
+
+# --- cliente da API ---
+
+def bench_client(requests, concurrency, stream, **server_options):
+    """Pedidos em paralelo com chat_completion: débito e latência por pedido."""
+    from api_client import chat_completion, get_client
+    server, url = start_in_thread(**server_options)
+    payload = {"model": "mock", "messages": [{"role": "user", "content": "olá " * 50}],
+               "max_tokens": 100, "stream": stream}
+
+    def one(_):
+        start = time.perf_counter()
+        result = chat_completion(url, "teste", payload, timeout=30)
+        attempts = (result.get("timing") or {}).get("attempts", 1)
+        return time.perf_counter() - start, result.get("ok", False), attempts
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, range(requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        # fecha primeiro as ligações keep-alive, depois o servidor
+        get_client().close()
+        server.shutdown()
+        server.server_close()
+    p50, p95 = stats_ms([t for t, _, _ in results])
+    return {"req_s": requests / elapsed, "p50_ms": p50, "p95_ms": p95,
+            "errors": sum(1 for _, ok, _ in results if not ok),
+            "retries": sum(attempts - 1 for _, _, attempts in results)}
+
+
+# --- GUI ---
+
+def pump_until(app, done, timeout=30):
+    end = time.perf_counter() + timeout
+    while not done():
+        if time.perf_counter() > end:
+            raise TimeoutError("a GUI não terminou a tempo")
+        app.processEvents()
+        time.sleep(0.0005)
+
+
+def bench_gui_roundtrip(app, app_module, turns, chunk_delay):
+    """Do Enviar até à resposta (em streaming) estar no display, com a janela real."""
+    server, url = start_in_thread(chunk_delay=chunk_delay)
+    cwd = os.getcwd()
+    samples = []
+    # logs, índice de pesquisa e cache numa pasta temporária (não nos dados do utilizador)
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        app_module.API_URL, app_module.API_KEY = url, "teste"
+        app_module.DATA_DIR = app_module.LOG_DIR = folder
+        app_module.SEARCH_INDEX = os.path.join(folder, "pesquisa.sqlite")
+        app_module.BACKENDS_FILE = None
+        app_module.SESSION_FILE = None
+        window = app_module.ChatGPTApp()
+        try:
+            window.show()
+            window.finish_setup()
+            tab = window.current_tab()
+            for i in range(turns):
+                tab.input_text.setPlainText(f"pergunta {i} " + "texto " * 20)
+                start = time.perf_counter()
+                tab.get_response()
+                pump_until(app, lambda: not tab.busy)
+                samples.append(time.perf_counter() - start)
+        finally:
+            window.close()
+            app.processEvents()
+            os.chdir(cwd)
+            server.shutdown()
+            server.server_close()
+    p50, p95 = stats_ms(samples)
+    return {"p50_ms": p50, "p95_ms": p95}
+
+
+def bench_render(app, app_module, sizes, appends=20):
+    """Por tamanho do histórico: rebuild até à pintura e custo de acrescentar uma mensagem."""
+    from message_store import MessageStore
+    messages = make_messages(max(sizes) + appends)
+    results = {}
+    views = []
+    for n in sizes:
+        model, view = make_view(app_module)
+        views.append((model, view))
+        history = MessageStore(messages[:n])
+
+        start = time.perf_counter()
+        model.rebuild(history)
+        view.scroll_to_end()
+        app.processEvents()
+        rebuild = time.perf_counter() - start
+
+        samples = []
+        for msg in messages[n:n + appends]:
+            start = time.perf_counter()
+            history.extend([msg])
+            model.append_new(history)
+            view.scroll_to_end()
+            app.processEvents()
+            samples.append(time.perf_counter() - start)
+        p50, p95 = stats_ms(samples)
+        results[str(n)] = {"rebuild_ms": rebuild * 1000, "append_p50_ms": p50, "append_p95_ms": p95}
+        # escondida mas viva até ao fim (como nos outros benchmarks)
+        view.hide()
+    return results
+
+
+# --- logs ---
+
+def bench_log_write(app_module, count):
+    """ConversationLog.extend (mensagem a mensagem, com fsync em lote) e o LogWriter."""
+    from conversation_log import ConversationLog
+    messages = make_messages(count)
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        log = ConversationLog(os.path.join(folder, "direct.jsonl"))
+        start = time.perf_counter()
+        for msg in messages:
+            log.append(msg)
+        log.close()
+        elapsed = time.perf_counter() - start
+        results["direct"] = {"us_per_msg": elapsed / count * 1e6, "msgs_s": count / elapsed}
+
+        # pela thread de escrita da app (JSONL + TXT, agrupado em rajadas)
+        writer = app_module.LogWriter()
+        writer.start()
+        log = ConversationLog(os.path.join(folder, "writer.jsonl"))
+        txt = os.path.join(folder, "writer.txt")
+        start = time.perf_counter()
+        for msg in messages:
+            writer.append(log, txt, msg)
+        writer.close_log(log)
+        writer.stop()
+        elapsed = time.perf_counter() - start
+        results["log_writer"] = {"us_per_msg": elapsed / count * 1e6, "msgs_s": count / elapsed}
+    return results
+
+
+# --- resultados ---
+
+def flatten(tree, prefix=""):
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        else:
+            flat[name] = value
+    return flat
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or "desconhecido"
+    except (OSError, subprocess.SubprocessError):
+        return "desconhecido"
+
+
+def save(report):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(RESULTS_DIR, f"{stamp}_{report['meta']['commit']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def compare(current, previous):
+    """Tabela com os valores actuais, os anteriores e a diferença (+ é melhor)."""
+    old = flatten(previous["results"])
+    print(f"\nComparação com {previous['meta'].get('commit')} ({previous['meta'].get('date')}):")
+    print(f"{'métrica':48} {'antes':>10} {'agora':>10} {'dif.':>8}")
+    for name, value in flatten(current["results"]).items():
+        before = old.get(name)
+        if name.endswith(NOT_COMPARED) or not isinstance(before, (int, float)) or not before:
+            continue
+        change = (value - before) / before * 100
+        if not name.endswith(HIGHER_IS_BETTER):
+            change = -change
+        print(f"{name:48} {before:10.2f} {value:10.2f} {change:+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suite de benchmarks (mock local, Qt offscreen)")
+    parser.add_argument("--quick", action="store_true", help="menos pedidos e históricos mais pequenos")
+    parser.add_argument("--latency", type=float, default=0.02, help="latência do mock (s)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--save", action="store_true", help="grava o resultado em bench/results/")
+    parser.add_argument("--compare", help="resultado anterior (JSON) para comparar")
+    args = parser.parse_args(argv)
+
+    requests = 100 if args.quick else 400
+    sizes = [100, 1000, 10000] if args.quick else [100, 1000, 10000, 100000]
+    turns = 10 if args.quick else 30
+    log_count = 2000 if args.quick else 10000
+
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv)
+    app_module = load_app_module()
+    results = {}
+
+    print("cliente (mock, latência {:.0f} ms, {} em paralelo):".format(args.latency * 1000, args.concurrency))
+    scenarios = {
+        "json": dict(stream=False),
+        "stream": dict(stream=True, chunk_delay=0.001),
+        "erros_10pct": dict(stream=False, error_rate=0.1, retry_after="0"),
+    }
+    results["client"] = {}
+    for name, options in scenarios.items():
+        r = bench_client(requests, args.concurrency, latency=args.latency, **options)
+        results["client"][name] = r
+        print(f"  {name:12} {r['req_s']:7.1f} pedidos/s  p50 {r['p50_ms']:6.1f} ms  "
+              f"p95 {r['p95_ms']:6.1f} ms  erros {r['errors']}  retries {r['retries']}")
+
+    r = bench_gui_roundtrip(app, app_module, turns, chunk_delay=0.001)
+    results["gui_roundtrip"] = r
+    print(f"GUI (enviar → resposta no display, stream): p50 {r['p50_ms']:.1f} ms  p95 {r['p95_ms']:.1f} ms")
+
+    results["render"] = bench_render(app, app_module, sizes)
+    print("render vs tamanho do histórico:")
+    for n, r in results["render"].items():
+        print(f"  {int(n):>7} mensagens: rebuild {r['rebuild_ms']:8.1f} ms  "
+              f"acrescentar p50 {r['append_p50_ms']:5.2f} ms  p95 {r['append_p95_ms']:5.2f} ms")
+
+    results["log_write"] = bench_log_write(app_module, log_count)
+    print("escrita dos logs:")
+    for name, r in results["log_write"].items():
+        print(f"  {name:12} {r['us_per_msg']:7.1f} µs/mensagem ({r['msgs_s']:.0f}/s)")
+
+    report = {
+        "meta": {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+                 "commit": git_commit(), "python": platform.python_version(),
+                 "platform": platform.platform(), "quick": args.quick,
+                 "latency": args.latency, "concurrency": args.concurrency},
+        "results": results,
+    }
+    if args.save:
+        print(f"\nresultado gravado em {save(report)}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
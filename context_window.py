@@ -0,0 +1,167 @@
+# context_window.py
+# Gestão da janela de contexto: decide que parte do histórico vai no payload.
+#
+# - estimativa local de tokens (sem dependências; ~4 caracteres por token)
+# - orçamento por modelo (MODEL_CONTEXT), descontando os max_tokens da resposta
+# - políticas: "sliding" (janela deslizante) e "pinned" (mensagens de sistema
+#   ficam sempre, o resto desliza)
+# - compactação opcional: blocos das N mensagens mais antigas são substituídos
+#   por um resumo, guardado em cache e reutilizado nos pedidos seguintes
+import re
+import json
+import hashlib
+
+# tamanho da janela de contexto (tokens) por modelo
+MODEL_CONTEXT = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+DEFAULT_CONTEXT = 4096
+
+# custo fixo aproximado por mensagem (role + separadores)
+MESSAGE_OVERHEAD = 4
+
+POLICY_SLIDING = "sliding"
+POLICY_PINNED = "pinned"
+
+SUMMARY_PROMPT = ("Resume de forma concisa a conversa seguinte, mantendo factos, "
+                  "decisões e nomes importantes. Responde só com o resumo.")
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def estimate_tokens(text):
+    """Estimativa rápida de tokens de um texto (sem tokenizer)."""
+    if not text:
+        return 0
+    # o maior de dois estimadores: caracteres/4 e palavras+pontuação
+    by_chars = (len(text) + 3) // 4
+    by_words = len(_WORD_RE.findall(text))
+    return max(by_chars, by_words)
+
+
+def estimate_message_tokens(msg):
+    # as mensagens do MessageStore guardam a estimativa (o texto não é relido a cada pedido)
+    tokens = getattr(msg, "tokens", None)
+    if tokens is not None:
+        return tokens
+    return MESSAGE_OVERHEAD + estimate_tokens(msg.get("content") or "")
+
+
+def estimate_payload_tokens(messages):
+    return sum(estimate_message_tokens(m) for m in messages) + 3
+
+
+def clean_message(msg):
+    """Só role/content seguem para a API (metadados locais ficam de fora)."""
+    return {"role": msg.get("role", ""), "content": msg.get("content", "")}
+
+
+def turns_key(turns):
+    """Chave estável (hash) de um bloco de mensagens, usada na cache de resumos."""
+    raw = json.dumps([clean_message(m) for m in turns], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ContextManager:
+    """Constrói a lista de mensagens a enviar dentro do orçamento de tokens."""
+
+    def __init__(self, model, budget=None, max_tokens=400, policy=POLICY_PINNED,
+                 summarize_turns=0):
+        self.model = model
+        self.max_tokens = max_tokens
+        if budget is None:
+            # reserva espaço para a resposta
+            budget = MODEL_CONTEXT.get(model, DEFAULT_CONTEXT) - max_tokens
+        self.budget = budget
+        self.policy = policy
+        self.summarize_turns = summarize_turns
+        self.summaries = {}  # turns_key -> resumo
+
+    def _split(self, messages):
+        """Separa mensagens fixas (sistema, na política pinned) das restantes."""
+        if self.policy == POLICY_PINNED:
+            pinned = [m for m in messages if m.get("role") == "system"]
+            rest = [m for m in messages if m.get("role") != "system"]
+            return pinned, rest
+        return [], list(messages)
+
+    def _blocks(self, rest):
+        """Blocos completos de N mensagens antigas, candidatos a resumo."""
+        n = self.summarize_turns
+        if n <= 0:
+            return []
+        # a mensagem mais recente nunca entra num resumo
+        usable = len(rest) - 1
+        return [rest[i:i + n] for i in range(0, usable - n + 1, n)]
+
+    def _summarized_prefix(self, rest):
+        """Resumos em cache para os blocos iniciais consecutivos: (resumos, nº mensagens)."""
+        summaries, covered = [], 0
+        for block in self._blocks(rest):
+            summary = self.summaries.get(turns_key(block))
+            if summary is None:
+                break
+            summaries.append(summary)
+            covered += len(block)
+        return summaries, covered
+
+    def build(self, messages):
+        """Devolve (mensagens_para_payload, info)."""
+        pinned, rest = self._split(messages)
+        pinned = [clean_message(m) for m in pinned]
+        info = {"total": len(messages), "summarized": 0, "dropped": 0}
+
+        used = estimate_payload_tokens(pinned)
+        if used + estimate_payload_tokens(rest) <= self.budget:
+            selected = pinned + [clean_message(m) for m in rest]
+        else:
+            head = []
+            summaries, covered = self._summarized_prefix(rest)
+            if summaries:
+                head = [{"role": "system",
+                         "content": "Resumo da conversa anterior:\n" + "\n\n".join(summaries)}]
+                used += estimate_payload_tokens(head)
+                info["summarized"] = covered
+                rest = rest[covered:]
+
+            # janela deslizante: das mais recentes para as mais antigas
+            tail = []
+            for msg in reversed(rest):
+                cost = estimate_message_tokens(msg)
+                if tail and used + cost > self.budget:
+                    break
+                tail.append(clean_message(msg))
+                used += cost
+            tail.reverse()
+            info["dropped"] = len(rest) - len(tail)
+            selected = pinned + head + tail
+
+        info["messages"] = len(selected)
+        info["tokens"] = estimate_payload_tokens(selected)
+        return selected, info
+
+    def pending_summary(self, messages):
+        """Próximo bloco antigo que ainda vai ser cortado e não tem resumo (ou None)."""
+        if self.summarize_turns <= 0:
+            return None
+        _, info = self.build(messages)
+        if not info["dropped"]:
+            return None
+        _, rest = self._split(messages)
+        _, covered = self._summarized_prefix(rest)
+        blocks = self._blocks(rest)
+        index = covered // self.summarize_turns
+        return blocks[index] if index < len(blocks) else None
+
+    def summary_request(self, turns):
+        """Mensagens do pedido de resumo para um bloco."""
+        transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in turns)
+        return [{"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": transcript}]
+
+    def store_summary(self, turns, summary):
+        self.summaries[turns_key(turns)] = summary
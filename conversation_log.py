@@ -0,0 +1,360 @@
+# conversation_log.py
+# Log de conversa append-only em JSONL (uma mensagem por linha).
+#
+# Cada mensagem nova custa uma linha escrita no fim do ficheiro, em vez de
+# reescrever o histórico inteiro. O fsync é feito em lote (a cada N linhas ou
+# T segundos) e o JSON "antigo" (lista com indent=4) é gerado a pedido por
+# compactação atómica (ficheiro temporário + os.replace).
+#
+# iter_messages() lê JSON ou JSONL de forma incremental (aos blocos), para
+# importar transcrições muito grandes sem as carregar inteiras de uma vez.
+#
+# Uso em linha de comandos:
+#   python conversation_log.py compact conversa_X.jsonl [conversa_X.json]
+import os
+import sys
+import json
+import time
+import tempfile
+
+
+def _fsync_dir(path):
+    """fsync da pasta, para o os.replace sobreviver a um crash (POSIX)."""
+    if os.name != "posix":
+        return
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_TORN = object()
+
+
+def _decode_line(line):
+    """O JSON de uma linha do log, ou _TORN se a linha não for JSON válido.
+
+    Regra única de leitores e escritor: só a última linha com conteúdo pode
+    estar cortada (crash a meio de uma escrita). Os leitores ignoram-na e
+    _repair_tail corta-a antes de acrescentar; noutro sítio é corrupção.
+    """
+    try:
+        return json.loads(line)
+    except ValueError:
+        return _TORN
+
+
+def _repair_tail(path, chunk_size=1 << 16):
+    """Garante que o ficheiro acaba numa linha completa antes de lhe acrescentar.
+
+    A última linha com conteúdo, se não for JSON válido (crash a meio de uma
+    escrita, com ou sem o "\\n" já escrito), é cortada; uma completa só sem o
+    "\\n" final (ex.: JSONL escrito por outra ferramenta) fica.
+    """
+    try:
+        f = open(path, "rb+")
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        data = b""
+        # recua até ter a última linha com conteúdo inteira
+        while pos > 0 and b"\n" not in data.rstrip():
+            step = min(chunk_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+        body = data.rstrip()
+        if not body:
+            return
+        start = body.rfind(b"\n") + 1
+        if _decode_line(body[start:]) is _TORN:
+            f.truncate(pos + start)
+        elif data.endswith(b"\n"):
+            return
+        else:
+            f.seek(end)
+            f.write(b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_json_atomic(path, messages):
+    """Escreve a lista de mensagens em JSON (formato antigo) de forma atómica."""
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=folder)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(list(messages), f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(path)
+
+
+def read_jsonl(path):
+    """Lê um log JSONL. Uma última linha incompleta (crash a meio) é ignorada."""
+    return list(_iter_jsonl(path))
+
+
+def _check_message(item):
+    # valida os elementos básicos (role + content)
+    if not isinstance(item, dict) or "role" not in item or "content" not in item:
+        raise ValueError("Formato inválido: cada item deve ter 'role' e 'content'.")
+    return item
+
+
+def _parse_lines(lines, path, first_lineno=1):
+    """Mensagens de linhas JSONL (str ou bytes); as linhas vazias não contam.
+
+    Uma linha inválida só é tolerada se for a última com conteúdo (ver
+    _decode_line); antes de outra linha, o ficheiro está corrompido.
+    """
+    pending_error = None
+    for lineno, line in enumerate(lines, first_lineno):
+        line = line.strip()
+        if not line:
+            continue
+        if pending_error is not None:
+            raise pending_error
+        item = _decode_line(line)
+        if item is _TORN:
+            pending_error = ValueError(f"Linha {lineno} inválida em {path}")
+            continue
+        yield _check_message(item)
+
+
+def _iter_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        yield from _parse_lines(f, path)
+
+
+def _iter_json_array(path, chunk_size):
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        eof = False
+        started = False
+
+        def more():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            # descarta o que já foi lido: a memória fica limitada a um bloco
+            buf = buf[pos:] + chunk
+            pos = 0
+            return True
+
+        while True:
+            # salta espaços e separadores
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) or not more():
+                    break
+            if pos >= len(buf):
+                raise ValueError("O ficheiro JSON está incompleto.")
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("O ficheiro JSON não contém uma lista de mensagens.")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                    break
+                except ValueError:
+                    # objeto cortado no fim do bloco: lê mais e tenta de novo
+                    if eof or not more():
+                        raise ValueError("O ficheiro JSON está incompleto ou inválido.")
+            pos = end
+            yield _check_message(item)
+
+
+def iter_messages(path, chunk_size=1 << 16):
+    """Lê as mensagens de um ficheiro JSON (lista) ou JSONL, uma a uma, aos blocos."""
+    if path.lower().endswith(".jsonl"):
+        return _iter_jsonl(path)
+    return _iter_json_array(path, chunk_size)
+
+
+def _nonblank(lines):
+    return sum(1 for line in lines if line.strip())
+
+
+def tail_messages(path, count, chunk_size=1 << 16, keep_roles=()):
+    """As últimas `count` mensagens de um log JSONL e a posição da primeira.
+
+    Devolve (posição, mensagens, guardadas). A posição conta mensagens (como
+    iter_messages: linhas vazias não contam). Só as linhas do fim são lidas
+    como JSON; o resto do ficheiro é percorrido uma vez, aos blocos, para
+    contar as mensagens anteriores e guardar as de `keep_roles` (ex.: as de
+    sistema, fixas no contexto) como pares (posição, mensagem).
+    """
+    markers = [json.dumps(role).encode("utf-8") for role in keep_roles]
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        data = b""
+        # recua até ter `count` linhas completas (mais a que atravessa o início do bloco)
+        while pos > 0 and _nonblank(data.split(b"\n")[1:]) <= count:
+            step = min(chunk_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+        if pos > 0:
+            # o bloco começa a meio de uma linha: essa fica para a contagem
+            cut = data.index(b"\n") + 1
+            pos, data = pos + cut, data[cut:]
+        f.seek(0)
+        before = lines_before = 0
+        kept = []
+        carry = b""
+        remaining = pos
+        while remaining > 0:
+            chunk = f.read(min(chunk_size * 16, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            lines = (carry + chunk).split(b"\n")
+            carry = lines.pop()
+            lines_before += len(lines)
+            if not markers:
+                before += _nonblank(lines)
+                continue
+            for line in lines:
+                if not line.strip():
+                    continue
+                if any(m in line for m in markers):
+                    item = _decode_line(line)
+                    if isinstance(item, dict) and item.get("role") in keep_roles:
+                        kept.append((before, _check_message(item)))
+                before += 1
+    items = list(_parse_lines(data.split(b"\n"), path, lines_before + 1))
+    tail = items[-count:] if count else []
+    first = before + len(items) - len(tail)
+    # as do fim que não entram na cauda também podem ser precisas
+    kept.extend((before + i, item) for i, item in enumerate(items[:len(items) - len(tail)])
+                if item.get("role") in keep_roles)
+    return first, tail, kept
+
+
+def load_messages(path):
+    """Carrega mensagens de um ficheiro JSON (lista) ou JSONL (uma por linha)."""
+    return list(iter_messages(path))
+
+
+def compact(jsonl_path, json_path=None):
+    """Gera o JSON antigo a partir do log JSONL. Devolve o caminho escrito."""
+    if json_path is None:
+        json_path = os.path.splitext(jsonl_path)[0] + ".json"
+    write_json_atomic(json_path, read_jsonl(jsonl_path))
+    return json_path
+
+
+class ConversationLog:
+    """Log append-only de mensagens em JSONL com fsync em lote."""
+
+    def __init__(self, path, fsync_every=8, fsync_interval=2.0):
+        self.path = os.path.abspath(path)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = None       # aberto só na primeira escrita
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _open(self):
+        if self._file is None:
+            # uma linha a meio (crash durante uma escrita) colava-se à seguinte
+            _repair_tail(self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def append(self, entry):
+        """Acrescenta uma mensagem (uma linha). O fsync é feito em lote."""
+        self.extend([entry])
+
+    def extend(self, entries):
+        """Acrescenta várias mensagens com uma única escrita."""
+        lines = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+        if not lines:
+            return
+        f = self._open()
+        f.write(lines)
+        # flush para o SO: um crash do processo não perde nada
+        f.flush()
+        self._unsynced += len(entries)
+        if (self._unsynced >= self.fsync_every
+                or time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.sync()
+
+    def sync(self):
+        """Força o fsync das linhas pendentes."""
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def rewrite(self, messages):
+        """Substitui o log inteiro (ex.: depois de importar uma conversa)."""
+        self.close()
+        folder = os.path.dirname(self.path)
+        fd, tmp = tempfile.mkstemp(prefix=".tmp_", suffix=".jsonl", dir=folder)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for entry in messages:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        _fsync_dir(self.path)
+
+    def compact(self, json_path=None):
+        """Sincroniza e gera o JSON antigo. Devolve o caminho ou None se vazio."""
+        self.sync()
+        if not os.path.exists(self.path):
+            return None
+        return compact(self.path, json_path)
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) not in (2, 3) or argv[0] != "compact":
+        print("Uso: python conversation_log.py compact conversa.jsonl [conversa.json]")
+        return 2
+    out = compact(argv[1], argv[2] if len(argv) == 3 else None)
+    print(f"JSON gerado: {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+# message_store.py
+# Histórico de mensagens compacto em memória.
+#
+# Cada mensagem é um Message com __slots__ (sem o dict por instância) e roles
+# internados; o Message responde a msg.get("role") / msg["content"] como os
+# dicts antigos, por isso o resto do código (contexto, display, exports) não
+# muda. Fatias do MessageStore são vistas (não copiam a lista), o que chega
+# porque o histórico só cresce no fim.
+#
+# Com spill_after=N, só o texto das N mensagens mais recentes fica em memória:
+# o das antigas vai para um ficheiro temporário e é lido quando é preciso
+# (ex.: ao subir no display). A mensagem continua a ser o mesmo objecto.
+import sys
+import struct
+import tempfile
+from collections.abc import Sequence
+
+from context_window import MESSAGE_OVERHEAD, estimate_tokens
+
+# texto das mensagens mais antigas vai para disco aos blocos (não uma a uma)
+SPILL_CHUNK = 1000
+
+_LENGTH = struct.Struct("<I")
+
+
+class Message:
+    """Uma mensagem do histórico (role, content e a marca truncated)."""
+
+    __slots__ = ("role", "_content", "truncated", "_tokens", "_store")
+
+    def __init__(self, role, content, truncated=False):
+        self.role = sys.intern(role) if isinstance(role, str) else role
+        self._content = content
+        self.truncated = truncated
+        self._tokens = None
+        self._store = None  # MessageStore, só depois de o texto ir para disco
+
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(entry.get("role", ""), entry.get("content", ""), bool(entry.get("truncated")))
+
+    @property
+    def content(self):
+        content = self._content
+        if self._store is not None:
+            # no ficheiro de spill: _content é o offset
+            return self._store._read(content)
+        return content
+
+    @property
+    def tokens(self):
+        """Estimativa de tokens (calculada uma vez; ver context_window)."""
+        if self._tokens is None:
+            self._tokens = MESSAGE_OVERHEAD + estimate_tokens(self.content or "")
+        return self._tokens
+
+    def to_dict(self):
+        """Formato dos logs/exports: role, content e truncated (só se for o caso)."""
+        entry = {"role": self.role, "content": self.content}
+        if self.truncated:
+            entry["truncated"] = True
+        return entry
+
+    # compatibilidade com o código que tratava as mensagens como dicts
+    def get(self, key, default=None):
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        if key == "truncated":
+            return self.truncated or default
+        return default
+
+    def __getitem__(self, key):
+        if key not in ("role", "content", "truncated"):
+            raise KeyError(key)
+        return self.get(key)
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content!r})"
+
+
+class MessageView(Sequence):
+    """Fatia [start:stop] de um MessageStore, sem copiar (stop=None acompanha o fim)."""
+
+    __slots__ = ("_store", "_start", "_stop")
+
+    def __init__(self, store, start, stop=None):
+        self._store = store
+        self._start = start
+        self._stop = stop
+
+    def _range(self):
+        return range(len(self._store))[self._start:self._stop]
+
+    def __len__(self):
+        return len(self._range())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            r = self._range()[index]
+            if r.step != 1:
+                return [self._store[i] for i in r]
+            return MessageView(self._store, r.start, r.stop)
+        return self._store[self._range()[index]]
+
+    def __iter__(self):
+        items = self._store._items
+        for i in self._range():
+            yield items[i]
+
+
+class MessageStore(Sequence):
+    """Histórico append-only de Message, com texto antigo opcionalmente em disco."""
+
+    def __init__(self, messages=(), spill_after=None):
+        self._items = []
+        self.spill_after = spill_after
+        self._spilled = 0       # as primeiras _spilled mensagens têm o texto em disco
+        self._file = None       # ficheiro temporário (apagado ao fechar)
+        self.extend(messages)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            r = range(len(self._items))[index]
+            if r.step != 1:
+                return [self._items[i] for i in r]
+            return MessageView(self, r.start, r.stop)
+        return self._items[index]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __reversed__(self):
+        return reversed(self._items)
+
+    def append(self, role, content, truncated=False):
+        """Acrescenta uma mensagem nova e devolve-a."""
+        message = Message(role, content, truncated)
+        self._items.append(message)
+        self._maybe_spill()
+        return message
+
+    def extend(self, entries):
+        """Acrescenta mensagens (dicts, como vêm dos logs, ou Message)."""
+        items = self._items
+        limit = None if self.spill_after is None else self.spill_after + SPILL_CHUNK
+        for entry in entries:
+            items.append(entry if isinstance(entry, Message) else Message.from_dict(entry))
+            # vai passando para disco durante a leitura (não só no fim)
+            if limit is not None and len(items) - self._spilled >= limit:
+                self._spill(self._spilled + SPILL_CHUNK)
+
+    def to_dicts(self, start=0):
+        """Lista de dicts (logs, exports JSON)."""
+        return [m.to_dict() for m in self._items[start:]]
+
+    def payload(self, start=0):
+        """Mensagens a enviar à API (só role/content), a partir de `start`."""
+        return [{"role": m.role, "content": m.content} for m in self._items[start:]]
+
+    # --- spill para disco ---
+
+    def _maybe_spill(self):
+        if self.spill_after is None:
+            return
+        while len(self._items) - self._spilled >= self.spill_after + SPILL_CHUNK:
+            self._spill(self._spilled + SPILL_CHUNK)
+
+    def _spill(self, stop):
+        """Passa para disco o texto das mensagens [_spilled, stop)."""
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="chatgpt_qt_", suffix=".spill")
+        f = self._file
+        f.seek(0, 2)
+        offset = f.tell()
+        parts = []
+        for message in self._items[self._spilled:stop]:
+            if message._store is not None or not isinstance(message._content, str):
+                continue
+            data = message._content.encode("utf-8")
+            parts.append(_LENGTH.pack(len(data)))
+            parts.append(data)
+            message._content = offset
+            message._store = self
+            offset += _LENGTH.size + len(data)
+        f.write(b"".join(parts))
+        f.flush()
+        self._spilled = stop
+
+    def _read(self, offset):
+        f = self._file
+        f.seek(offset)
+        (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+        return f.read(length).decode("utf-8")
+
+    @property
+    def spilled(self):
+        """Nº de mensagens (as mais antigas) com o texto em disco."""
+        return self._spilled
+
+    def close(self):
+        """Fecha o ficheiro de spill; as mensagens que lá estavam deixam de ser legíveis."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,186 @@
+# metrics.py
+# Instrumentação leve dos caminhos quentes: temporizadores e contadores.
+#
+# - observe(nome, valor) / timer(nome): amostras (guarda as últimas SAMPLES
+#   de cada métrica para p50/p95, mais contagem e soma desde o início)
+# - count(nome, n): contadores
+# - snapshot(): estado actual (usado pelo painel "Desempenho")
+# - write(caminho): exporta em CSV (.csv) ou no formato de texto do
+#   Prometheus (outra extensão, ex.: .prom para o textfile collector)
+#
+# Os nomes levam a unidade (ex.: network_seconds, payload_bytes). Tudo é
+# thread-safe: o LogWriter e os workers registam das suas threads.
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# amostras guardadas por métrica (os percentis são das mais recentes)
+SAMPLES = 2048
+PREFIX = "chatgpt_qt_"
+
+
+def percentile(sorted_values, q):
+    """Percentil q (0..1) de uma lista já ordenada (vizinho mais próximo)."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class Summary:
+    """Amostras de uma métrica: últimas SAMPLES, contagem e soma totais."""
+
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self, size=SAMPLES):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def stats(self):
+        values = sorted(self.samples)
+        return {"count": self.count, "sum": self.total,
+                "p50": percentile(values, 0.5), "p95": percentile(values, 0.95),
+                "max": values[-1] if values else 0.0}
+
+
+class Registry:
+    """Conjunto de métricas (summaries + contadores), protegido por um lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._summaries = {}
+        self._counters = {}
+        self.started = time.time()
+
+    def observe(self, name, value):
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                summary = self._summaries[name] = Summary()
+            summary.add(value)
+
+    @contextmanager
+    def timer(self, name):
+        """with timer("render_seconds"): ... regista a duração do bloco."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._summaries.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """{"summaries": {nome: stats}, "counters": {nome: valor}} (ordenados por nome)."""
+        with self._lock:
+            summaries = {name: s.stats() for name, s in sorted(self._summaries.items())}
+            counters = dict(sorted(self._counters.items()))
+        return {"summaries": summaries, "counters": counters}
+
+    # --- exportação ---
+
+    def to_csv_rows(self):
+        """Linhas da exportação CSV (com cabeçalho)."""
+        snap = self.snapshot()
+        rows = [["metric", "type", "count", "sum", "p50", "p95", "max"]]
+        for name, s in snap["summaries"].items():
+            rows.append([name, "summary", s["count"], f"{s['sum']:.6g}",
+                         f"{s['p50']:.6g}", f"{s['p95']:.6g}", f"{s['max']:.6g}"])
+        for name, value in snap["counters"].items():
+            rows.append([name, "counter", value, "", "", "", ""])
+        return rows
+
+    def to_prometheus(self):
+        """Texto no formato de exposição do Prometheus (summaries com quantis)."""
+        snap = self.snapshot()
+        lines = []
+        for name, s in snap["summaries"].items():
+            metric = PREFIX + name
+            lines.append(f"# TYPE {metric} summary")
+            lines.append(f'{metric}{{quantile="0.5"}} {s["p50"]:.6g}')
+            lines.append(f'{metric}{{quantile="0.95"}} {s["p95"]:.6g}')
+            lines.append(f"{metric}_sum {s['sum']:.6g}")
+            lines.append(f"{metric}_count {s['count']}")
+        for name, value in snap["counters"].items():
+            metric = PREFIX + name
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Exporta para `path` (CSV se terminar em .csv, senão Prometheus), de forma atómica."""
+        # só aqui: não pesam no arranque da app
+        import csv
+        import tempfile
+        folder = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(prefix=".tmp_", dir=folder)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                if path.lower().endswith(".csv"):
+                    csv.writer(f).writerows(self.to_csv_rows())
+                else:
+                    f.write(self.to_prometheus())
+            # o collector nunca vê um ficheiro a meio
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+
+# registo global, partilhado pela app e pelo batch
+REGISTRY = Registry()
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+count = REGISTRY.count
+snapshot = REGISTRY.snapshot
+write = REGISTRY.write
+
+
+def record_result(result, tokens=None):
+    """Regista um resultado de api_client.chat_completion (tempos, bytes, tokens/s).
+
+    tokens: tokens da resposta (estimados), para o débito em tokens/s.
+    """
+    count("requests_total")
+    if result.get("cached"):
+        count("cache_hits_total")
+        return
+    if result.get("cancelled"):
+        count("cancelled_total")
+    elif not result.get("ok"):
+        count("errors_total")
+    if result.get("payload_bytes"):
+        observe("payload_bytes", result["payload_bytes"])
+    timing = result.get("timing")
+    if not timing:
+        return
+    observe("network_seconds", timing.get("total", 0.0))
+    observe("ttfb_seconds", timing.get("ttfb", 0.0))
+    if "parse" in timing:
+        observe("parse_seconds", timing["parse"])
+    if timing.get("attempts", 1) > 1:
+        count("retries_total", timing["attempts"] - 1)
+    if tokens and result.get("ok"):
+        # em streaming conta só a geração (depois do primeiro byte)
+        elapsed = timing.get("total", 0.0) - (timing.get("ttfb", 0.0) if result.get("streamed") else 0.0)
+        if elapsed > 0:
+            observe("tokens_per_second", tokens / elapsed)
@@ -0,0 +1,50 @@
+# rate_limit.py
+# Limite de ritmo por token bucket: pedidos por minuto (rpm) e tokens por minuto (tpm).
+#
+# Cada balde enche continuamente até à capacidade; try_take() retira crédito
+# se houver e wait_time() diz quanto falta, sem bloquear (quem espera é a fila
+# do scheduler.py). Thread-safe, para ser partilhado por vários workers.
+import time
+import threading
+
+
+class TokenBucket:
+    """Balde com `capacity` unidades que recarrega `rate` unidades por segundo."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount=1):
+        """Tempo (s) até haver crédito para `amount`, sem retirar nada."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (amount - self.tokens) / self.rate)
+
+    def try_take(self, amount=1):
+        """Retira `amount` se houver crédito; senão devolve o tempo de espera (s)."""
+        # um pedido maior que o balde nunca caberia: limita ao máximo
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Limite combinado de pedidos/min e tokens/min (0 ou None = sem limite)."""
+
+    def __init__(self, rpm=None, tpm=None):
+        self.requests = TokenBucket(rpm / 60.0, rpm) if rpm else None
+        self.tokens = TokenBucket(tpm / 60.0, tpm) if tpm else None
+
@@ -0,0 +1,157 @@
+# response_cache.py
+# Cache (opcional) de respostas, indexada pelo payload normalizado.
+#
+# Chave = hash de model + messages (só role/content) + temperature + max_tokens.
+# Dois níveis: LRU em memória e SQLite em disco, com TTL e limite de entradas.
+# Com temperature > 0 a resposta não é determinística, por isso a cache é
+# ignorada, a não ser que seja forçada.
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def cache_key(payload):
+    """Hash estável do pedido (ignora stream e outros campos que não mudam a resposta)."""
+    normalized = {
+        "model": payload.get("model"),
+        "messages": [{"role": m.get("role"), "content": m.get("content")}
+                     for m in payload.get("messages", [])],
+        "temperature": payload.get("temperature"),
+        "max_tokens": payload.get("max_tokens"),
+    }
+    raw = json.dumps(normalized, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU em memória + SQLite em disco, com TTL e evicção por tamanho."""
+
+    def __init__(self, path=None, memory_size=256, max_entries=5000, ttl=7 * 24 * 3600):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()  # key -> (content, created)
+        # hits servidos da memória: o last_used em disco só é actualizado
+        # antes da evicção e ao fechar (não uma escrita por hit)
+        self._touched = {}            # key -> last_used
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, content TEXT NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+            self._db.commit()
+            self.purge_expired()
+
+    @staticmethod
+    def cacheable(payload, force=False):
+        """Só respostas determinísticas (temperature 0) entram na cache, salvo se forçado."""
+        return force or (payload.get("temperature") or 0) <= 0
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, payload, force=False):
+        """Conteúdo em cache para o payload, ou None (conta hit/miss)."""
+        if not self.cacheable(payload, force):
+            return None
+        key = cache_key(payload)
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                if not self._expired(item[1], now):
+                    self._memory.move_to_end(key)
+                    if self._db is not None:
+                        self._touched[key] = now
+                    self.hits += 1
+                    return item[0]
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT content, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    content, created = row
+                    if self._expired(created, now):
+                        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        self._db.commit()
+                    else:
+                        self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._remember(key, content, created)
+                        self.hits += 1
+                        return content
+
+            self.misses += 1
+            return None
+
+    def put(self, payload, content, force=False):
+        if not self.cacheable(payload, force):
+            return
+        key = cache_key(payload)
+        now = time.time()
+        with self._lock:
+            self._remember(key, content, now)
+            if self._db is not None:
+                self._touched.pop(key, None)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, created, last_used) VALUES (?, ?, ?, ?)",
+                    (key, content, now, now))
+                self._writes += 1
+                # evicção por tamanho de vez em quando (não a cada escrita)
+                if self._writes % 50 == 0:
+                    self._evict_oldest()
+                self._db.commit()
+
+    def _remember(self, key, content, created):
+        self._memory[key] = (content, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _save_touched(self):
+        if self._touched:
+            self._db.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                                 [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def _evict_oldest(self):
+        # as mais usadas recentemente (mesmo só da memória) não são as que saem
+        self._save_touched()
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used LIMIT ?)", (excess,))
+
+    def purge_expired(self):
+        """Remove entradas fora do TTL e o excesso de entradas."""
+        if self._db is None:
+            return
+        with self._lock:
+            if self.ttl is not None:
+                self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            self._evict_oldest()
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._save_touched()
+                self._db.commit()
+                self._db.close()
+                self._db = None
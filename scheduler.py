@@ -0,0 +1,124 @@
+# scheduler.py
+# Fila de pedidos à API com prioridades e limite de ritmo (rpm/tpm).
+#
+# Todos os pedidos passam por acquire() antes de irem para a rede. Sai sempre
+# o da frente da fila (prioridade e depois ordem de chegada), e só quando os
+# token buckets (rate_limit.py) têm crédito para ele: 1 pedido e os tokens
+# estimados do payload mais max_tokens. Assim um envio interactivo passa à
+# frente dos resumos e do batch que estejam à espera.
+#
+# Um 429 com Retry-After pára a fila inteira durante esse tempo (on_retry), em
+# vez de cada worker voltar a tentar por sua conta. As novas tentativas do
+# ApiClient também voltam a passar pela fila (throttle) e gastam crédito como
+# um pedido novo: uma rajada de 429 não ultrapassa o limite rpm.
+import time
+import heapq
+import itertools
+import threading
+
+from api_client import RequestCancelled
+from context_window import estimate_payload_tokens
+from rate_limit import RateLimiter
+
+# prioridades (menor sai primeiro)
+INTERACTIVE = 0
+BACKGROUND = 1
+BATCH = 2
+
+# de quanto em quanto tempo quem espera verifica o cancelamento e avisa a GUI
+POLL_INTERVAL = 0.1
+
+
+def request_tokens(payload):
+    """Tokens que um pedido gasta no limite tpm: mensagens (estimadas) + max_tokens."""
+    return estimate_payload_tokens(payload.get("messages") or []) + (payload.get("max_tokens") or 0)
+
+
+class RequestScheduler:
+    """Fila de prioridades à frente do cliente da API. Thread-safe."""
+
+    def __init__(self, rpm=None, tpm=None):
+        self.limiter = RateLimiter(rpm, tpm)
+        self.rpm = rpm or 0
+        self.tpm = tpm or 0
+        self._cond = threading.Condition()
+        self._queue = []            # heap de [prioridade, seq]
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+
+    def configure(self, rpm=None, tpm=None):
+        """Muda os limites (0 ou None = sem limite); os buckets começam cheios."""
+        with self._cond:
+            self.limiter = RateLimiter(rpm, tpm)
+            self.rpm = rpm or 0
+            self.tpm = tpm or 0
+            self._cond.notify_all()
+
+    def _wait_time(self, tokens):
+        """Espera (s) para o pedido da frente da fila poder sair (0 = já)."""
+        wait = self._paused_until - time.monotonic()
+        limiter = self.limiter
+        if limiter.requests is not None:
+            wait = max(wait, limiter.requests.wait_time(1))
+        if limiter.tokens is not None and tokens:
+            wait = max(wait, limiter.tokens.wait_time(tokens))
+        return max(0.0, wait)
+
+    def acquire(self, tokens=0, priority=INTERACTIVE, handle=None, on_wait=None):
+        """Espera pela vez de um pedido de `tokens` tokens; devolve o tempo esperado (s).
+
+        on_wait(posição, segundos) é chamado enquanto o pedido espera (posição 0 =
+        é o próximo, à espera de crédito). Com `handle` (RequestHandle), um
+        cancelamento tira-o da fila e levanta RequestCancelled.
+        """
+        ticket = [priority, next(self._seq)]
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    if handle is not None and handle.cancelled:
+                        raise RequestCancelled()
+                    if self._queue[0] is ticket:
+                        wait = self._wait_time(tokens)
+                        if not wait:
+                            limiter = self.limiter
+                            if limiter.requests is not None:
+                                limiter.requests.try_take(1)
+                            if limiter.tokens is not None and tokens:
+                                limiter.tokens.try_take(tokens)
+                            return time.monotonic() - start
+                        position = 0
+                    else:
+                        wait = POLL_INTERVAL
+                        position = sum(1 for other in self._queue if other < ticket)
+                    if on_wait is not None:
+                        on_wait(position, time.monotonic() - start)
+                    self._cond.wait(min(wait, POLL_INTERVAL))
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                # o seguinte pode sair já
+                self._cond.notify_all()
+
+    def pause(self, seconds):
+        """Ninguém sai da fila nos próximos `seconds` (ex.: Retry-After de um 429)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def on_retry(self, status, delay):
+        """Callback de ApiClient.post: um 429 pára também os pedidos em fila."""
+        if status == 429:
+            self.pause(delay)
+
+    def throttle(self, tokens=0, priority=INTERACTIVE, handle=None):
+        """Função para ApiClient.post(throttle=...): cada nova tentativa espera pela vez."""
+        return lambda: self.acquire(tokens, priority, handle=handle)
+
+    def queued(self):
+        """Nº de pedidos à espera, por prioridade."""
+        with self._cond:
+            counts = {}
+            for priority, _ in self._queue:
+                counts[priority] = counts.get(priority, 0) + 1
+            return counts
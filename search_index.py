@@ -0,0 +1,300 @@
+# search_index.py
+# Índice de pesquisa (SQLite FTS5) sobre os logs de conversa guardados.
+#
+# Cada conversa é identificada pelo caminho sem extensão (conversa_X), para o
+# .jsonl, o .json compactado e o .txt contarem como a mesma conversa. Os logs
+# JSONL são indexados de forma incremental: guarda-se o offset já lido e só as
+# linhas novas são processadas. Com o offset vai um hash dos bytes que o
+# antecedem: um log reescrito (import) ou cortado (linha a meio reparada antes
+# de acrescentar) não bate certo e é lido de novo do início. A app chama
+# index_file() depois de cada escrita do LogWriter, e scan() apanha ficheiros
+# escritos fora da app (ou antigos).
+#
+# Uso em linha de comandos:
+#   python search_index.py scan [pasta]        indexa os conversa_* da pasta
+#   python search_index.py search "texto"      pesquisa (ordenada por bm25)
+import os
+import re
+import sys
+import glob
+import json
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".chatgpt_qt", "pesquisa.sqlite")
+
+_TOKEN_RE = re.compile(r"(\w+)(\*?)", re.UNICODE)
+
+# Com muitas ocorrências, só as N mais recentes são ordenadas por relevância:
+# o custo do bm25 cresce com o nº de mensagens que contêm os termos.
+CANDIDATES = 5000
+
+# bytes antes do offset que identificam o conteúdo já indexado (ver _tail_hash)
+TAIL_BYTES = 256
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS conversations ("
+    " id INTEGER PRIMARY KEY, base TEXT UNIQUE NOT NULL, source TEXT NOT NULL,"
+    " offset INTEGER NOT NULL DEFAULT 0, mtime REAL NOT NULL DEFAULT 0,"
+    " total INTEGER NOT NULL DEFAULT 0, tail TEXT NOT NULL DEFAULT '')",
+    # só content é indexado; o resto vai junto para montar os resultados
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5("
+    " content, role UNINDEXED, conversation UNINDEXED, position UNINDEXED,"
+    " tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+)
+
+
+def conversation_base(path):
+    """Chave da conversa: caminho absoluto sem extensão."""
+    return os.path.splitext(os.path.abspath(path))[0]
+
+
+def fts_query(text):
+    """Converte o texto escrito pelo utilizador numa query FTS5 segura.
+
+    Todas as palavras têm de aparecer (AND); `palavra*` procura por prefixo.
+    """
+    terms = [f'"{word}"{star}' for word, star in _TOKEN_RE.findall(text)]
+    return " ".join(terms) or None
+
+
+class SearchIndex:
+    """Índice FTS5 das mensagens. Thread-safe (uma ligação, protegida por lock)."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # WAL: as pesquisas (GUI) não esperam pelas escritas (LogWriter)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self._db.execute(statement)
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(conversations)")]
+        if "tail" not in columns:
+            # índice de uma versão anterior: sem hash, cada log é relido uma vez
+            self._db.execute("ALTER TABLE conversations ADD COLUMN tail TEXT NOT NULL DEFAULT ''")
+        self._db.commit()
+
+    # --- escrita ---
+
+    def _conversation(self, base, source):
+        row = self._db.execute(
+            "SELECT id, source, offset, mtime, total, tail FROM conversations WHERE base = ?",
+            (base,)).fetchone()
+        if row is None:
+            cur = self._db.execute("INSERT INTO conversations (base, source) VALUES (?, ?)",
+                                   (base, source))
+            return cur.lastrowid, source, 0, 0.0, 0, ""
+        return row
+
+    def _insert(self, conv_id, start, entries):
+        self._db.executemany(
+            "INSERT INTO messages (content, role, conversation, position) VALUES (?, ?, ?, ?)",
+            ((str(e.get("content", "")), e.get("role", ""), conv_id, start + i)
+             for i, e in enumerate(entries)))
+        return start + len(entries)
+
+    def _clear(self, conv_id):
+        self._db.execute("DELETE FROM messages WHERE conversation = ?", (conv_id,))
+
+    def _update(self, conv_id, source, offset, mtime, count, tail=""):
+        self._db.execute(
+            "UPDATE conversations SET source = ?, offset = ?, mtime = ?, total = ?, tail = ?"
+            " WHERE id = ?", (source, offset, mtime, count, tail, conv_id))
+
+    def add_messages(self, path, entries):
+        """Acrescenta mensagens já gravadas no fim do log `path` (sem o reler)."""
+        if not entries:
+            return
+        with self._lock:
+            conv_id, _, _, _, count, _ = self._conversation(conversation_base(path), path)
+            count = self._insert(conv_id, count, entries)
+            # o ficheiro já contém estas linhas: o próximo scan começa depois delas
+            try:
+                st = os.stat(path)
+                offset, mtime = st.st_size, st.st_mtime
+                tail = _tail_hash(path, offset)
+            except OSError:
+                offset, mtime, tail = 0, 0.0, ""
+            self._update(conv_id, path, offset, mtime, count, tail)
+            self._db.commit()
+
+    def index_file(self, path, full=False):
+        """Indexa um log (só o que mudou). Devolve o nº de mensagens novas.
+
+        full=True volta a ler o ficheiro inteiro (ex.: log reescrito no lugar).
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        base = conversation_base(path)
+        with self._lock:
+            conv_id, source, offset, mtime, count, tail = self._conversation(base, path)
+            jsonl = path.lower().endswith(".jsonl")
+            if not full:
+                if source == path and st.st_size == offset and st.st_mtime == mtime:
+                    return 0
+                if source != path and not jsonl and source.lower().endswith(".jsonl"):
+                    # o .json compactado repete o .jsonl já indexado
+                    return 0
+
+            if (not full and jsonl and source == path and st.st_size >= offset
+                    and _tail_hash(path, offset) == tail):
+                # só as linhas acrescentadas desde a última vez
+                start = offset
+            else:
+                self._clear(conv_id)
+                start, count = 0, 0
+
+            entries, end = _read_entries(path, start, jsonl)
+            count = self._insert(conv_id, count, entries)
+            self._update(conv_id, path, end, st.st_mtime, count,
+                         _tail_hash(path, end) if jsonl else "")
+            self._db.commit()
+            return len(entries)
+
+    def scan(self, folder, pattern="conversa_*", interrupted=None):
+        """Indexa os logs de uma pasta (JSONL preferido ao JSON da mesma conversa).
+
+        interrupted(): se devolver True, pára entre ficheiros (o resto fica para depois).
+        """
+        paths = {}
+        for path in glob.glob(os.path.join(folder, pattern + ".json*")):
+            base, ext = os.path.splitext(path)
+            if ext.lower() == ".jsonl" or base not in paths:
+                paths[base] = path
+        added = 0
+        for path in paths.values():
+            if interrupted is not None and interrupted():
+                break
+            try:
+                added += self.index_file(path)
+            except (OSError, ValueError):
+                # ficheiro ilegível ou corrompido: fica de fora do índice
+                continue
+        return added
+
+    def remove(self, path):
+        with self._lock:
+            row = self._db.execute("SELECT id FROM conversations WHERE base = ?",
+                                   (conversation_base(path),)).fetchone()
+            if row is not None:
+                self._clear(row[0])
+                self._db.execute("DELETE FROM conversations WHERE id = ?", (row[0],))
+                self._db.commit()
+
+    def optimize(self):
+        """Junta os segmentos do índice FTS5 (pesquisas mais rápidas depois de muitas escritas)."""
+        with self._lock:
+            self._db.execute("INSERT INTO messages(messages) VALUES ('optimize')")
+            self._db.commit()
+
+    # --- leitura ---
+
+    def search(self, text, limit=50):
+        """Resultados por relevância (bm25): dicts com source, position, role e snippet."""
+        query = fts_query(text)
+        if query is None:
+            return []
+        with self._lock:
+            # rowid cresce com a ordem de indexação: as N ocorrências mais recentes
+            row = self._db.execute(
+                "SELECT rowid FROM messages WHERE messages MATCH ?"
+                " ORDER BY rowid DESC LIMIT 1 OFFSET ?", (query, CANDIDATES - 1)).fetchone()
+            lowest = row[0] if row else 0
+            ranked = self._db.execute(
+                "SELECT rowid, rank FROM messages WHERE messages MATCH ? AND rowid >= ?"
+                " ORDER BY rank LIMIT ?", (query, lowest, limit)).fetchall()
+            if not ranked:
+                return []
+            # snippet() só para as linhas mostradas, numa única passagem pelo
+            # intervalo (o "+" impede o SQLite de fazer uma pesquisa por rowid)
+            rowids = [rowid for rowid, _ in ranked]
+            details = {}
+            for rowid, source, position, role, snippet in self._db.execute(
+                    "SELECT messages.rowid, c.source, messages.position, messages.role,"
+                    " snippet(messages, 0, '[', ']', '…', 12)"
+                    " FROM messages JOIN conversations AS c ON c.id = messages.conversation"
+                    " WHERE messages MATCH ? AND messages.rowid >= ?"
+                    f" AND +messages.rowid IN ({','.join('?' * len(rowids))})",
+                    (query, min(rowids), *rowids)):
+                details[rowid] = {"source": source, "position": position, "role": role,
+                                  "snippet": snippet}
+        results = []
+        for rowid, rank in ranked:
+            if rowid in details:
+                results.append(dict(details[rowid], rank=rank))
+        return results
+
+    def stats(self):
+        with self._lock:
+            conversations = self._db.execute("SELECT COUNT(*), COALESCE(SUM(total), 0) FROM conversations").fetchone()
+        return {"conversations": conversations[0], "messages": conversations[1]}
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def _tail_hash(path, offset):
+    """Hash dos TAIL_BYTES bytes antes de `offset` (o fim do que já foi indexado)."""
+    start = max(0, offset - TAIL_BYTES)
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(offset - start)
+    return hashlib.sha1(data).hexdigest()
+
+
+def _read_entries(path, offset, jsonl):
+    """Lê as mensagens de um log a partir de `offset`. Devolve (mensagens, offset final)."""
+    if not jsonl:
+        with open(path, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+        entries = [e for e in loaded if isinstance(e, dict)] if isinstance(loaded, list) else []
+        return entries, os.path.getsize(path)
+
+    entries = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                # linha ainda incompleta: fica para o próximo scan
+                break
+            offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict):
+                entries.append(entry)
+    return entries, offset
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 1 or argv[0] not in ("scan", "search"):
+        print('Uso: python search_index.py scan [pasta] | search "texto"')
+        return 2
+    index = SearchIndex()
+    try:
+        if argv[0] == "scan":
+            added = index.scan(argv[1] if len(argv) > 1 else os.getcwd())
+            print(f"{added} mensagens novas indexadas ({index.stats()['messages']} no total)")
+        else:
+            for r in index.search(" ".join(argv[1:])):
+                print(f"{r['source']} #{r['position']} ({r['role']}): {r['snippet']}")
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# session_journal.py
+# Diário da sessão: o que é preciso para a app voltar ao mesmo sítio.
+#
+# Um JSON pequeno com os separadores abertos (log JSONL, título, onde começa a
+# conversa depois de "Limpar", posição do scroll), o separador activo e os
+# pedidos que estavam à espera de resposta. É reescrito de forma atómica
+# (ficheiro temporário + fsync + os.replace) a cada alteração, por isso um
+# crash ou a máquina a adormecer a meio de um pedido deixam sempre a última
+# versão completa.
+#
+# Só uma instância da app usa o diário de cada vez (lock(): trinco do SO num
+# ficheiro .lock, libertado mesmo que o processo morra); uma segunda janela
+# não repõe as conversas, que senão seriam escritas por dois processos.
+#
+# O histórico não é copiado para aqui: está nos logs JSONL de cada conversa,
+# que ao arrancar são lidos pelo fim (conversation_log.tail_messages).
+#
+# Formato:
+#   {"version": 1, "clean": false, "current": 0,
+#    "tabs": [{"log": ".../conversa_X.jsonl", "title": "Conversa 1", "start": 0,
+#              "scroll": null, "pending": {"prompt": "..."}}]}
+# scroll: nº de mensagens desde a primeira visível até ao fim (null = no fim).
+import os
+import json
+import tempfile
+
+SESSION_VERSION = 1
+
+
+class SessionJournal:
+    """Lê e grava o estado da sessão num ficheiro JSON."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._lock_file = None
+
+    def lock(self):
+        """Fica com o diário para esta instância; False se outra já o tiver."""
+        if self._lock_file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path + ".lock", "a+b")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    def unlock(self):
+        if self._lock_file is not None:
+            # fechar o ficheiro liberta o trinco
+            self._lock_file.close()
+            self._lock_file = None
+
+    def load(self):
+        """O último estado gravado, ou None (sem diário, ou ilegível)."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(state, dict) or state.get("version") != SESSION_VERSION:
+            return None
+        tabs = state.get("tabs")
+        if not isinstance(tabs, list):
+            return None
+        state["tabs"] = [t for t in tabs if isinstance(t, dict) and t.get("log")]
+        return state
+
+    def save(self, tabs, current=0, clean=False):
+        """Grava o estado (substitui o anterior de uma vez).
+
+        clean=True marca uma saída normal; um diário com clean=False no
+        arranque quer dizer que a app não fechou (crash, kill, sem energia).
+        """
+        state = {"version": SESSION_VERSION, "clean": clean, "current": current, "tabs": tabs}
+        folder = os.path.dirname(self.path)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=folder)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
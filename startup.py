@@ -0,0 +1,81 @@
+# startup.py
+# Arranque das apps Qt: mostrar a janela primeiro e medir quanto isso demora.
+#
+# - after_first_paint(callback): adia trabalho não essencial (menus, threads,
+#   etc.) para depois da primeira pintura da janela
+# - mark(fase): regista o instante de cada fase do arranque
+# - com --startup-log (ou CHATGPT_QT_STARTUP_LOG=1) as fases são escritas em
+#   stderr no formato do `python -X importtime` (para o detalhe por módulo,
+#   correr `python -X importtime app-1.py`)
+#
+# CHATGPT_QT_STARTUP_T0 (time.time() do processo pai) permite medir desde o
+# lançamento do processo; CHATGPT_QT_STARTUP_EXIT=1 fecha a app quando fica
+# pronta (usado por bench/bench_startup.py).
+import os
+import sys
+import time
+
+enabled = "--startup-log" in sys.argv or bool(os.environ.get("CHATGPT_QT_STARTUP_LOG"))
+exit_when_ready = bool(os.environ.get("CHATGPT_QT_STARTUP_EXIT"))
+
+# origem dos tempos: o lançamento do processo (se conhecido) ou este import
+_t0 = float(os.environ.get("CHATGPT_QT_STARTUP_T0") or time.time())
+_marks = []
+_watcher = None
+
+
+def mark(phase):
+    """Regista o fim de uma fase do arranque (segundos desde a origem)."""
+    _marks.append((phase, time.time() - _t0))
+
+
+def marks():
+    return list(_marks)
+
+
+def report(stream=None):
+    """Escreve as fases registadas (só com o log de arranque activo)."""
+    if not enabled:
+        return
+    stream = stream or sys.stderr
+    print("startup: self [us] | cumulative | phase", file=stream)
+    previous = 0.0
+    for phase, at in _marks:
+        print(f"startup: {(at - previous) * 1e6:9.0f} | {at * 1e6:10.0f} | {phase}", file=stream)
+        previous = at
+    stream.flush()
+
+
+def after_first_paint(callback):
+    """Chama callback() logo depois da primeira pintura de qualquer widget."""
+    global _watcher
+    from PyQt5.QtCore import QObject, QEvent, QTimer
+    from PyQt5.QtWidgets import QApplication
+
+    class FirstPaintWatcher(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and _watcher is self:
+                QApplication.instance().removeEventFilter(self)
+                mark("primeira pintura")
+                # deixa a pintura terminar antes do trabalho adiado
+                QTimer.singleShot(0, callback)
+                _clear_watcher()
+            return False
+
+    app = QApplication.instance()
+    _watcher = FirstPaintWatcher(app)
+    app.installEventFilter(_watcher)
+
+
+def _clear_watcher():
+    global _watcher
+    _watcher = None
+
+
+def ready():
+    """Fim do arranque: escreve o log e, para o benchmark, fecha a app."""
+    mark("pronta")
+    report()
+    if exit_when_ready:
+        from PyQt5.QtWidgets import QApplication
+        QApplication.instance().quit()
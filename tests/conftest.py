@@ -0,0 +1,8 @@
+# conftest.py
+# Os módulos da app estão na raiz do repositório e o servidor de teste em bench/.
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
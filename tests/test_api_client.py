@@ -0,0 +1,137 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from api_client import ApiClient, RequestHandle, chat_completion, get_client, iter_sse_data
+from mock_server import start_in_thread
+
+PAYLOAD = {"model": "mock", "messages": [{"role": "user", "content": "olá"}]}
+
+
+@pytest.fixture
+def mock():
+    servers = []
+
+    def start(**options):
+        server, url = start_in_thread(**options)
+        servers.append(server)
+        return server, url
+
+    yield start
+    get_client().close()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_retry_after_is_honored(mock):
+    server, url = mock(fail_first=2, retry_after="0.3")
+    client = ApiClient(backoff_base=10.0)
+    retries = []
+    start = time.perf_counter()
+    resp = client.post(url, json=PAYLOAD, on_retry=lambda status, delay: retries.append((status, delay)))
+    elapsed = time.perf_counter() - start
+    client.close()
+
+    assert resp.status_code == 200
+    assert server.requests_seen == 3
+    assert resp.timing["attempts"] == 3
+    # o Retry-After manda, não o backoff (que aqui seria até 10 s)
+    assert retries == [(429, 0.3), (429, 0.3)]
+    assert resp.timing["retry_wait"] == pytest.approx(0.6)
+    assert 0.6 <= elapsed < 2.0
+
+
+def test_retries_give_up_after_max(mock):
+    server, url = mock(fail_first=10, retry_after="0", error_status=503)
+    client = ApiClient(max_retries=2)
+    resp = client.post(url, json=PAYLOAD)
+    client.close()
+
+    assert resp.status_code == 503
+    assert resp.timing["attempts"] == 3
+    assert server.requests_seen == 3
+
+
+def test_connect_falls_back_to_next_address(mock, monkeypatch):
+    _, url = mock()
+    port = int(url.split(":")[2].split("/")[0])
+    real_getaddrinfo = socket.getaddrinfo
+    lookups = []
+
+    def getaddrinfo(host, *args, **kwargs):
+        if host != "fallback.test":
+            return real_getaddrinfo(host, *args, **kwargs)
+        lookups.append(args[1] if len(args) > 1 else kwargs.get("family"))
+        # AAAA primeiro, mas sem ninguém a ouvir lá (ou sem rota IPv6)
+        return [(socket.AF_INET6, socket.SOCK_STREAM, 6, "", ("::1", port, 0, 0)),
+                (socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", port))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    client = ApiClient(max_retries=0)
+    resp = client.post(url.replace("127.0.0.1", "fallback.test"), json=PAYLOAD, timeout=5)
+    client.close()
+
+    assert resp.status_code == 200
+    assert resp.timing["attempts"] == 1
+    # uma só resolução, com a família que o urllib3 permite
+    assert len(lookups) == 1 and lookups[0] in (socket.AF_UNSPEC, socket.AF_INET)
+
+
+def test_cancel_stops_stream_partway(mock):
+    _, url = mock(chunk_delay=0.05)
+    question = " ".join(f"palavra{i}" for i in range(60))
+    payload = dict(PAYLOAD, stream=True, messages=[{"role": "user", "content": question}])
+    handle = RequestHandle()
+    deltas = []
+
+    def on_delta(text):
+        deltas.append(text)
+        if len(deltas) == 5:
+            # como o botão "Parar", noutra thread
+            threading.Thread(target=handle.cancel).start()
+
+    start = time.perf_counter()
+    result = chat_completion(url, "teste", payload, timeout=10, handle=handle, on_delta=on_delta)
+    elapsed = time.perf_counter() - start
+
+    assert result["cancelled"] and not result["ok"]
+    assert 5 <= len(deltas) < 20
+    # o stream completo demoraria ~3 s
+    assert elapsed < 1.5
+
+
+def test_stream_roundtrip(mock):
+    _, url = mock(chunk_delay=0)
+    deltas = []
+    result = chat_completion(url, "teste", dict(PAYLOAD, stream=True), on_delta=deltas.append)
+    assert result["ok"] and result["streamed"]
+    assert result["content"] == "".join(deltas) == "Resposta simulada para: olá"
+
+
+def test_sse_parsing():
+    event = {"choices": [{"delta": {"content": "a"}}]}
+    lines = [
+        b": keep-alive",
+        b"data: " + json.dumps(event).encode(),
+        b"",
+        ":comentário sem espaço",
+        "event: ignorado",
+        "data: linha 1",
+        "data:linha 2",
+        "data: linha 3\r",
+        "",
+        "",
+        "data: [DONE]",
+        "",
+        "data: sem linha vazia no fim",
+    ]
+    assert list(iter_sse_data(lines)) == [
+        json.dumps(event),
+        "linha 1\nlinha 2\nlinha 3",
+        "[DONE]",
+        "sem linha vazia no fim",
+    ]
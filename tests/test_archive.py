@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from archive import Archive
+
+
+def write_jsonl(path, entries):
+    with open(path, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def test_import_roundtrip(tmp_path):
+    path = tmp_path / "conversa_1.jsonl"
+    entries = [{"role": "user", "content": "olá"}, {"role": "assistant", "content": "olá!"}]
+    write_jsonl(path, entries)
+    archive = Archive(str(tmp_path / "arquivo.sqlite"))
+    assert archive.import_file(str(path)) == 2
+    assert archive.messages("conversa_1") == entries
+    archive.close()
+
+
+def test_failed_import_keeps_archived_copy(tmp_path):
+    path = tmp_path / "conversa_1.jsonl"
+    entries = [{"role": "user", "content": "olá"}, {"role": "assistant", "content": "olá!"}]
+    write_jsonl(path, entries)
+    archive = Archive(str(tmp_path / "arquivo.sqlite"))
+    archive.import_file(str(path))
+
+    # linha inválida a meio: o ficheiro não se lê
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{estragado\n" + json.dumps(entries[0]) + "\n")
+    with pytest.raises(ValueError):
+        archive.import_file(str(path))
+
+    assert [name for name, _, _ in archive.conversations()] == ["conversa_1"]
+    assert archive.messages("conversa_1") == entries
+    archive.close()
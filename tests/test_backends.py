@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+import backends
+from api_client import get_client
+from backends import COOLDOWN_MAX, LocalBackend, Router, load_router
+from mock_server import start_in_thread
+
+PAYLOAD = {"model": "mock", "messages": [{"role": "user", "content": "olá"}]}
+
+
+@pytest.fixture
+def mock():
+    servers = []
+
+    def start(name, **options):
+        server, url = start_in_thread(**options)
+        servers.append(server)
+        return server, LocalBackend(name, url)
+
+    yield start
+    get_client().close()
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_fastest_backend_is_preferred(mock):
+    slow_server, slow = mock("lento", latency=0.15)
+    fast_server, fast = mock("rapido")
+    router = Router([slow, fast])
+
+    # os ainda sem medição vêm primeiro, pela ordem da configuração
+    assert router.complete(PAYLOAD)["backend"] == "lento"
+    assert router.complete(PAYLOAD)["backend"] == "rapido"
+    for _ in range(3):
+        assert router.complete(PAYLOAD)["backend"] == "rapido"
+    assert router.order() == [fast, slow]
+    stats = router.stats()
+    assert stats["lento"]["latency"] > stats["rapido"]["latency"]
+    assert slow_server.requests_seen == 1 and fast_server.requests_seen == 4
+
+
+def test_latency_is_an_ewma():
+    a = LocalBackend("a")
+    router = Router([a], alpha=0.5)
+    for ttfb in (1.0, 0.2, None, 0.6):
+        router._success(a, {"ttfb": ttfb})
+    # 1.0 -> 0.6 -> (sem medição) -> 0.6; a 1.ª medição entra inteira
+    assert router.stats()["a"]["latency"] == pytest.approx(0.6)
+
+
+def test_failover_to_next_backend(mock):
+    broken_server, broken = mock("avariado", fail_first=100, error_status=503, retry_after="0")
+    _, ok = mock("bom")
+    router = Router([broken, ok])
+
+    result = router.complete(PAYLOAD)
+    assert result["ok"] and result["backend"] == "bom"
+    assert result["content"] == "Resposta simulada para: olá"
+    # o ApiClient tentou 1 + 3 vezes antes de passar ao seguinte
+    assert broken_server.requests_seen == 4
+    stats = router.stats()
+    assert stats["avariado"]["failures"] == 1 and not stats["avariado"]["healthy"]
+    # fora da rotação: o próximo pedido vai logo ao que funciona
+    assert router.order() == [ok, broken]
+    assert router.complete(PAYLOAD)["backend"] == "bom"
+    assert broken_server.requests_seen == 4
+
+
+def test_request_errors_do_not_fail_over(mock):
+    _, bad_request = mock("primeiro", fail_first=100, error_status=400)
+    other_server, other = mock("segundo")
+    router = Router([bad_request, other])
+
+    result = router.complete(PAYLOAD)
+    assert not result["ok"] and result["status"] == 400 and result["backend"] == "primeiro"
+    assert other_server.requests_seen == 0
+    assert router.stats()["primeiro"]["healthy"]
+
+
+def test_cooldown_doubles_and_resets(mock, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(backends.time, "monotonic", clock)
+    server, broken = mock("avariado", fail_first=100, error_status=503, retry_after="0")
+    router = Router([broken], cooldown=10.0)
+
+    downs = []
+    for _ in range(7):
+        # sem outro backend, o que está fora da rotação continua a ser tentado
+        assert router.complete(PAYLOAD)["backend"] == "avariado"
+        downs.append(router.stats()["avariado"]["down_for"])
+    assert downs == [10.0, 20.0, 40.0, 80.0, 160.0, COOLDOWN_MAX, COOLDOWN_MAX]
+
+    server.options["fail_first"] = 0
+    clock.now += COOLDOWN_MAX
+    assert router.complete(PAYLOAD)["ok"]
+    stats = router.stats()["avariado"]
+    assert stats["healthy"] and stats["down_for"] == 0.0 and stats["failures"] == 7
+
+
+def test_load_router_rejects_malformed_file(tmp_path):
+    default = LocalBackend("omissao")
+    assert load_router(str(tmp_path / "nao_existe.json"), default).backends == [default]
+    path = tmp_path / "backends.json"
+    for content in ("{não é json", "[]", '{"name": "x"}', '["local"]', '[{"type": "outro"}]'):
+        path.write_text(content, encoding="utf-8")
+        with pytest.raises(ValueError):
+            load_router(str(path), default)
+    path.write_text(json.dumps([{"type": "local", "name": "vllm", "timeout": 60}]), encoding="utf-8")
+    router = load_router(str(path), default)
+    assert [b.name for b in router.backends] == ["vllm"] and router.backends[0].timeout == 60.0
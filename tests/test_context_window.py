@@ -0,0 +1,112 @@
+import pytest
+
+from context_window import (POLICY_PINNED, POLICY_SLIDING, ContextManager, estimate_payload_tokens,
+                            estimate_tokens)
+from message_store import MessageStore
+
+SYSTEM = {"role": "system", "content": "Responde sempre em português."}
+
+
+def turns(n):
+    # 40 caracteres = 10 tokens, mais 4 por mensagem
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"{i:02d}" + "x" * 38}
+            for i in range(n)]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("x" * 40) == 10
+    # texto com muitas palavras curtas conta pelas palavras
+    assert estimate_tokens("a b c d e f") == 6
+
+
+def test_everything_fits():
+    messages = [SYSTEM] + turns(4)
+    context = ContextManager("gpt-4", budget=1000)
+    selected, info = context.build(messages)
+    assert selected == messages
+    assert info == {"total": 5, "summarized": 0, "dropped": 0, "messages": 5,
+                    "tokens": estimate_payload_tokens(messages)}
+
+
+def test_sliding_window_keeps_the_newest():
+    messages = [SYSTEM] + turns(10)
+    # 3 de overhead + 4 mensagens de 14
+    context = ContextManager("gpt-4", budget=3 + 4 * 14, policy=POLICY_SLIDING)
+    selected, info = context.build(messages)
+    assert selected == messages[-4:]
+    assert info["dropped"] == 7 and info["tokens"] <= context.budget
+
+
+def test_pinned_keeps_system_messages_first():
+    late_system = {"role": "system", "content": "Sê breve."}
+    messages = [SYSTEM] + turns(6) + [late_system] + turns(6)[:2]
+    context = ContextManager("gpt-4", budget=3 + 5 * 14, policy=POLICY_PINNED)
+    selected, info = context.build(messages)
+    pinned = estimate_payload_tokens([SYSTEM, late_system]) - 3
+    # as de sistema ficam (à frente), o resto desliza com o que sobra
+    assert selected[:2] == [SYSTEM, late_system]
+    rest = [m for m in messages if m["role"] != "system"]
+    assert selected[2:] == rest[len(rest) - (len(selected) - 2):]
+    assert info["tokens"] <= context.budget
+    assert info["tokens"] + 14 > context.budget
+    assert len(selected) - 2 == (context.budget - 3 - pinned) // 14
+
+
+def test_newest_message_is_always_sent():
+    huge = {"role": "user", "content": "x" * 4000}
+    context = ContextManager("gpt-4", budget=50)
+    selected, info = context.build([SYSTEM] + turns(3) + [huge])
+    assert selected == [SYSTEM, huge]
+    assert info["dropped"] == 3
+
+
+def test_default_budget_reserves_the_answer():
+    assert ContextManager("gpt-4", max_tokens=500).budget == 8192 - 500
+    assert ContextManager("modelo-desconhecido", max_tokens=96).budget == 4000
+
+
+def test_summaries_replace_the_oldest_blocks():
+    messages = [SYSTEM] + turns(9)
+    context = ContextManager("gpt-4", budget=3 + 6 * 14, summarize_turns=3)
+
+    block = context.pending_summary(messages)
+    assert block == messages[1:4]
+    request = context.summary_request(block)
+    assert request[0]["role"] == "system" and "00" in request[1]["content"]
+
+    context.store_summary(block, "resumo A")
+    selected, info = context.build(messages)
+    assert info["summarized"] == 3
+    assert selected[0] == SYSTEM
+    assert selected[1] == {"role": "system", "content": "Resumo da conversa anterior:\nresumo A"}
+    assert selected[-1] == messages[-1]
+    assert info["dropped"] == len(messages) - 1 - 3 - (len(selected) - 2)
+
+    # o bloco seguinte; a mensagem mais recente nunca entra num resumo
+    assert context.pending_summary(messages) == messages[4:7]
+    context.store_summary(messages[4:7], "resumo B")
+    assert context.pending_summary(messages) is None
+    selected, info = context.build(messages)
+    assert info["summarized"] == 6 and info["dropped"] == 0
+    assert selected[1]["content"].endswith("resumo A\n\nresumo B")
+    assert selected[2:] == messages[7:]
+
+
+def test_no_summary_when_everything_fits():
+    context = ContextManager("gpt-4", budget=1000, summarize_turns=2)
+    assert context.pending_summary(turns(6)) is None
+
+
+def test_summary_key_ignores_local_metadata():
+    context = ContextManager("gpt-4", budget=3 + 3 * 14, summarize_turns=2)
+    messages = turns(6)
+    context.store_summary([dict(m, truncated=True) for m in messages[:2]], "resumo")
+    assert context.build(messages)[1]["summarized"] == 2
+
+
+@pytest.mark.parametrize("policy", [POLICY_PINNED, POLICY_SLIDING])
+def test_message_store_gives_the_same_context(policy):
+    messages = [SYSTEM] + turns(20)
+    context = ContextManager("gpt-4", budget=150, policy=policy)
+    assert context.build(MessageStore(messages)) == context.build(messages)
@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from conversation_log import ConversationLog, compact, iter_messages, read_jsonl, tail_messages
+
+MESSAGES = [{"role": "user", "content": "olá"}, {"role": "assistant", "content": "olá!"}]
+
+
+@pytest.mark.parametrize("torn", ['{"role": "user", "con', '{"role": "us\n', '{"role": "us\n\n  \n'])
+def test_append_after_torn_line(tmp_path, torn):
+    path = str(tmp_path / "conversa.jsonl")
+    log = ConversationLog(path)
+    log.extend(MESSAGES)
+    log.close()
+    # crash a meio da escrita de uma linha (com o "\n" já escrito ou não)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(torn)
+
+    log = ConversationLog(path)
+    log.append({"role": "user", "content": "depois do crash"})
+    log.close()
+
+    expected = MESSAGES + [{"role": "user", "content": "depois do crash"}]
+    assert list(iter_messages(path)) == expected
+    assert read_jsonl(path) == expected
+    with open(compact(path), encoding="utf-8") as f:
+        assert json.load(f) == expected
+
+    # reaberto outra vez: nada a reparar, e continua legível
+    log = ConversationLog(path)
+    log.append({"role": "assistant", "content": "ok"})
+    log.close()
+    assert read_jsonl(path) == expected + [{"role": "assistant", "content": "ok"}]
+
+
+def test_append_keeps_complete_line_without_newline(tmp_path):
+    path = str(tmp_path / "conversa.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(MESSAGES[0]) + "\n" + json.dumps(MESSAGES[1]))
+
+    log = ConversationLog(path)
+    log.append({"role": "user", "content": "mais"})
+    log.close()
+
+    assert list(iter_messages(path)) == MESSAGES + [{"role": "user", "content": "mais"}]
+
+
+def write_lines(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(lines))
+
+
+def test_tail_messages_matches_iter_messages(tmp_path):
+    path = str(tmp_path / "conversa.jsonl")
+    lines = []
+    for i in range(500):
+        lines.append(json.dumps({"role": "user", "content": f"mensagem {i} " + "x" * (i % 50)}) + "\n")
+        if i % 7 == 0:
+            # linhas vazias não contam como mensagens
+            lines.append("\n  \n")
+    # crash a meio da última linha (com o "\n" já escrito ou não)
+    lines.append('{"role": "us\n\n')
+    write_lines(path, lines)
+
+    messages = list(iter_messages(path))
+    assert len(messages) == 500
+    for count in (0, 1, 10, 499, 500, 1000):
+        for chunk_size in (64, 1 << 16):
+            first, tail, _ = tail_messages(path, count, chunk_size)
+            assert tail == messages[len(messages) - len(tail):]
+            assert len(tail) == min(count, 500)
+            assert first == len(messages) - len(tail)
+
+
+def test_tail_messages_rejects_corrupted_line_like_iter_messages(tmp_path):
+    path = str(tmp_path / "conversa.jsonl")
+    write_lines(path, [json.dumps(MESSAGES[0]) + "\n", "{estragado\n", json.dumps(MESSAGES[1]) + "\n"])
+    with pytest.raises(ValueError):
+        list(iter_messages(path))
+    with pytest.raises(ValueError):
+        tail_messages(path, 1)
+
+
+def test_tail_messages_keeps_system_messages(tmp_path):
+    path = str(tmp_path / "conversa.jsonl")
+    system = {"role": "system", "content": "És um assistente."}
+    lines = [json.dumps(system) + "\n"]
+    lines += [json.dumps({"role": "user", "content": f"m{i}"}) + "\n" for i in range(300)]
+    write_lines(path, lines)
+
+    first, tail, kept = tail_messages(path, 10, chunk_size=64, keep_roles=("system",))
+    assert first == 291 and len(tail) == 10
+    assert kept == [(0, system)]
@@ -0,0 +1,13 @@
+from message_store import SPILL_CHUNK, MessageStore
+
+
+def test_spill_roundtrip_and_close():
+    entries = [{"role": "user", "content": f"mensagem {i} ç"} for i in range(10 + SPILL_CHUNK)]
+    store = MessageStore(entries, spill_after=10)
+    assert store.spilled == SPILL_CHUNK
+    assert store.to_dicts() == entries
+    spill = store._file
+    store.close()
+    assert spill.closed and store._file is None
+    # fechar duas vezes (ex.: separador limpo e depois fechado) não falha
+    store.close()
@@ -0,0 +1,123 @@
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, cache_key
+
+PAYLOAD = {"model": "gpt-4", "temperature": 0, "max_tokens": 100,
+           "messages": [{"role": "user", "content": "olá"}]}
+
+
+def ask(text, **extra):
+    return dict(PAYLOAD, messages=[{"role": "user", "content": text}], **extra)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+
+def test_key_ignores_fields_that_do_not_change_the_answer():
+    with_meta = dict(PAYLOAD, stream=True, user="x",
+                     messages=[{"role": "user", "content": "olá", "truncated": True}])
+    assert cache_key(with_meta) == cache_key(PAYLOAD)
+    assert cache_key(dict(PAYLOAD, temperature=0.5)) != cache_key(PAYLOAD)
+    assert cache_key(dict(PAYLOAD, max_tokens=50)) != cache_key(PAYLOAD)
+    assert cache_key(dict(PAYLOAD, model="gpt-4o")) != cache_key(PAYLOAD)
+
+
+def test_only_deterministic_requests_unless_forced():
+    cache = ResponseCache()
+    warm = dict(PAYLOAD, temperature=0.7)
+    cache.put(warm, "aleatório")
+    assert cache.get(warm, force=True) is None
+    cache.put(warm, "forçado", force=True)
+    assert cache.get(warm) is None
+    assert cache.get(warm, force=True) == "forçado"
+    # pedidos ignorados não contam como miss
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_memory_lru():
+    cache = ResponseCache(memory_size=2)
+    cache.put(ask("a"), "A")
+    cache.put(ask("b"), "B")
+    assert cache.get(ask("a")) == "A"
+    cache.put(ask("c"), "C")
+    # "b" era a menos usada
+    assert cache.get(ask("b")) is None
+    assert cache.get(ask("a")) == "A" and cache.get(ask("c")) == "C"
+
+
+def test_ttl_in_memory_and_on_disk(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path, ttl=60)
+    cache.put(ask("a"), "A")
+    clock.now += 59
+    assert cache.get(ask("a")) == "A"
+    cache.close()
+
+    cache = ResponseCache(path, ttl=60)
+    assert cache.get(ask("a")) == "A"
+    clock.now += 2
+    # já em memória, mas fora do TTL: sai dos dois níveis
+    assert cache.get(ask("a")) is None
+    assert cache._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+    cache.close()
+
+
+def test_purge_on_open(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path, ttl=60)
+    cache.put(ask("velha"), "V")
+    clock.now += 50
+    cache.put(ask("nova"), "N")
+    cache.close()
+
+    clock.now += 30
+    cache = ResponseCache(path, ttl=60)
+    rows = cache._db.execute("SELECT content FROM responses").fetchall()
+    assert rows == [("N",)]
+    cache.close()
+
+
+def test_disk_eviction_keeps_entries_used_from_memory(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path, memory_size=10, max_entries=2)
+    cache.put(ask("a"), "A")
+    clock.now += 1
+    cache.put(ask("b"), "B")
+    clock.now += 1
+    # hit só da memória: o disco tem de saber que "a" foi usada depois de "b"
+    assert cache.get(ask("a")) == "A"
+    clock.now += 1
+    cache.put(ask("c"), "C")
+    cache.purge_expired()
+    cache.close()
+
+    cache = ResponseCache(path, memory_size=10, max_entries=2)
+    assert cache.get(ask("b")) is None
+    assert cache.get(ask("a")) == "A" and cache.get(ask("c")) == "C"
+    cache.close()
+
+
+def test_size_limit_is_enforced_while_writing(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), memory_size=1, max_entries=10)
+    for i in range(100):
+        clock.now += 1
+        cache.put(ask(f"p{i}"), f"r{i}")
+    count = cache._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    # a evicção é feita a cada 50 escritas
+    assert count == 10
+    assert cache.get(ask("p99")) == "r99" and cache.get(ask("p90")) == "r90"
+    assert cache.get(ask("p89")) is None
+    cache.close()
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+import rate_limit
+from api_client import ApiClient, RequestCancelled, RequestHandle
+from mock_server import start_in_thread
+from rate_limit import TokenBucket
+from scheduler import BACKGROUND, BATCH, INTERACTIVE, RequestScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_refills_up_to_capacity(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    bucket = TokenBucket(rate=2, capacity=4)
+    assert bucket.try_take(4) == 0.0
+    assert bucket.try_take(1) == pytest.approx(0.5)
+    assert bucket.wait_time(2) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert bucket.try_take(1) == 0.0
+    # parado muito tempo: não passa da capacidade
+    clock.now += 60
+    assert bucket.wait_time(4) == 0.0
+    assert bucket.try_take(5) == 0.0
+    assert bucket.try_take(1) == pytest.approx(0.5)
+
+
+def test_queue_order_is_priority_then_arrival():
+    scheduler = RequestScheduler()
+    scheduler.pause(0.3)
+    order = []
+    threads = []
+    for name, priority in [("batch1", BATCH), ("fundo", BACKGROUND), ("batch2", BATCH),
+                           ("envio", INTERACTIVE)]:
+        t = threading.Thread(target=lambda n=name, p=priority: (scheduler.acquire(0, p), order.append(n)))
+        t.start()
+        threads.append(t)
+        # ordem de chegada bem definida
+        while sum(scheduler.queued().values()) < len(threads):
+            time.sleep(0.005)
+    assert scheduler.queued() == {BATCH: 2, BACKGROUND: 1, INTERACTIVE: 1}
+    for t in threads:
+        t.join(5)
+    assert order == ["envio", "fundo", "batch1", "batch2"]
+    assert scheduler.queued() == {}
+
+
+def test_429_pauses_the_queue():
+    scheduler = RequestScheduler()
+    scheduler.on_retry(503, 5.0)
+    assert scheduler.acquire() < 0.1
+    scheduler.on_retry(429, 0.3)
+    assert scheduler.acquire() >= 0.29
+
+
+def test_cancel_leaves_the_queue():
+    scheduler = RequestScheduler()
+    scheduler.pause(5.0)
+    handle = RequestHandle()
+    threading.Timer(0.1, handle.cancel).start()
+    with pytest.raises(RequestCancelled):
+        scheduler.acquire(handle=handle)
+    assert scheduler.queued() == {}
+
+
+def test_retries_count_against_rpm():
+    server, url = start_in_thread(fail_first=2, retry_after="0")
+    try:
+        scheduler = RequestScheduler(rpm=120)
+        # só há crédito para o primeiro pedido; depois 2 por segundo
+        scheduler.limiter.requests.tokens = 1
+        client = ApiClient(backoff_base=0)
+        start = time.perf_counter()
+        scheduler.acquire()
+        resp = client.post(url, json={"model": "mock", "messages": []},
+                           on_retry=scheduler.on_retry, throttle=scheduler.throttle())
+        elapsed = time.perf_counter() - start
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert resp.status_code == 200
+    assert server.requests_seen == 3
+    # cada nova tentativa esperou ~0.5 s pelo crédito rpm
+    assert elapsed >= 0.9
+    assert resp.timing["retry_wait"] >= 0.9
@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from conversation_log import ConversationLog, compact
+from search_index import SearchIndex, fts_query
+
+
+def user(text):
+    return {"role": "user", "content": text}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / "indice" / "pesquisa.sqlite"))
+    yield index
+    index.close()
+
+
+def write_log(path, messages):
+    log = ConversationLog(path)
+    log.extend(messages)
+    log.close()
+
+
+def positions(index, text):
+    return sorted((os.path.basename(r["source"]), r["position"]) for r in index.search(text))
+
+
+def test_fts_query_is_safe():
+    assert fts_query('olá "mundo" OR x*') == '"olá" "mundo" "OR" "x"*'
+    assert fts_query("  -- ( ) ") is None
+
+
+def test_search_words_prefix_and_accents(index, tmp_path):
+    path = str(tmp_path / "conversa_a.jsonl")
+    write_log(path, [user("A configuração do servidor"), user("servidor lento"),
+                     {"role": "assistant", "content": "Reinicia o serviço."}])
+    assert index.index_file(path) == 3
+    assert positions(index, "configuracao") == [("conversa_a.jsonl", 0)]
+    assert positions(index, "servidor") == [("conversa_a.jsonl", 0), ("conversa_a.jsonl", 1)]
+    # todas as palavras (AND) e prefixos
+    assert positions(index, "servidor lento") == [("conversa_a.jsonl", 1)]
+    assert positions(index, "servi*") == [("conversa_a.jsonl", i) for i in range(3)]
+    result = index.search("reinicia")[0]
+    assert result["role"] == "assistant" and "[Reinicia]" in result["snippet"]
+    assert index.search("") == []
+
+
+def test_incremental_append(index, tmp_path):
+    path = str(tmp_path / "conversa_a.jsonl")
+    write_log(path, [user("primeira"), user("segunda")])
+    assert index.index_file(path) == 2
+    assert index.index_file(path) == 0
+
+    write_log(path, [user("terceira")])
+    # só a linha nova é lida, com a posição a seguir às anteriores
+    assert index.index_file(path) == 1
+    assert positions(index, "terceira") == [("conversa_a.jsonl", 2)]
+    assert index.stats() == {"conversations": 1, "messages": 3}
+
+
+def test_incomplete_line_waits_for_the_rest(index, tmp_path):
+    path = str(tmp_path / "conversa_a.jsonl")
+    write_log(path, [user("primeira")])
+    line = json.dumps(user("segunda")) + "\n"
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line[:10])
+    assert index.index_file(path) == 1
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line[10:])
+    assert index.index_file(path) == 1
+    assert positions(index, "segunda") == [("conversa_a.jsonl", 1)]
+
+
+@pytest.mark.parametrize("full", [True, False])
+def test_rewrite_in_place_reindexes(index, tmp_path, full):
+    path = str(tmp_path / "conversa_a.jsonl")
+    write_log(path, [user("antiga um"), user("antiga dois")])
+    index.index_file(path)
+
+    # import: o log passa a ter outra conversa, maior que a anterior
+    ConversationLog(path).rewrite([user("nova " + "x" * 50 + f" {i}") for i in range(5)])
+    # full=False: reescrito fora da app (ex.: app.py), apanhado pelo scan
+    assert index.index_file(path, full=full) == 5
+    assert index.search("antiga") == []
+    assert positions(index, "nova") == [("conversa_a.jsonl", i) for i in range(5)]
+    assert index.stats()["messages"] == 5
+
+
+def test_append_after_repaired_torn_line(index, tmp_path):
+    path = str(tmp_path / "conversa_a.jsonl")
+    write_log(path, [user("primeira")])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"role": "user", "content": "cort\n')
+    index.index_file(path)
+
+    # a linha cortada sai do ficheiro antes de se acrescentar a seguinte
+    write_log(path, [user("depois do crash " + "y" * 40)])
+    index.index_file(path)
+    assert positions(index, "crash") == [("conversa_a.jsonl", 1)]
+    assert index.stats()["messages"] == 2
+
+
+def test_compacted_json_is_the_same_conversation(index, tmp_path):
+    jsonl = str(tmp_path / "conversa_a.jsonl")
+    write_log(jsonl, [user("única")])
+    compact(jsonl)
+    with open(tmp_path / "conversa_b.json", "w", encoding="utf-8") as f:
+        json.dump([user("única também")], f)
+    with open(tmp_path / "outro.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps(user("única fora do padrão")) + "\n")
+
+    assert index.scan(str(tmp_path)) == 2
+    assert index.index_file(jsonl[:-1]) == 0
+    assert positions(index, "unica") == [("conversa_a.jsonl", 0), ("conversa_b.json", 0)]
+
+    index.remove(jsonl)
+    assert positions(index, "unica") == [("conversa_b.json", 0)]
+    assert index.stats() == {"conversations": 1, "messages": 1}
+
+
+def test_scan_skips_corrupted_files(index, tmp_path):
+    with open(tmp_path / "conversa_a.json", "w", encoding="utf-8") as f:
+        f.write("[{estragado")
+    write_log(str(tmp_path / "conversa_b.jsonl"), [user("boa")])
+    assert index.scan(str(tmp_path)) == 1
+
+
+def test_index_from_older_version_is_reindexed(tmp_path):
+    path = str(tmp_path / "conversa_a.jsonl")
+    write_log(path, [user("primeira")])
+    db_path = str(tmp_path / "pesquisa.sqlite")
+    index = SearchIndex(db_path)
+    index.index_file(path)
+    index.close()
+    # índice de uma versão sem a coluna tail (só base/source/offset/mtime/total)
+    db = sqlite3.connect(db_path)
+    db.execute("CREATE TABLE antiga AS SELECT id, base, source, offset, mtime, total FROM conversations")
+    db.execute("DROP TABLE conversations")
+    db.execute("ALTER TABLE antiga RENAME TO conversations")
+    db.commit()
+    db.close()
+
+    write_log(path, [user("segunda")])
+    index = SearchIndex(db_path)
+    try:
+        index.index_file(path)
+        assert positions(index, "primeira") == [("conversa_a.jsonl", 0)]
+        assert positions(index, "segunda") == [("conversa_a.jsonl", 1)]
+    finally:
+        index.close()
@@ -0,0 +1,33 @@
+import json
+
+from conversation_log import ConversationLog, iter_messages, tail_messages
+from session_journal import SessionJournal
+
+
+def test_restore_after_append_to_torn_log(tmp_path):
+    path = str(tmp_path / "conversa.jsonl")
+    system = {"role": "system", "content": "És um assistente."}
+    messages = [system] + [{"role": "user", "content": f"m{i}"} for i in range(50)]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(json.dumps(m) + "\n" for m in messages))
+        # crash a meio da última linha, depois de o "\n" chegar ao disco
+        f.write('{"role": "assistant", "con\n')
+
+    journal = SessionJournal(str(tmp_path / "sessao.json"))
+    journal.save([{"log": path, "title": "Conversa 1", "start": 0, "scroll": None,
+                   "pending": {"prompt": "m49"}}])
+
+    # a app volta a abrir o separador e continua a conversa
+    log = ConversationLog(path)
+    log.append({"role": "assistant", "content": "resposta"})
+    log.close()
+    messages.append({"role": "assistant", "content": "resposta"})
+
+    state = journal.load()
+    entry = state["tabs"][0]
+    assert entry["log"] == path and state["clean"] is False
+    first, tail, kept = tail_messages(entry["log"], 10, chunk_size=64, keep_roles=("system",))
+    assert tail == messages[-10:]
+    assert first == len(messages) - 10
+    assert kept == [(0, system)]
+    assert list(iter_messages(path)) == messages